@@ -1,10 +1,13 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 from datetime import datetime, timedelta, UTC
+from sqlalchemy import case, cast, func, select, Float, Integer
 from sqlalchemy.orm import Session
-from models import Habit, DailyCompletion, WeeklyCompletion
+from models import Habit, Completion, CompletionRun, Goal, Tag, habit_tags
+from periods import get_period_rule
 from database import get_db_session
+from readmodels import HabitSummary, filter_by_tag, load_habit_summaries
 
-def get_all_habits(session: Session) -> List[Habit]:
+def get_all_habits(session: Session) -> List[HabitSummary]:
     """
     Retrieve all habits from the database.
 
@@ -12,11 +15,11 @@ def get_all_habits(session: Session) -> List[Habit]:
         session (Session): SQLAlchemy database session
 
     Returns:
-        List[Habit]: List of all habit objects
+        List[HabitSummary]: Read-only summaries of all habits
     """
-    return session.query(Habit).all()
+    return load_habit_summaries(session)
 
-def get_habits_by_periodicity(session: Session, periodicity: str) -> List[Habit]:
+def get_habits_by_periodicity(session: Session, periodicity: str) -> List[HabitSummary]:
     """
     Retrieve habits filtered by their periodicity (daily/weekly).
 
@@ -25,21 +28,34 @@ def get_habits_by_periodicity(session: Session, periodicity: str) -> List[Habit]
         periodicity (str): The periodicity to filter by ('daily' or 'weekly')
 
     Returns:
-        List[Habit]: List of filtered habit objects
+        List[HabitSummary]: Read-only summaries of the filtered habits
     """
-    return session.query(Habit).filter(Habit.periodicity == periodicity).all()
+    return load_habit_summaries(session, periodicity)
+
+def get_habits_by_tag(session: Session, tag: str) -> List[HabitSummary]:
+    """
+    Retrieve the habits with a tag.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        tag (str): Tag name
+
+    Returns:
+        List[HabitSummary]: Read-only summaries of the tagged habits
+    """
+    return load_habit_summaries(session, tag=tag)
 
 def get_longest_run_streak(session: Session) -> int:
     """
-    Get the longest streak across all habits.
+    Get the longest streak across all active habits.
 
     Args:
         session (Session): SQLAlchemy database session
 
     Returns:
-        int: Maximum streak value across all habits
+        int: Maximum streak value across all habits, 0 if there are no habits
     """
-    return session.query(Habit).order_by(Habit.max_streak.desc()).first().max_streak
+    return session.query(func.max(Habit.max_streak)).filter(Habit.deleted_at.is_(None)).scalar() or 0
 
 def get_longest_run_streak_for_habit(session: Session, habit_id: int) -> int:
     """
@@ -50,10 +66,12 @@ def get_longest_run_streak_for_habit(session: Session, habit_id: int) -> int:
         habit_id (int): ID of the habit
 
     Returns:
-        int: Maximum streak value for the specified habit, 0 if habit not found
+        int: Maximum streak value for the specified habit, 0 if habit not found or deleted
     """
-    habit = session.get(Habit, habit_id)
-    return habit.max_streak if habit else 0
+    max_streak = session.query(Habit.max_streak).filter(
+        Habit.id == habit_id, Habit.deleted_at.is_(None)
+    ).scalar()
+    return max_streak or 0
 
 def get_days_since_last_completion(session: Session, habit_id: int) -> int:
     """
@@ -64,20 +82,229 @@ def get_days_since_last_completion(session: Session, habit_id: int) -> int:
         habit_id (int): ID of the habit
 
     Returns:
-        int: Number of days since last completion, None if habit not found or never completed
+        int: Number of days since last completion, None if habit not found, deleted or never completed
     """
-    habit = session.get(Habit, habit_id)
-    if not habit:
+    active = session.query(Habit.id).filter(Habit.id == habit_id, Habit.deleted_at.is_(None)).scalar()
+    if not active:
         return None
     
-    if habit.periodicity == 'daily':
-        last_completion = session.query(DailyCompletion).filter(DailyCompletion.habit_id == habit_id).order_by(DailyCompletion.completed_at.desc()).first()
-    else:
-        last_completion = session.query(WeeklyCompletion).filter(WeeklyCompletion.habit_id == habit_id).order_by(WeeklyCompletion.completed_at.desc()).first()
+    last_completed_at = session.query(func.max(Completion.completed_at)).filter(
+        Completion.habit_id == habit_id
+    ).scalar()
     
-    if last_completion:
-        # Ensure last_completion.completed_at is UTC-aware
-        last_completion_time = last_completion.completed_at.replace(tzinfo=UTC)
+    if last_completed_at:
+        # Ensure last_completed_at is UTC-aware
+        last_completion_time = last_completed_at.replace(tzinfo=UTC)
         return (datetime.now(UTC) - last_completion_time).days
+
+    # All completions may have been archived into runs
+    last_archived_period = session.query(func.max(CompletionRun.end_period)).filter(
+        CompletionRun.habit_id == habit_id
+    ).scalar()
+    if last_archived_period:
+        return (datetime.now(UTC).date() - last_archived_period).days
     return None
 
+def count_completions(session: Session, since: datetime, until: Optional[datetime] = None) -> int:
+    """
+    Count the completions of all active habits in a time range, e.g. today's check-ins.
+
+    Completions of every periodicity share one table, so this is a single
+    range scan of its completed_at index.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        since (datetime): Start of the range (inclusive), timezone-aware
+        until (datetime, optional): End of the range (exclusive). Defaults to no end
+
+    Returns:
+        int: Number of completions in the range
+    """
+    query = session.query(func.count(Completion.id)).join(Habit, Habit.id == Completion.habit_id).filter(
+        Completion.completed_at >= since.astimezone(UTC).replace(tzinfo=None),
+        Habit.deleted_at.is_(None),
+    )
+    if until is not None:
+        query = query.filter(Completion.completed_at < until.astimezone(UTC).replace(tzinfo=None))
+    return query.scalar()
+
+
+
+RANKING_METRICS = ['current_streak', 'max_streak', 'completion_rate', 'days_since_last_completion']
+
+def _completion_rate_expression(now: datetime, periodicities: List[str]):
+    """
+    Build a SQL expression for completions per expected completion since creation.
+
+    Every elapsed period expects as many completions as the periodicity's
+    quota, e.g. three per week for '3 times per week'.
+
+    Args:
+        now (datetime): Reference time for the elapsed period count
+        periodicities (List[str]): Periodicities of the ranked habits
+
+    Returns:
+        ColumnElement: Completion rate expression
+    """
+    rules = [get_period_rule(periodicity) for periodicity in periodicities]
+    lengths = [(Habit.periodicity == rule.name, rule.length_days) for rule in rules if rule.length_days != 1]
+    quotas = [(Habit.periodicity == rule.name, rule.quota) for rule in rules if rule.quota != 1]
+    period_days = case(*lengths, else_=1) if lengths else 1
+    quota = case(*quotas, else_=1) if quotas else 1
+    elapsed_days = func.julianday(now.replace(tzinfo=None)) - func.julianday(Habit.created_at)
+    elapsed_periods = cast(elapsed_days / period_days, Integer) + 1
+    return cast(func.coalesce(Habit.completion_count, 0), Float) / (elapsed_periods * quota)
+
+def get_top_habits(session: Session, metric: str = 'current_streak', limit: int = 10,
+                   periodicity: Optional[str] = None, tag: Optional[str] = None) -> List[Dict]:
+    """
+    Rank active habits by a metric and return the top entries.
+
+    Ranking runs as a single ORDER BY ... LIMIT query over the maintained
+    habit columns, so only the returned rows are loaded. For
+    'days_since_last_completion' the habits most at risk come first,
+    starting with habits that were never completed.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        metric (str): One of RANKING_METRICS
+        limit (int): Maximum number of entries to return
+        periodicity (str, optional): Only rank habits with this periodicity
+        tag (str, optional): Only rank habits with this tag
+
+    Returns:
+        List[Dict]: Ranked entries with rank, id, name, periodicity and value
+
+    Raises:
+        ValueError: If metric is not supported
+    """
+    if metric not in RANKING_METRICS:
+        raise ValueError(f"Metric must be one of: {', '.join(RANKING_METRICS)}")
+
+    now = datetime.now(UTC)
+    if metric == 'completion_rate':
+        periodicities = session.scalars(select(Habit.periodicity).distinct()).all()
+        value = _completion_rate_expression(now, periodicities)
+        order = value.desc()
+    elif metric == 'days_since_last_completion':
+        value = Habit.last_completed_at
+        order = value.asc()  # NULLs sort first in SQLite
+    else:
+        value = getattr(Habit, metric)
+        order = value.desc()
+
+    query = select(Habit.id, Habit.name, Habit.periodicity, value).where(Habit.deleted_at.is_(None))
+    if periodicity is not None:
+        query = query.where(Habit.periodicity == periodicity)
+    if tag is not None:
+        query = filter_by_tag(query, tag)
+    rows = session.execute(query.order_by(order, Habit.id).limit(limit)).all()
+
+    ranking = []
+    for rank, (habit_id, name, habit_periodicity, raw_value) in enumerate(rows, start=1):
+        if metric == 'days_since_last_completion':
+            raw_value = (now - raw_value.replace(tzinfo=UTC)).days if raw_value else None
+        elif metric == 'completion_rate':
+            raw_value = round(raw_value, 3)
+        else:
+            raw_value = raw_value or 0
+        ranking.append({
+            'rank': rank,
+            'id': habit_id,
+            'name': name,
+            'periodicity': habit_periodicity,
+            metric: raw_value,
+        })
+    return ranking
+
+def get_goal_stats(session: Session) -> Dict[str, int]:
+    """
+    Count the goals of active habits and how many of them are achieved.
+
+    A single aggregate over the goals table; progress is never recalculated.
+
+    Args:
+        session (Session): SQLAlchemy database session
+
+    Returns:
+        Dict[str, int]: 'total', 'achieved' and 'open' goal counts
+    """
+    total, achieved = session.execute(
+        select(func.count(Goal.id), func.count(Goal.achieved_at))
+        .join(Habit, Habit.id == Goal.habit_id)
+        .where(Habit.deleted_at.is_(None))
+    ).one()
+    return {'total': total, 'achieved': achieved, 'open': total - achieved}
+
+def get_achieved_goals(session: Session, since: Optional[datetime] = None) -> List[Dict]:
+    """
+    List the achieved goals of active habits, most recently achieved first.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        since (datetime, optional): Only goals achieved at or after this time
+
+    Returns:
+        List[Dict]: Goal id, habit id and name, kind, target and achievement time
+    """
+    query = (
+        select(Goal.id, Goal.habit_id, Habit.name, Goal.kind, Goal.target, Goal.achieved_at)
+        .join(Habit, Habit.id == Goal.habit_id)
+        .where(Habit.deleted_at.is_(None), Goal.achieved_at.isnot(None))
+        .order_by(Goal.achieved_at.desc(), Goal.id.desc())
+    )
+    if since is not None:
+        query = query.where(Goal.achieved_at >= since.astimezone(UTC).replace(tzinfo=None))
+    return [
+        {
+            'goal_id': goal_id, 'habit_id': habit_id, 'name': name, 'kind': kind, 'target': target,
+            'achieved_at': achieved_at.replace(tzinfo=UTC).isoformat(),
+        }
+        for goal_id, habit_id, name, kind, target, achieved_at in session.execute(query)
+    ]
+
+def get_tag_stats(session: Session, at_time: Optional[datetime] = None) -> List[Dict]:
+    """
+    Aggregate the habits of every tag: habit count, completions, completion rate and streaks.
+
+    Computed by one JOIN/GROUP BY query over the tags, the association
+    table and the maintained habit columns; no habit is loaded.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        at_time (datetime, optional): Reference time for the completion rate. Defaults to current UTC time
+
+    Returns:
+        List[Dict]: Per tag, ordered by name: tag, habits, completions, completion_rate (average of
+                    the habits' rates), avg_current_streak, max_current_streak and max_streak
+    """
+    now = (at_time or datetime.now(UTC)).astimezone(UTC)
+    periodicities = session.scalars(select(Habit.periodicity).distinct()).all()
+    rows = session.execute(
+        select(
+            Tag.name,
+            func.count(Habit.id),
+            func.sum(func.coalesce(Habit.completion_count, 0)),
+            func.avg(_completion_rate_expression(now, periodicities)),
+            func.avg(Habit.current_streak),
+            func.max(Habit.current_streak),
+            func.max(Habit.max_streak),
+        )
+        .join(habit_tags, habit_tags.c.tag_id == Tag.id)
+        .join(Habit, Habit.id == habit_tags.c.habit_id)
+        .where(Habit.deleted_at.is_(None))
+        .group_by(Tag.id)
+        .order_by(Tag.name)
+    ).all()
+    return [
+        {
+            'tag': name,
+            'habits': habits,
+            'completions': completions or 0,
+            'completion_rate': round(rate or 0, 3),
+            'avg_current_streak': round(avg_current or 0, 2),
+            'max_current_streak': max_current or 0,
+            'max_streak': max_streak or 0,
+        }
+        for name, habits, completions, rate, avg_current, max_current, max_streak in rows
+    ]
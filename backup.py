@@ -0,0 +1,229 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+from database import get_database_path
+
+GZIP_MAGIC = b"\x1f\x8b"
+# Compresses almost as well as level 9 at a fraction of the time
+GZIP_LEVEL = 6
+
+# Called with the number of pages copied so far and the total number of pages
+BackupProgress = Callable[[int, int], None]
+
+
+class _CopyRestarted(Exception):
+    """Aborts a stepped copy that keeps being restarted by concurrent writes."""
+
+
+@dataclass(frozen=True)
+class BackupResult:
+    """
+    Summary of a backup or restore.
+
+    Attributes:
+        path (str): Path of the written file
+        pages (int): Number of database pages copied
+        size (int): Size of the written file in bytes
+        seconds (float): Duration of the whole operation
+    """
+    path: str
+    pages: int
+    size: int
+    seconds: float
+
+
+def copy_database(source_path: str, destination_path: str, step_pages: int = 1024, sleep: float = 0.01,
+                  progress: Optional[BackupProgress] = None, max_restarts: int = 3) -> int:
+    """
+    Copy a database page by page with the SQLite online backup API.
+
+    The copy is made in steps of `step_pages` pages and the result is
+    always a consistent snapshot. In WAL mode the copy reads from one
+    snapshot held for its whole duration, so writers are never blocked and
+    the copy never restarts. In rollback journal mode the source is only
+    locked while a step runs, so other connections can write in between,
+    but each such write makes SQLite restart the copy at the next step.
+    After `max_restarts` restarts the rest is copied in a single step,
+    which makes writers wait until the copy is done.
+
+    Args:
+        source_path (str): Database file to copy
+        destination_path (str): Database file to write, replaced page by page
+        step_pages (int): Pages copied per step, -1 copies everything in one step
+        sleep (float): Seconds to pause between steps
+        progress (BackupProgress, optional): Called after every step
+        max_restarts (int): Restarts tolerated before copying in a single step
+
+    Returns:
+        int: Number of pages copied
+    """
+    source = sqlite3.connect(source_path, isolation_level=None)
+    destination = sqlite3.connect(destination_path)
+    try:
+        if source.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            # A read transaction open across the steps pins the snapshot the copy reads
+            source.execute("BEGIN")
+            source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+
+        copied_before = 0
+        restarts = 0
+
+        def report(status, remaining, total):
+            nonlocal copied_before, restarts
+            copied = total - remaining
+            if copied < copied_before:
+                restarts += 1
+                if restarts > max_restarts:
+                    raise _CopyRestarted()
+            copied_before = copied
+            if progress:
+                progress(copied, total)
+
+        try:
+            source.backup(destination, pages=step_pages, progress=report, sleep=sleep)
+        except _CopyRestarted:
+            source.backup(destination, pages=-1)
+        return destination.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        destination.close()
+        source.close()
+
+
+def verify_database(path: str):
+    """
+    Run SQLite's integrity check on a database file.
+
+    Args:
+        path (str): Database file to check
+
+    Raises:
+        ValueError: If the file is not a database or the check finds problems
+    """
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        problems = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as error:
+        raise ValueError(f"{path} is not a valid database: {error}") from error
+    finally:
+        connection.close()
+    if problems != ["ok"]:
+        raise ValueError(f"{path} failed the integrity check: {'; '.join(problems[:5])}")
+
+
+def backup_database(destination: str, source_path: Optional[str] = None, compress: Optional[bool] = None,
+                    verify: bool = True, step_pages: int = 1024, sleep: float = 0.01,
+                    progress: Optional[BackupProgress] = None) -> BackupResult:
+    """
+    Write a consistent snapshot of a live database to a file.
+
+    The snapshot is copied with copy_database to a temporary file next to
+    the destination, checked with verify_database, optionally gzipped and
+    only then moved into place, so an interrupted or failed backup never
+    leaves a partial file at the destination.
+
+    Args:
+        destination (str): Path of the backup file
+        source_path (str, optional): Database file to back up. Defaults to the configured database
+        compress (bool, optional): gzip the backup. Defaults to True if the destination ends with .gz
+        verify (bool): Check the integrity of the snapshot before keeping it
+        step_pages (int): Pages copied per step, see copy_database
+        sleep (float): Seconds to pause between steps
+        progress (BackupProgress, optional): Called after every step
+
+    Returns:
+        BackupResult: Summary of the backup
+
+    Raises:
+        FileNotFoundError: If the source database doesn't exist
+        ValueError: If the snapshot fails the integrity check
+    """
+    source_path = source_path or get_database_path()
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f"Database {source_path} not found")
+    if compress is None:
+        compress = destination.endswith(".gz")
+
+    started = time.perf_counter()
+    snapshot_path = f"{destination}.partial"
+    _remove(snapshot_path)
+    try:
+        pages = copy_database(source_path, snapshot_path, step_pages, sleep, progress)
+        if verify:
+            verify_database(snapshot_path)
+        if compress:
+            compressed_path = f"{snapshot_path}.gz"
+            try:
+                with open(snapshot_path, "rb") as snapshot, \
+                        gzip.open(compressed_path, "wb", compresslevel=GZIP_LEVEL) as archive:
+                    shutil.copyfileobj(snapshot, archive, 1024 * 1024)
+                os.replace(compressed_path, destination)
+            finally:
+                _remove(compressed_path)
+        else:
+            os.replace(snapshot_path, destination)
+    finally:
+        _remove(snapshot_path)
+    return BackupResult(destination, pages, os.path.getsize(destination), time.perf_counter() - started)
+
+
+def restore_database(backup_path: str, target_path: Optional[str] = None, verify: bool = True,
+                     step_pages: int = 1024, sleep: float = 0.01,
+                     progress: Optional[BackupProgress] = None) -> BackupResult:
+    """
+    Replace the contents of a database with a backup.
+
+    Compressed backups are recognized by their content and unpacked to a
+    temporary file first. The backup is verified before the target is
+    touched and then copied into the target with the online backup API,
+    so other connections to the target see either the old or the restored
+    data, never a mix.
+
+    Args:
+        backup_path (str): Backup file written by backup_database
+        target_path (str, optional): Database file to restore into. Defaults to the configured database
+        verify (bool): Check the integrity of the backup before restoring
+        step_pages (int): Pages copied per step, see copy_database
+        sleep (float): Seconds to pause between steps
+        progress (BackupProgress, optional): Called after every step
+
+    Returns:
+        BackupResult: Summary of the restore
+
+    Raises:
+        FileNotFoundError: If the backup doesn't exist
+        ValueError: If the backup is not a valid database
+    """
+    if not os.path.exists(backup_path):
+        raise FileNotFoundError(f"Backup {backup_path} not found")
+    target_path = target_path or get_database_path()
+
+    started = time.perf_counter()
+    with open(backup_path, "rb") as backup:
+        compressed = backup.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+    unpacked_path = f"{target_path}.restore"
+    _remove(unpacked_path)
+    try:
+        source_path = backup_path
+        if compressed:
+            try:
+                with gzip.open(backup_path, "rb") as archive, open(unpacked_path, "wb") as unpacked:
+                    shutil.copyfileobj(archive, unpacked, 1024 * 1024)
+            except (OSError, EOFError) as error:
+                raise ValueError(f"{backup_path} is not a valid backup: {error}") from error
+            source_path = unpacked_path
+        if verify:
+            verify_database(source_path)
+        pages = copy_database(source_path, target_path, step_pages, sleep, progress)
+    finally:
+        _remove(unpacked_path)
+    return BackupResult(target_path, pages, os.path.getsize(target_path), time.perf_counter() - started)
+
+
+def _remove(path):
+    """Delete a file if it exists."""
+    if os.path.exists(path):
+        os.remove(path)
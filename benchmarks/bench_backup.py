@@ -0,0 +1,109 @@
+"""
+Backup benchmark: online backup, compression and restore of a large database.
+
+Seeds a temporary database with generated habits, then times backups with
+and without compression and a restore, while a writer thread keeps
+completing habits. The writer's commit latency shows how long writes were
+held up by the backup.
+
+Usage:
+    python3 benchmarks/bench_backup.py --habits 20000 --days 3650 --wal
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backup import backup_database, restore_database
+from database import upgrade_db
+from seeding import generate_habit_specs, seed_habits
+
+
+class Writer(threading.Thread):
+    """Inserts and commits one completion at a time, recording each commit's latency."""
+
+    def __init__(self, path, interval):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.latencies = []
+        self.errors = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        connection = sqlite3.connect(self.path, timeout=60)
+        while not self.stopped.is_set():
+            started = time.perf_counter()
+            try:
+                connection.execute(
+                    "INSERT INTO completions (habit_id, kind, period_start, completed_at) "
+                    "VALUES (1, 'weekly', date('now', 'weekday 0', '-6 days'), datetime('now'))"
+                )
+                connection.commit()
+                self.latencies.append(time.perf_counter() - started)
+            except sqlite3.OperationalError:
+                connection.rollback()
+                self.errors += 1
+            time.sleep(self.interval)
+        connection.close()
+
+
+def measure(label, run, path, write_interval):
+    """Run `run` while a writer is active and print duration and write latency."""
+    writer = Writer(path, write_interval)
+    writer.start()
+    result = run()
+    writer.stopped.set()
+    writer.join()
+    latencies = sorted(writer.latencies) or [0.0]
+    print(f"{label:<22} {result.seconds:>8.1f} s {result.size / 1024 ** 3:>7.2f} GB "
+          f"{len(latencies):>7} writes  p50 {statistics.median(latencies) * 1000:>7.1f} ms "
+          f"max {latencies[-1] * 1000:>8.1f} ms  failed {writer.errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--habits", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=3650)
+    parser.add_argument("--step-pages", type=int, default=1024)
+    parser.add_argument("--write-interval", type=float, default=0.01)
+    parser.add_argument("--wal", action="store_true", help="Put the database in WAL mode")
+    parser.add_argument("--directory", help="Where to create the files (default: a temporary directory)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        path = os.path.join(directory, "habits.db")
+        engine = create_engine(f"sqlite:///{path}")
+        upgrade_db(engine)
+        with sessionmaker(bind=engine)() as session:
+            started = time.perf_counter()
+            result = seed_habits(session, generate_habit_specs(args.habits, random.Random(0)),
+                                 history_days=args.days, batch_size=50000)
+        engine.dispose()
+        if args.wal:
+            sqlite3.connect(path).execute("PRAGMA journal_mode=WAL").fetchone()
+        print(f"{result.habits} habits, {result.completions} completions, "
+              f"{os.path.getsize(path) / 1024 ** 3:.2f} GB, seeded in {time.perf_counter() - started:.0f} s, "
+              f"{'WAL' if args.wal else 'rollback journal'} mode")
+
+        plain = os.path.join(directory, "backup.db")
+        compressed = os.path.join(directory, "backup.db.gz")
+        measure("backup", lambda: backup_database(plain, path, step_pages=args.step_pages),
+                path, args.write_interval)
+        measure("backup (gzip)", lambda: backup_database(compressed, path, step_pages=args.step_pages),
+                path, args.write_interval)
+        measure("restore (gzip)", lambda: restore_database(compressed, path, step_pages=args.step_pages),
+                path, args.write_interval)
+
+
+if __name__ == "__main__":
+    main()
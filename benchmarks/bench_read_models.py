@@ -0,0 +1,96 @@
+"""
+Memory benchmark: ORM objects versus the read-only rows of the read paths.
+
+Builds a temporary database with the requested number of daily completions
+and reports the bytes allocated per row when loading the habits as ORM Habit
+instances and as HabitSummary read models, and the completions as ORM
+DailyCompletion instances and as the column-only rows that recompute_streaks
+and the history command read.
+
+Usage:
+    python3 benchmarks/bench_read_models.py --rows 1000000
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+from models import Base, Habit, Completion, DailyCompletion
+from readmodels import load_habit_summaries
+
+
+def build_database(url, rows, days_per_habit=100, batch_size=50000):
+    """Create a database with `rows` daily completions spread over habits."""
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    habit_count = (rows + days_per_habit - 1) // days_per_habit
+    start = datetime(2020, 1, 1, 8, 0)
+    with engine.begin() as conn:
+        conn.execute(insert(Habit), [
+            {"id": habit_id, "name": f"Habit {habit_id}", "periodicity": "daily",
+             "created_at": start, "current_streak": 0, "max_streak": 0}
+            for habit_id in range(1, habit_count + 1)
+        ])
+        batch = []
+        for index in range(rows):
+            completed_at = start + timedelta(days=index % days_per_habit)
+            batch.append({"habit_id": index // days_per_habit + 1,
+                          "kind": "daily", "period_start": completed_at.date(), "completed_at": completed_at})
+            if len(batch) == batch_size:
+                conn.execute(insert(DailyCompletion), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(DailyCompletion), batch)
+    return engine, habit_count
+
+
+def measure(label, rows, load):
+    """Run `load`, keep its result alive and report allocated bytes per row."""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(result) == rows
+    print(f"{label:<28} {current / rows:>8.0f} B/row retained "
+          f"{peak / rows:>8.0f} B/row peak {elapsed:>7.2f} s")
+    del result
+    gc.collect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine, habits = build_database(f"sqlite:///{os.path.join(directory, 'bench.db')}", args.rows)
+        Session = sessionmaker(bind=engine)
+        print(f"{habits} habits, {args.rows} completions")
+
+        with Session() as session:
+            measure("ORM Habit", habits, lambda: session.query(Habit).all())
+        with Session() as session:
+            measure("HabitSummary", habits, lambda: load_habit_summaries(session))
+        with Session() as session:
+            measure("ORM DailyCompletion", args.rows, lambda: session.query(DailyCompletion).all())
+        with Session() as session:
+            measure("Column-only completion rows", args.rows, lambda: session.execute(
+                select(Completion.habit_id, Completion.kind, Completion.completed_at)
+                .order_by(Completion.habit_id, Completion.period_start)
+            ).all())
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
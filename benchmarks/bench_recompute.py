@@ -0,0 +1,76 @@
+"""
+Streak recomputation benchmark: ORM habit-by-habit versus streamed process pool.
+
+Seeds a temporary database with generated habits and times recomputing the
+streaks of every habit with the per-habit ORM methods (lazy loading the
+completions of each habit), with recompute_streaks in a single process and
+with recompute_streaks on a pool of worker processes.
+
+Usage:
+    python3 benchmarks/bench_recompute.py --habits 5000 --days 365 --workers 4
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import upgrade_db
+from maintenance import recompute_streaks
+from models import Habit
+from seeding import generate_habit_specs, seed_habits
+
+
+def recompute_with_orm(session):
+    """The serial path: load every habit and recalculate its streaks with lazy loads."""
+    for habit in session.query(Habit):
+        habit.refresh_streaks()
+    session.commit()
+
+
+def measure(label, Session, run, baseline=None):
+    """Time `run` with a fresh session and print the elapsed time and speedup."""
+    with Session() as session:
+        # Force every habit to be rewritten so all paths do the same work
+        session.query(Habit).update({Habit.current_streak: -1, Habit.max_streak: -1})
+        session.commit()
+        started = time.perf_counter()
+        run(session)
+        elapsed = time.perf_counter() - started
+    speedup = f"{baseline / elapsed:>6.1f}x" if baseline else ""
+    print(f"{label:<32} {elapsed:>8.2f} s {speedup}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--habits", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--partition-size", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        upgrade_db(engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as session:
+            result = seed_habits(session, generate_habit_specs(args.habits, random.Random(0)),
+                                 history_days=args.days)
+        print(f"{result.habits} habits, {result.completions} completions")
+
+        baseline = measure("ORM, habit by habit", Session, recompute_with_orm)
+        measure("recompute_streaks, 1 process", Session,
+                lambda session: recompute_streaks(session, 1, args.partition_size), baseline)
+        measure(f"recompute_streaks, {args.workers} workers", Session,
+                lambda session: recompute_streaks(session, args.workers, args.partition_size), baseline)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Tick latency benchmark: finding due habits through the next_due_at index.
+
+Builds a temporary database with the requested number of habits whose last
+completions mostly fall in their current or previous period and times
+scheduler ticks with find_due_habits. The first tick also moves the missed deadlines forward;
+the following ticks are the steady state. As a baseline, the due habits are
+derived from every habit's last completion in Python, which is what a tick
+costs without the maintained column.
+
+Usage:
+    python3 benchmarks/bench_reminders.py --habits 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, UTC
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import sessionmaker
+from models import Base, Habit, due_datetime
+from periods import get_period_rule
+from reminders import ReminderSink, find_due_habits, send_reminders
+
+PERIODICITIES = ("daily", "daily", "daily", "weekly", "every 3 days")
+
+
+class NullSink(ReminderSink):
+    """Counts reminders without delivering them."""
+
+    def __init__(self):
+        self.sent = 0
+
+    def send(self, reminders):
+        self.sent += len(reminders)
+
+
+def build_database(url, habits, now, batch_size=50000):
+    """Create a database with `habits` habits, most completed within their last period or two."""
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    today = now.date()
+    with engine.begin() as conn:
+        batch = []
+        for habit_id in range(1, habits + 1):
+            periodicity = PERIODICITIES[habit_id % len(PERIODICITIES)]
+            rule = get_period_rule(periodicity)
+            last_completed = now - timedelta(days=rng.expovariate(1.0) * rule.length_days)
+            batch.append({
+                "id": habit_id, "name": f"Habit {habit_id}", "periodicity": periodicity,
+                "created_at": now - timedelta(days=60), "current_streak": 1, "max_streak": 1,
+                "completion_count": 1, "last_completed_at": last_completed,
+                "next_due_at": due_datetime(rule.next_due(rule.period_key(last_completed), today)),
+            })
+            if len(batch) == batch_size:
+                conn.execute(insert(Habit), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Habit), batch)
+    return engine
+
+
+def scan_due_habits(session, now, within):
+    """Baseline: compute every habit's deadline from its last completion."""
+    horizon = now + within
+    due = []
+    rows = session.execute(
+        select(Habit.id, Habit.periodicity, Habit.last_completed_at).where(Habit.deleted_at.is_(None))
+    )
+    for habit_id, periodicity, last_completed_at in rows:
+        rule = get_period_rule(periodicity)
+        latest = rule.period_key(last_completed_at) if last_completed_at else None
+        if due_datetime(rule.next_due(latest, now.date())) <= horizon:
+            due.append(habit_id)
+    return due
+
+
+def timed(function, repeat):
+    """Run `function` `repeat` times and return the median seconds and the last result."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--habits", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    now = datetime(2024, 5, 1, 20, 0, tzinfo=UTC)
+    within = timedelta(hours=24)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = build_database(f"sqlite:///{os.path.join(directory, 'bench.db')}", args.habits, now)
+        Session = sessionmaker(bind=engine)
+        print(f"{args.habits} habits")
+
+        with engine.connect() as conn:
+            plan = conn.execute(text(
+                "EXPLAIN QUERY PLAN SELECT id FROM habits WHERE deleted_at IS NULL AND next_due_at <= :horizon"
+            ), {"horizon": (now + within).replace(tzinfo=None)}).all()
+        print("Query plan: " + "; ".join(row[-1] for row in plan))
+
+        sink = NullSink()
+        started = time.perf_counter()
+        send_reminders(Session, sink, now, within)
+        print(f"{'first tick (rolls missed)':<28} {(time.perf_counter() - started) * 1000:>9.1f} ms "
+              f"{sink.sent:>7} reminders")
+
+        with Session() as session:
+            tick, reminders = timed(lambda: find_due_habits(session, now, within), args.repeat)
+            scan, due = timed(lambda: scan_due_habits(session, now, within), args.repeat)
+        assert sorted(r.habit_id for r in reminders) == sorted(due)
+        print(f"{'indexed tick':<28} {tick * 1000:>9.1f} ms {len(reminders):>7} reminders")
+        print(f"{'full scan baseline':<28} {scan * 1000:>9.1f} ms {len(due):>7} reminders")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
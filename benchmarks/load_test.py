@@ -0,0 +1,93 @@
+"""
+Local load test for the HTTP API started with `hapi serve`.
+
+Sends GET requests from a number of concurrent client threads for a fixed
+duration and reports requests per second and latency percentiles. Only
+meant to be pointed at a server on this machine.
+
+Usage:
+    python3 main.py serve --quiet &
+    python3 benchmarks/load_test.py --path /habits --clients 8 --duration 10
+"""
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def run_client(host, port, path, deadline, headers, latencies, errors):
+    """Send requests over one keep-alive connection until the deadline."""
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException) as error:
+            errors.append(repr(error))
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/habits")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--etag", action="store_true",
+                        help="Send If-None-Match with the ETag of a first response")
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    if url.hostname not in ("127.0.0.1", "localhost", "::1"):
+        parser.error("the load test only targets local servers")
+
+    headers = {}
+    if args.etag:
+        connection = http.client.HTTPConnection(url.hostname, url.port)
+        connection.request("GET", args.path)
+        response = connection.getresponse()
+        response.read()
+        headers["If-None-Match"] = response.getheader("ETag", "")
+        connection.close()
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=run_client,
+                         args=(url.hostname, url.port, args.path, deadline, headers, latencies, errors))
+        for _ in range(args.clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"{args.path} with {args.clients} clients for {elapsed:.1f}s")
+    print(f"requests: {len(latencies)}  errors: {len(errors)}")
+    if latencies:
+        print(f"requests/sec: {len(latencies) / elapsed:.0f}")
+        print(f"latency p50: {percentile(latencies, 0.50) * 1000:.1f} ms  "
+              f"p99: {percentile(latencies, 0.99) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import os
+import re
+from dataclasses import dataclass, field, fields, replace
+from typing import Dict, Mapping, Optional
+
+CONFIG_ENV = "HAPI_CONFIG"
+ENV_PREFIX = "HAPI_"
+PRAGMA_ENV_PREFIX = "HAPI_PRAGMA_"
+
+_PRAGMA_NAME = re.compile(r"^[a-z_]+$")
+_PRAGMA_VALUE = re.compile(r"^-?[\w.]+$")
+_TRUE = {"1", "true", "yes", "on"}
+_FALSE = {"0", "false", "no", "off"}
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Deployment settings of hapi.
+
+    Every setting is taken from the first of these layers that sets it:
+    command line flags, HAPI_* environment variables (e.g. HAPI_DB_FILE,
+    HAPI_POOL_SIZE, HAPI_PRAGMA_JOURNAL_MODE), the config file and the
+    defaults below. The config file is a TOML file with the same keys
+    (pragmas in a [pragmas] table), read from HAPI_CONFIG or
+    $XDG_CONFIG_HOME/hapi/config.toml.
+
+    Attributes:
+        db_file (str): Database file, relative to the working directory unless absolute
+        test_db_file (str): Database file used with test=True
+        database_url (str): SQLite URL of the database, used instead of db_file if set
+        pool_size (int): Connections kept open by pooled engines, e.g. of the HTTP server
+        max_overflow (int): Connections pooled engines may open on top of pool_size
+        pragmas (Dict[str, str]): PRAGMAs run on every new connection, e.g. journal_mode = "WAL",
+                                  synchronous = "NORMAL", cache_size = "-65536" or mmap_size = "268435456"
+        period_index (bool): Use the period index file if it exists
+        period_index_file (str): Period index file written by 'build-index'
+        write_behind (bool): Queue completions of the HTTP server by default
+        history_file (str): Command history of the interactive shell
+    """
+    db_file: str = "habits.db"
+    test_db_file: str = "test_habits.db"
+    database_url: Optional[str] = None
+    pool_size: int = 5
+    max_overflow: int = 10
+    pragmas: Dict[str, str] = field(default_factory=dict)
+    period_index: bool = True
+    period_index_file: str = "habits.idx"
+    write_behind: bool = False
+    history_file: str = "~/.hapi_history"
+
+    def url(self, test: bool = False) -> str:
+        """
+        Get the SQLAlchemy URL of the database.
+
+        Args:
+            test (bool): If True, the URL of the test database
+
+        Returns:
+            str: Database URL
+        """
+        if test:
+            return f"sqlite:///{self.test_db_file}"
+        return self.database_url or f"sqlite:///{self.db_file}"
+
+    def database_path(self, test: bool = False) -> str:
+        """
+        Get the path of the database file.
+
+        Args:
+            test (bool): If True, the path of the test database
+
+        Returns:
+            str: Path of the database file
+        """
+        if test:
+            return self.test_db_file
+        if self.database_url:
+            return self.database_url.split(":///", 1)[1].split("?", 1)[0]
+        return self.db_file
+
+
+def default_config_path(environ: Mapping[str, str] = os.environ) -> str:
+    """
+    Get the path the config file is read from unless HAPI_CONFIG or --config is given.
+
+    Args:
+        environ (Mapping): Environment variables
+
+    Returns:
+        str: $XDG_CONFIG_HOME/hapi/config.toml, with ~/.config as default XDG_CONFIG_HOME
+    """
+    config_home = environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    return os.path.join(config_home, "hapi", "config.toml")
+
+
+def _convert(name: str, value, kind):
+    """Convert a value from a config file, variable or flag to the type of a setting."""
+    if kind is bool:
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in _TRUE | _FALSE:
+            return text in _TRUE
+        raise ValueError(f"{name} must be true or false, not {value!r}")
+    if kind is int:
+        if isinstance(value, bool):
+            raise ValueError(f"{name} must be a number, not {value!r}")
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number, not {value!r}") from None
+    if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+        raise ValueError(f"{name} must be a string, not {value!r}")
+    value = str(value)
+    return os.path.expanduser(value) if name.endswith("_file") else value
+
+
+def _check_pragmas(pragmas) -> Dict[str, str]:
+    """Validate pragma names and values, which are run as SQL on every connection."""
+    if not isinstance(pragmas, Mapping):
+        raise ValueError("pragmas must be a table of names and values")
+    checked = {}
+    for name, value in pragmas.items():
+        name = str(name).lower()
+        value = str(value).lower() if isinstance(value, bool) else str(value)
+        if not _PRAGMA_NAME.match(name) or not _PRAGMA_VALUE.match(value):
+            raise ValueError(f"Invalid pragma {name} = {value!r}")
+        checked[name] = value
+    return checked
+
+
+def _apply(settings: Settings, values: Mapping, source: str) -> Settings:
+    """Override settings with values from one layer."""
+    types = {setting.name: setting.type for setting in fields(Settings)}
+    changes = {}
+    for name, value in values.items():
+        if name not in types:
+            raise ValueError(f"Unknown setting {name!r} in {source}")
+        if name == "pragmas":
+            changes[name] = {**settings.pragmas, **_check_pragmas(value)}
+        else:
+            changes[name] = _convert(name, value, types[name] if types[name] in (int, bool) else str)
+    return replace(settings, **changes)
+
+
+def _read_config_file(path: str) -> dict:
+    """Parse a TOML config file."""
+    # Only imported when there is a file to read, so starting without one stays cheap
+    import tomllib
+    try:
+        with open(path, "rb") as file:
+            return tomllib.load(file)
+    except tomllib.TOMLDecodeError as error:
+        raise ValueError(f"{path} is not a valid config file: {error}") from error
+
+
+def _environment_values(environ: Mapping[str, str]) -> dict:
+    """Collect the settings set by HAPI_* environment variables."""
+    names = {setting.name for setting in fields(Settings)} - {"pragmas"}
+    values = {
+        name: environ[f"{ENV_PREFIX}{name.upper()}"]
+        for name in names if f"{ENV_PREFIX}{name.upper()}" in environ
+    }
+    pragmas = {
+        variable[len(PRAGMA_ENV_PREFIX):].lower(): value
+        for variable, value in environ.items() if variable.startswith(PRAGMA_ENV_PREFIX)
+    }
+    if pragmas:
+        values["pragmas"] = pragmas
+    return values
+
+
+def load_settings(config_path: Optional[str] = None, environ: Mapping[str, str] = os.environ,
+                  **overrides) -> Settings:
+    """
+    Load the settings from the defaults, the config file, the environment and overrides.
+
+    Args:
+        config_path (str, optional): Config file to read. Defaults to HAPI_CONFIG, then the XDG
+                                     config file if it exists
+        environ (Mapping): Environment variables
+        **overrides: Settings given on the command line; None values are ignored
+
+    Returns:
+        Settings: The merged settings
+
+    Raises:
+        ValueError: If a setting is unknown or invalid, or an explicitly given config file doesn't exist
+    """
+    settings = Settings()
+    path = config_path or environ.get(CONFIG_ENV)
+    if path:
+        if not os.path.exists(path):
+            raise ValueError(f"Config file {path} not found")
+    else:
+        path = default_config_path(environ)
+    if os.path.exists(path):
+        settings = _apply(settings, _read_config_file(path), path)
+    settings = _apply(settings, _environment_values(environ), "the environment")
+    settings = _apply(settings, {name: value for name, value in overrides.items() if value is not None},
+                      "the command line")
+    if settings.database_url and not settings.database_url.startswith("sqlite:///"):
+        raise ValueError("database_url must be a SQLite URL like sqlite:////path/to/habits.db")
+    if settings.pool_size < 1 or settings.max_overflow < 0:
+        raise ValueError("pool_size must be at least 1 and max_overflow not negative")
+    return settings
+
+
+_settings: Optional[Settings] = None
+
+
+def get_settings() -> Settings:
+    """
+    Get the settings of the process, loading them on first use.
+
+    Returns:
+        Settings: Settings set by configure, or loaded from the config file and the environment
+    """
+    global _settings
+    if _settings is None:
+        _settings = load_settings()
+    return _settings
+
+
+def configure(config_path: Optional[str] = None, **overrides) -> Settings:
+    """
+    Load the settings of the process once at startup, with command line overrides.
+
+    Args:
+        config_path (str, optional): Config file given on the command line
+        **overrides: Settings given on the command line; None values are ignored
+
+    Returns:
+        Settings: The loaded settings
+
+    Raises:
+        ValueError: If a setting is invalid
+    """
+    global _settings
+    _settings = load_settings(config_path, **overrides)
+    return _settings
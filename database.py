@@ -1,13 +1,96 @@
 import os
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import bindparam, create_engine, event, inspect, text
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
-from models import Base, Habit, DailyCompletion, WeeklyCompletion
-from datetime import datetime, timedelta, UTC
-import random
+from datetime import datetime, UTC
+from config import get_settings
+from models import Base, Habit, Completion, CompletionRun, HabitEvent, due_datetime
+from periods import get_period_rule
+from search import create_search_index
 from rich import print
 
-DB_FILE = "habits.db"
-TEST_DB_FILE = "test_habits.db"
+_engines = {}
+_session_factories = {}
+
+
+def get_database_path(test=False):
+    """
+    Get the path of the configured database file.
+
+    Args:
+        test (bool): If True, the test database file instead of production
+
+    Returns:
+        str: Path of the database file, see config.Settings
+    """
+    return get_settings().database_path(test)
+
+
+def _apply_pragmas(engine, pragmas):
+    """
+    Run the configured PRAGMAs on every new connection of an engine.
+
+    Args:
+        engine (Engine): SQLAlchemy engine
+        pragmas (dict): Pragma values by name, validated by config.load_settings
+    """
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def run_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def get_engine(test=False):
+    """
+    Return the engine of the database, creating it on first use.
+
+    The engine and its connection pool are shared by all sessions of the process.
+
+    Args:
+        test (bool): If True, uses test database file instead of production
+
+    Returns:
+        Engine: SQLAlchemy engine
+    """
+    settings = get_settings()
+    url = settings.url(test)
+    if url not in _engines:
+        engine = create_engine(url)
+        _apply_pragmas(engine, settings.pragmas)
+        _engines[url] = engine
+    return _engines[url]
+
+
+def create_pooled_engine(pool_size=None, max_overflow=None, test=False):
+    """
+    Create a separate engine with an explicitly sized connection pool for
+    multi-threaded use, e.g. by the HTTP server.
+
+    Args:
+        pool_size (int, optional): Number of connections kept open. Defaults to the configured pool_size
+        max_overflow (int, optional): Additional connections allowed under load. Defaults to the configured
+                                      max_overflow
+        test (bool): If True, uses test database file instead of production
+
+    Returns:
+        Engine: SQLAlchemy engine
+    """
+    settings = get_settings()
+    engine = create_engine(
+        settings.url(test),
+        pool_size=settings.pool_size if pool_size is None else pool_size,
+        max_overflow=settings.max_overflow if max_overflow is None else max_overflow,
+        connect_args={"check_same_thread": False},
+    )
+    _apply_pragmas(engine, settings.pragmas)
+    return engine
 
 
 def get_db_session(test=False):
@@ -20,50 +103,253 @@ def get_db_session(test=False):
     Returns:
         Session: SQLAlchemy database session
     """
-    db_file = TEST_DB_FILE if test else DB_FILE
-    engine = create_engine(f"sqlite:///{db_file}")
-    Session = sessionmaker(bind=engine)
-    return Session()
+    engine = get_engine(test)
+    if engine not in _session_factories:
+        _session_factories[engine] = sessionmaker(bind=engine)
+    return _session_factories[engine]()
+
+
+@contextmanager
+def read_transaction(engine):
+    """
+    Open a connection whose queries all read the same state of the database.
+
+    pysqlite runs plain SELECTs outside of a transaction, so each query
+    could see another commit. An explicit BEGIN makes SQLite keep one read
+    snapshot until the transaction is rolled back when the block ends.
+
+    Args:
+        engine (Engine): Engine of the database to read
+
+    Yields:
+        Connection: Connection inside the read transaction
+    """
+    with engine.connect() as conn:
+        conn.begin()
+        if not conn.connection.dbapi_connection.in_transaction:
+            conn.exec_driver_sql("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+
+
+def create_test_engine(db_file=None):
+    """
+    Create an engine for the test suite with the schema already in place.
+
+    Without a file the database lives in memory on a single shared
+    connection, so it is private to the process (and pytest-xdist worker).
+    Savepoints are enabled so each test can run in a transaction that is
+    rolled back afterwards.
+
+    Args:
+        db_file (str, optional): Path of a database file to use instead of memory
+
+    Returns:
+        Engine: SQLAlchemy engine
+    """
+    if db_file is None:
+        engine = create_engine(
+            "sqlite://",
+            poolclass=StaticPool,
+            connect_args={"check_same_thread": False},
+        )
+    else:
+        engine = create_engine(f"sqlite:///{db_file}")
+
+    # Let SQLAlchemy emit BEGIN itself; pysqlite's implicit transactions break SAVEPOINT
+    @event.listens_for(engine, "connect")
+    def disable_implicit_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin_transaction(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    upgrade_db(engine)
+    return engine
+
+
+# Version of the schema upgrade_db creates, stored in the database as PRAGMA user_version.
+# Increase it with every change of the models, their indexes or the search table.
+SCHEMA_VERSION = 2
+
+
+def get_schema_version(engine):
+    """
+    Get the schema version stored in a database.
+
+    Args:
+        engine (Engine): SQLAlchemy engine bound to the database
+
+    Returns:
+        int: The stored version, 0 for databases upgrade_db never finished on
+    """
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA user_version").scalar()
 
 
 def create_db(test=False):
     """
     Create database tables based on SQLAlchemy models.
 
+    The schema is only inspected and upgraded if the database's schema
+    version differs from SCHEMA_VERSION, so starting with an up-to-date
+    database costs a single PRAGMA.
+
     Args:
         test (bool): If True, creates test database instead of production
     """
-    db_file = TEST_DB_FILE if test else DB_FILE
-    engine = create_engine(f"sqlite:///{db_file}")
-    Base.metadata.create_all(engine)
+    engine = get_engine(test)
+    if get_schema_version(engine) != SCHEMA_VERSION:
+        upgrade_db(engine)
+
 
-def create_completion_date(base_date: datetime, days_ago: int, time_of_day: datetime.time = datetime.min.time()) -> datetime:
+def upgrade_db(engine):
     """
-    Create a completion date relative to a base date.
-    
+    Bring an existing database schema up to date with the models.
+
+    Creates missing tables, adds columns introduced after the database was
+    created and creates missing indexes. Completions of databases created
+    before the unified completions table are moved over with
+    migrate_completion_tables. Columns that need values derived from
+    existing data are backfilled once the completions are in place. Unique
+    indexes that existing duplicate rows violate are skipped with a warning
+    until the data is compacted. Finally the schema version is set to
+    SCHEMA_VERSION.
+
     Args:
-        base_date (datetime): The reference date to count back from
-        days_ago (int): Number of days to subtract
-        time_of_day (datetime.time, optional): Time of day for the completion. Defaults to midnight.
-    
+        engine (Engine): SQLAlchemy engine bound to the database
+
     Returns:
-        datetime: UTC-aware completion datetime
+        list: (table, column) pairs that were added
     """
-    completion_date = base_date - timedelta(days=days_ago)
-    return datetime.combine(completion_date.date(), time_of_day, tzinfo=UTC)
+    added = []
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    added.append((table.name, column.name))
+
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                try:
+                    with conn.begin_nested():
+                        index.create(conn, checkfirst=True)
+                except IntegrityError:
+                    print(f"[yellow]Skipped index {index.name}: duplicate rows found. "
+                          f"Run 'hapi compact' to remove them.[/yellow]")
+        create_search_index(conn)
 
-def get_week_start(date):
-        """
-        Calculate the Monday date for the week containing the given date.
+    migrate_completion_tables(engine)
+    if ("habits", "last_completed_at") in added:
+        with engine.begin() as conn:
+            backfill_completion_stats(conn)
+    if ("habits", "next_due_at") in added:
+        with engine.begin() as conn:
+            backfill_next_due(conn)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return added
 
-        Args:
-            date (date): Any date within the desired week
 
-        Returns:
-            date: The Monday of that week
-        """
-        return date - timedelta(days=date.weekday())
+# Completion tables replaced by the completions table, with the column holding their period
+LEGACY_COMPLETION_TABLES = {"daily_completions": "day", "weekly_completions": "week_start"}
+
+
+def migrate_completion_tables(engine, batch_size=50000):
+    """
+    Move the rows of the legacy daily and weekly completion tables into the completions table.
 
+    Rows are moved in batches of `batch_size` in id order. Each batch is
+    copied and deleted from the legacy table in its own transaction, so the
+    database stays usable between batches and an interrupted migration
+    continues where it stopped. A legacy table is dropped once it is
+    empty. Repeated completions of a habit on the same day, which older
+    versions could store, are merged into the latest one.
+
+    Args:
+        engine (Engine): SQLAlchemy engine bound to the database
+        batch_size (int): Number of rows moved per transaction
+
+    Returns:
+        int: Number of rows moved
+    """
+    moved = 0
+    for table, period_column in LEGACY_COMPLETION_TABLES.items():
+        with engine.connect() as conn:
+            if not inspect(conn).has_table(table):
+                continue
+            columns = {column["name"] for column in inspect(conn).get_columns(table)}
+        kind = "daily" if table == "daily_completions" else "weekly"
+        # Databases from before the day column derive it from the completion time
+        period = f"COALESCE({period_column}, date(completed_at))" if period_column in columns else "date(completed_at)"
+        while True:
+            with engine.begin() as conn:
+                last_id = conn.execute(text(
+                    f"SELECT id FROM {table} ORDER BY id LIMIT 1 OFFSET :offset"
+                ), {"offset": batch_size - 1}).scalar()
+                if last_id is None:
+                    last_id = conn.execute(text(f"SELECT MAX(id) FROM {table}")).scalar()
+                if last_id is None:
+                    conn.execute(text(f"DROP TABLE {table}"))
+                    break
+                result = conn.execute(text(
+                    f"INSERT INTO completions (habit_id, kind, period_start, completed_at) "
+                    f"SELECT habit_id, :kind, {period}, completed_at FROM {table} "
+                    f"WHERE id <= :last_id AND habit_id IS NOT NULL ORDER BY id "
+                    f"ON CONFLICT (habit_id, period_start) WHERE kind = 'daily' "
+                    f"DO UPDATE SET completed_at = MAX(completed_at, excluded.completed_at)"
+                ), {"kind": kind, "last_id": last_id})
+                moved += result.rowcount
+                conn.execute(text(f"DELETE FROM {table} WHERE id <= :last_id"), {"last_id": last_id})
+    return moved
+
+
+def backfill_completion_stats(conn):
+    """
+    Derive last_completed_at and completion_count from the completions table.
+
+    Args:
+        conn (Connection): SQLAlchemy connection inside a transaction
+    """
+    conn.execute(text(
+        "UPDATE habits SET "
+        "last_completed_at = (SELECT MAX(completed_at) FROM completions WHERE habit_id = habits.id), "
+        "completion_count = (SELECT COUNT(*) FROM completions WHERE habit_id = habits.id)"
+    ))
+
+def backfill_next_due(conn, at_time=None):
+    """
+    Derive next_due_at of every habit from its last completion.
+
+    The period of the last completion counts as completed, which is exact
+    for periodicities with one completion per period. For periodicities
+    needing several completions it may be a period early, so those habits
+    are reminded rather than missed; 'hapi recompute' sets the exact value.
+
+    Args:
+        conn (Connection): SQLAlchemy connection inside a transaction
+        at_time (datetime, optional): Reference time. Defaults to current UTC time
+    """
+    today = (at_time or datetime.now(UTC)).astimezone(UTC).date()
+    rows = conn.execute(text("SELECT id, periodicity, last_completed_at FROM habits")).all()
+    updates = []
+    for habit_id, periodicity, last_completed_at in rows:
+        rule = get_period_rule(periodicity)
+        latest_completed = None
+        if last_completed_at is not None and rule.quota == 1:
+            latest_completed = rule.period_key(datetime.fromisoformat(str(last_completed_at)))
+        updates.append({"habit_id": habit_id, "next_due_at": due_datetime(rule.next_due(latest_completed, today))})
+    if updates:
+        habits = Habit.__table__
+        conn.execute(habits.update().where(habits.c.id == bindparam("habit_id")), updates)
 
 def seed_predefined_habits(session):
     """
@@ -73,161 +359,54 @@ def seed_predefined_habits(session):
     Args:
         session (Session): SQLAlchemy database session
     """
-    # Get the current time in UTC for our base date
-    now = datetime.now(UTC)
-    base_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    # Create habits with correct created_at date
-    created_at_date = base_date - timedelta(days=30)
-
-    habits = [
-        Habit(
-            id=1,
-            name="Exercise",
-            description="30 minutes of exercise",
-            periodicity="daily",
-            created_at=created_at_date,
-        ),
-        Habit(
-            id=2,
-            name="Read",
-            description="Read for 30 minutes",
-            periodicity="daily",
-            created_at=created_at_date,
-        ),
-        Habit(
-            id=3,
-            name="Meditate",
-            description="Meditate for 10 minutes",
-            periodicity="daily",
-            created_at=created_at_date,
-        ),
-        Habit(
-            id=4,
-            name="Clean kitchen",
-            description="Deep clean the kitchen",
-            periodicity="weekly",
-            created_at=created_at_date,
-        ),
-        Habit(
-            id=5,
-            name="Walk dog",
-            description="Walk the dog for 30 minutes",
-            periodicity="daily",
-            created_at=created_at_date,
-        ),
-    ]
-    session.add_all(habits)
-    session.flush()  # Ensure all habits have IDs before creating completions
-
-    # Create predefined completions
-    today = datetime.now(UTC).date()
-
-    # Exercise: Consistent with a break in the middle
-    for i in range(30):
-        if i not in range(10, 18):  # 8-day break from day 10 to 17
-            session.add(
-                DailyCompletion(
-                    habit_id=1,
-                    completed_at=create_completion_date(base_date, i)
-                )
-            )
-
-    # Read: Perfect streak for the whole month
-    for i in range(30):
-        session.add(
-            DailyCompletion(
-                habit_id=2,
-                completed_at=create_completion_date(base_date, i)
-            )
-        )
-
-    # Meditate: Inconsistent with multiple breaks
-    for i in range(30):
-        if i % 3 != 0 and i % 7 != 0:  # Skip every 3rd and 7th day
-            session.add(
-                DailyCompletion(
-                    habit_id=3,
-                    completed_at=create_completion_date(base_date, i)
-                )
-            )
-
-    # Clean kitchen: Weekly habit, missed once, with multiple completions in some weeks
-    for i in range(0, 30, 7):
-        week_start = get_week_start(base_date.date() - timedelta(days=i))
-        if i != 14:  # Missed on the 3rd week
-            # First completion of the week
-            session.add(
-                WeeklyCompletion(
-                    habit_id=4,
-                    week_start=week_start,
-                    completed_at=create_completion_date(base_date, i, datetime.strptime("10:00", "%H:%M").time())
-                )
-            )
-            # Add a second completion in the first and fourth weeks
-            if i in [0, 28]:
-                session.add(
-                    WeeklyCompletion(
-                        habit_id=4,
-                        week_start=week_start,
-                        completed_at=create_completion_date(base_date, i, datetime.strptime("15:00", "%H:%M").time())
-                    )
-                )
-
-    # Walk dog: Very consistent with just a couple misses
-    for i in range(30):
-        if i not in [7, 23, 30]:  # Missed only on day 7 and 23, 30
-            session.add(
-                DailyCompletion(
-                    habit_id=5,
-                    completed_at=create_completion_date(base_date, i)
-                )
-            )
-    
-    # After all completions are added, but before commit, calculate streaks
-    for habit in habits:
-        habit.current_streak = habit.calculate_streak(now)
-        habit.max_streak = habit.calculate_max_streak()
-
-    session.commit()
+    # Only needed when a new database is created
+    from seeding import PREDEFINED_HABITS, seed_habits
+    seed_habits(session, PREDEFINED_HABITS, history_days=30)
     session.close()
 
 
 def clear_test_data(session):
     """
-    Remove all data from Habit, DailyCompletion, and WeeklyCompletion tables.
+    Remove all data from the Habit, Completion, CompletionRun and HabitEvent tables.
 
     Args:
         session (Session): SQLAlchemy database session
     """
     session.query(Habit).delete()
-    session.query(DailyCompletion).delete()
-    session.query(WeeklyCompletion).delete()
+    session.query(Completion).delete()
+    session.query(CompletionRun).delete()
+    session.query(HabitEvent).delete()
     session.commit()
 
 
 def setup_test_db():
     """
     Initialize test database.
-    Creates a new database file if it doesn't exist.
+    Creates a new database file if it doesn't exist and upgrades its schema.
     """
-    if not os.path.exists(TEST_DB_FILE):
-        create_db(test=True)
+    create_db(test=True)
     session = get_db_session(test=True)
     clear_test_data(session)
     session.close()
 
 
-def ensure_prod_db_exists():
+def ensure_prod_db_exists(verbose=True):
     """
     Ensure production database exists and is seeded with initial data.
-    Creates a new database file with default habits if it doesn't exist.
+    Creates a new database file with default habits if it doesn't exist,
+    otherwise upgrades the schema of the existing file.
+
+    Args:
+        verbose (bool): If True, prints the database status
     """
-    if not os.path.exists(DB_FILE):
+    if not os.path.exists(get_database_path()):
         create_db()
         session = get_db_session()
         seed_predefined_habits(session)
         session.close()
-        print(f"[green]Created database and added default habits.[/green]")
+        if verbose:
+            print(f"[green]Created database and added default habits.[/green]")
     else:
-        print(f"[green]Habit data loaded.[/green]")
+        create_db()
+        if verbose:
+            print(f"[green]Habit data loaded.[/green]")
@@ -0,0 +1,103 @@
+import json
+import threading
+from datetime import datetime, UTC
+from typing import Callable, Iterator, NamedTuple, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import HabitEvent
+
+
+class EventRecord(NamedTuple):
+    """
+    Read-only entry of the habit event log.
+
+    Attributes:
+        seq (int): Sequence number; pass the last one seen as `since` to continue
+        event_type (str): Kind of change, e.g. 'habit_completed'
+        habit_id (int): ID of the changed habit
+        occurred_at (datetime): UTC-aware time the event was recorded
+        data (dict): Details of the change
+    """
+    seq: int
+    event_type: str
+    habit_id: int
+    occurred_at: datetime
+    data: dict
+
+    def to_json(self) -> str:
+        """Return the event as a single line of JSON."""
+        return json.dumps({
+            "seq": self.seq, "type": self.event_type, "habit_id": self.habit_id,
+            "occurred_at": self.occurred_at.isoformat(), "data": self.data,
+        })
+
+
+def iter_events(session: Session, since: int = 0, batch_size: int = 1000,
+                limit: Optional[int] = None) -> Iterator[EventRecord]:
+    """
+    Stream the events recorded after a sequence number, oldest first.
+
+    Events are read in keyset pages on the primary key, so each page is a
+    range query however long the log is, and memory stays bounded by
+    batch_size.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        since (int): Only events with a higher sequence number are returned
+        batch_size (int): Events loaded per query
+        limit (int, optional): Stop after this many events
+
+    Yields:
+        EventRecord: The events in sequence order
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive")
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_size = batch_size if remaining is None else min(batch_size, remaining)
+        rows = session.execute(
+            select(HabitEvent.seq, HabitEvent.event_type, HabitEvent.habit_id,
+                   HabitEvent.occurred_at, HabitEvent.payload)
+            .where(HabitEvent.seq > since)
+            .order_by(HabitEvent.seq)
+            .limit(page_size)
+        ).all()
+        for seq, event_type, habit_id, occurred_at, payload in rows:
+            yield EventRecord(seq, event_type, habit_id, occurred_at.replace(tzinfo=UTC), json.loads(payload))
+        if len(rows) < page_size:
+            return
+        since = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def follow_events(session_factory: Callable[[], Session], since: int = 0, poll_interval: float = 1.0,
+                  stop: Optional[threading.Event] = None, batch_size: int = 1000) -> Iterator[EventRecord]:
+    """
+    Stream the events after a sequence number and keep waiting for new ones until `stop` is set.
+
+    Args:
+        session_factory (Callable): Returns a new SQLAlchemy session
+        since (int): Only events with a higher sequence number are returned
+        poll_interval (float): Seconds to wait before checking for new events again
+        stop (threading.Event, optional): Ends the stream when set
+        batch_size (int): Events loaded per query
+
+    Yields:
+        EventRecord: The events in sequence order
+    """
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        # Load a page and close the session before handing out the events,
+        # so a slow consumer never keeps the database busy
+        session = session_factory()
+        try:
+            events = list(iter_events(session, since, batch_size, limit=batch_size))
+        finally:
+            session.close()
+        for event in events:
+            yield event
+        if events:
+            since = events[-1].seq
+        if len(events) < batch_size:
+            stop.wait(poll_interval)
@@ -1,232 +1,1129 @@
+import cmd
+import json
+import random
+import sys
+import time
+from typing import List, Optional
 import typer
 from rich import print
 from rich.console import Console
+from rich.progress import Progress
 from rich.table import Table
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import Base, Habit
+from sqlalchemy.orm import Session, sessionmaker
+from models import (
+    Base, Habit, Completion, Goal, get_active_habit, record_event, HABIT_CREATED, HABIT_UPDATED, HABIT_DELETED, GOAL_KINDS,
+)
 import os
-from database import get_db_session, ensure_prod_db_exists
+from config import configure, get_settings
+from database import get_db_session, get_engine, ensure_prod_db_exists, create_pooled_engine, create_db
 import analytics
-from datetime import datetime, UTC
+from readmodels import iter_habit_summary_pages, load_goal_progress, SummaryCache, HABIT_SORT_COLUMNS
+from periods import get_period_rule
+from search import find_habits, pick_habit, resolve_habit
+from maintenance import (
+    refresh_stale_streaks, compact_daily_completions, archive_completions, vacuum_database, recompute_streaks,
+    purge_deleted_habits,
+)
+from datetime import datetime, timedelta, UTC
 
 app = typer.Typer(name="hapi")
 console = Console()
 
 
+def parse_pragmas(values):
+    """
+    Parse PRAGMAs given on the command line.
+
+    Args:
+        values (List[str]): Pragmas as 'NAME=VALUE', e.g. 'journal_mode=WAL'
+
+    Returns:
+        dict: Values by pragma name, None if no pragma is given
+
+    Raises:
+        ValueError: If a pragma isn't given as NAME=VALUE
+    """
+    if not values:
+        return None
+    pragmas = {}
+    for value in values:
+        name, separator, pragma_value = value.partition("=")
+        if not separator:
+            raise ValueError(f"Pragma must be given as NAME=VALUE, not {value!r}")
+        pragmas[name.strip()] = pragma_value.strip()
+    return pragmas
+
+
 @app.callback(invoke_without_command=True)
-def main(ctx: typer.Context):
+def main(
+    ctx: typer.Context,
+    config: Optional[str] = typer.Option(
+        None, help="Config file to read instead of $HAPI_CONFIG or $XDG_CONFIG_HOME/hapi/config.toml"
+    ),
+    db_file: Optional[str] = typer.Option(None, help="Database file"),
+    database_url: Optional[str] = typer.Option(None, help="SQLite URL of the database, instead of --db-file"),
+    pragma: Optional[List[str]] = typer.Option(
+        None, help="PRAGMA run on every connection as NAME=VALUE, e.g. journal_mode=WAL; repeat for several"
+    ),
+    period_index: Optional[bool] = typer.Option(
+        None, "--period-index/--no-period-index", help="Use the period index file if it exists"
+    ),
+):
     """
     Hapi: Manage and analyze your habits
     """
-    print("\n")
-    print("[bold green]Welcome to HAPI - Your Personal Habit Tracker![/bold green]")
-    ensure_prod_db_exists()
+    try:
+        settings = configure(
+            config, db_file=db_file, database_url=database_url, pragmas=parse_pragmas(pragma),
+            period_index=period_index,
+        )
+    except ValueError as error:
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+    interactive = ctx.invoked_subcommand is None
+    if interactive:
+        print("\n")
+        print("[bold green]Welcome to HAPI - Your Personal Habit Tracker![/bold green]")
+    ensure_prod_db_exists(verbose=interactive)
+    if settings.period_index and os.path.exists(settings.period_index_file):
+        from periodindex import enable_period_index
+        try:
+            enable_period_index(settings.period_index_file)
+        except ValueError as error:
+            print(f"[yellow]{error}, run 'build-index' to rebuild it[/yellow]")
 
-    if ctx.invoked_subcommand is None:
-        show_main_menu()
+    if interactive:
+        run_shell()
 
 
-def show_main_menu():
-    while True:
-        display_habits()
-        choice = typer.prompt(
-            "\nWhat would you like to do?\n"
-            "1. Complete a Habit\n"
-            "2. Add a Habit\n"
-            "3. Edit a Habit\n"
-            "4. Delete a Habit\n"
-            "5. Analytics\n"
-            "6. Exit\n"
-            "Enter your choice"
+HISTORY_LENGTH = 1000
+
+
+class HabitShell(cmd.Cmd):
+    """
+    Interactive mode of hapi: a prompt with command history and tab completion
+    of habit names.
+
+    All commands share one session bound to one connection for the whole
+    shell. Habit summaries are served from a SummaryCache, so listing habits
+    and the analytics commands answer from memory until a habit is changed,
+    by a command of the shell or by another process.
+
+    Args:
+        session (Session): Session bound to the connection held by the shell
+        **kwargs: Passed on to cmd.Cmd, e.g. stdin and stdout
+    """
+    intro = "Type 'help' for the commands, 'help COMMAND' for details and 'exit' to leave."
+    prompt = "hapi> "
+
+    def __init__(self, session, **kwargs):
+        super().__init__(**kwargs)
+        self.session = session
+        self.cache = SummaryCache(session)
+
+    def preloop(self):
+        self.do_list("")
+
+    def onecmd(self, line):
+        try:
+            return super().onecmd(line)
+        except ValueError as error:
+            self.session.rollback()
+            self.cache.invalidate()
+            print(f"[red]{error}[/red]")
+            return False
+
+    def postcmd(self, stop, line):
+        # End the command's transaction, so no read snapshot is kept while waiting for input
+        self.session.rollback()
+        return stop
+
+    def emptyline(self):
+        # cmd.Cmd would repeat the last command
+        return False
+
+    def default(self, line):
+        print(f"[red]Unknown command '{line.split()[0]}', type 'help' for the commands[/red]")
+
+    def _summaries(self, periodicity=None):
+        """Get the cached summaries, resetting lapsed streaks before they are reloaded."""
+        if self.cache.is_stale() and refresh_stale_streaks(self.session):
+            self.session.commit()
+        return self.cache.summaries(periodicity)
+
+    def _find_habit(self, arg):
+        """
+        Find an active habit by ID or name.
+
+        IDs and exact names are looked up in the cache; prefixes, parts of
+        names and misspelled names in the search index (see search.py).
+
+        Args:
+            arg (str): ID, name (ignoring case), unique prefix or unique part of the name of the habit
+
+        Returns:
+            HabitSummary: The habit
+
+        Raises:
+            ValueError: If no single habit matches
+        """
+        arg = " ".join(arg.split())
+        if not arg:
+            raise ValueError("Name or ID of a habit is required.")
+        self._summaries()
+        if arg.isdigit() and self.cache.get(int(arg)):
+            return self.cache.get(int(arg))
+        matches = self.cache.find(arg)
+        if len(matches) == 1:
+            return matches[0]
+        habit = self.cache.get(pick_habit(arg, find_habits(self.session, arg)).id)
+        if habit is None:
+            raise ValueError(f"Habit '{arg}' not found.")
+        return habit
+
+    def _commit(self):
+        """Commit a change made by a command and reload the summaries on next use."""
+        self.session.commit()
+        self.cache.invalidate()
+
+    def _complete_habit_name(self, text, line, begidx, endidx):
+        """Complete the habit name being typed, which may contain spaces."""
+        typed = line[:endidx].split(" ", 1)[1].lstrip()
+        # readline only replaces the last word, so skip the words typed before it
+        offset = len(typed) - len(text)
+        self._summaries()
+        return [
+            name[offset:] for name in dict.fromkeys(self.cache.names())
+            if name.casefold().startswith(typed.casefold())
+        ]
+
+    complete_complete = complete_edit = complete_delete = _complete_habit_name
+    complete_streak = complete_since = _complete_habit_name
+
+    def do_list(self, arg):
+        """list [PERIODICITY]: Show the habits, e.g. 'list' or 'list daily'."""
+        periodicity = get_period_rule(arg.strip()).name if arg.strip() else None
+        habits = self._summaries(periodicity)
+        if not habits:
+            print("No habits found, add one with 'add'.")
+            return
+        rows = [format_habit_row(habit, self.cache.goals(habit.id)) for habit in habits]
+        print_table_pages("Your Habits", HABIT_TABLE_COLUMNS, [rows])
+
+    def do_complete(self, arg):
+        """complete HABIT: Complete a habit, given by name or ID."""
+        habit = get_active_habit(self.session, self._find_habit(arg).id)
+        name = habit.name
+        habit.complete(self.session)
+        self._commit()
+        print(f"[green]Habit '{name}' completed![/green]")
+
+    def do_add(self, arg):
+        """add [NAME]: Add a habit; asks for the name, description and periodicity."""
+        name = arg.strip() or typer.prompt("Enter habit name")
+        description = typer.prompt("Enter habit description")
+        periodicity = typer.prompt("Enter habit periodicity (daily, weekly, 'every N days' or 'X times per week')")
+        add_habit(self.session, name, description, periodicity)
+        self.cache.invalidate()
+        print(f"[green]Created new habit: {name}[/green]")
+
+    def do_edit(self, arg):
+        """edit HABIT: Change the name and description of a habit."""
+        habit = get_active_habit(self.session, self._find_habit(arg).id)
+        name = typer.prompt("Enter new name (or press Enter to keep current)", default=habit.name)
+        description = typer.prompt(
+            "Enter new description (or press Enter to keep current)", default=habit.description,
         )
+        changes = {
+            field: value for field, value in (("name", name), ("description", description))
+            if getattr(habit, field) != value
+        }
+        if changes:
+            for field, value in changes.items():
+                setattr(habit, field, value)
+            record_event(self.session, HABIT_UPDATED, habit, **changes)
+            self._commit()
+        print(f"[green]Habit '{name}' updated![/green]")
+
+    def do_delete(self, arg):
+        """delete HABIT: Delete a habit; its completions are removed later by 'hapi purge'."""
+        habit = get_active_habit(self.session, self._find_habit(arg).id)
+        name = habit.name
+        habit.soft_delete()
+        record_event(self.session, HABIT_DELETED, habit, deleted_at=habit.deleted_at.isoformat())
+        self._commit()
+        print(f"[green]Habit '{name}' deleted![/green]")
 
-        if choice == "1":
-            complete_habit()
-        elif choice == "2":
-            create_habit_interactive()
-        elif choice == "3":
-            edit_habit()
-        elif choice == "4":
-            delete_habit()
-        elif choice == "5":
-            show_analytics_menu()
-        elif choice == "6":
-            print("Goodbye!")
-            raise typer.Exit()
+    def do_streak(self, arg):
+        """streak [HABIT]: Show the longest run streak of all habits, or of one habit."""
+        if arg.strip():
+            habit = self._find_habit(arg)
+            print(f"Longest run streak for '{habit.name}': {habit.max_streak}")
         else:
-            print("Invalid choice. Please try again.")
+            streak = max((habit.max_streak for habit in self._summaries()), default=0)
+            print(f"Longest run streak: {streak}")
 
+    def do_since(self, arg):
+        """since HABIT: Show the days since a habit was last completed."""
+        habit = self._find_habit(arg)
+        if habit.last_completed_at is None:
+            print(f"'{habit.name}' was never completed")
+            return
+        days = (datetime.now(UTC) - habit.last_completed_at.replace(tzinfo=UTC)).days
+        print(f"Days since last completion of '{habit.name}': {days}")
 
-def display_habits():
-    session = get_db_session()
-    habits = session.query(Habit).all()
+    def do_refresh(self, arg):
+        """refresh: Reload the habits from the database and show them."""
+        self.cache.invalidate()
+        self.do_list("")
 
-    # Recalculate current streaks before display
-    current_time = datetime.now(UTC)
-    for habit in habits:
-        habit.current_streak = habit.calculate_streak(current_time)
-        session.commit()
+    def do_exit(self, arg):
+        """exit: Leave hapi (also 'quit' or Ctrl-D)."""
+        return True
+
+    do_quit = do_exit
+
+    def do_EOF(self, arg):
+        print()
+        return True
+
+    def get_names(self):
+        # Ctrl-D ends the shell through do_EOF, which is no command to list in the help
+        return [name for name in super().get_names() if name != "do_EOF"]
 
-    table = Table(title="Your Habits")
-    table.add_column("ID", style="cyan")
-    table.add_column("Name", style="magenta")
-    table.add_column("Start Date", style="blue")
-    table.add_column("Periodicity", style="green")
-    table.add_column("Current Streak", style="red")
-    table.add_column("Record Streak", style="yellow")
-    table.add_column("Last Completion", style="blue")
-    
-
-    for habit in habits:
-        streak_icon = "🔥" if habit.current_streak > 0 else ""
-        trophy_icon = "🏆" if habit.max_streak > 0 else ""
-        formatted_start_date = habit.created_at.strftime("%m-%d-%Y")
-
-        # Format last completion time
-        last_completion = habit.get_last_completion()
-        formatted_last_completion = (last_completion.strftime("%m-%d-%Y %H:%M") 
-                             if last_completion 
-                             else "Never")
-        table.add_row(
-            str(habit.id),
-            habit.name,
-            formatted_start_date,
-            habit.periodicity,
-            f"{streak_icon} {habit.current_streak}",
-            f"{trophy_icon} {habit.max_streak}",
-            formatted_last_completion,
-        )
 
-    console.print(table)
+def run_shell():
+    """
+    Run the interactive shell on one connection that is held until it exits.
+
+    The command history is kept in the configured history_file if the
+    readline module is available, which it is not on Windows.
+    """
+    try:
+        import readline
+    except ImportError:
+        readline = None
+    history_file = os.path.expanduser(get_settings().history_file)
+    if readline is not None:
+        readline.set_history_length(HISTORY_LENGTH)
+        try:
+            readline.read_history_file(history_file)
+        except OSError:
+            pass
+
+    with get_engine().connect() as connection, Session(bind=connection) as session:
+        try:
+            HabitShell(session).cmdloop()
+        except KeyboardInterrupt:
+            print()
+        finally:
+            if readline is not None:
+                try:
+                    readline.write_history_file(history_file)
+                except OSError as error:
+                    print(f"[yellow]Command history not saved: {error}[/yellow]")
+    print("Goodbye!")
+
+
+HABIT_TABLE_COLUMNS = [
+    # (header, style, width) - fixed widths keep the columns of all pages aligned
+    ("ID", "cyan", 5),
+    ("Name", "magenta", 18),
+    ("Start Date", "blue", 10),
+    ("Periodicity", "green", 8),
+    ("Current Streak", "red", 9),
+    ("Record Streak", "yellow", 9),
+    ("Last Completion", "blue", 16),
+    ("Goals", "green", 18),
+]
+
+
+def print_table_pages(title, columns, pages):
+    """
+    Print table rows page by page as they are loaded.
+
+    Each page is rendered as soon as it arrives, so the first rows appear
+    without waiting for the rest; only the first page gets the title and header.
+
+    Args:
+        title (str): Table title
+        columns (list): (header, style, width) tuples
+        pages (iterable): Lists of row tuples
+    """
+    for number, rows in enumerate(pages):
+        table = Table(title=title if number == 0 else None, show_header=number == 0)
+        for header, style, width in columns:
+            table.add_column(header, style=style, width=width, overflow="fold")
+        for row in rows:
+            table.add_row(*row)
+        console.print(table)
+
+
+def format_goal(goal):
+    """
+    Format a goal's progress, e.g. '42/100 completions' or '30/30 streak ✓'.
+
+    Args:
+        goal (GoalProgress): Goal to format
+
+    Returns:
+        str: Progress, target and kind of the goal
+    """
+    achieved = " ✓" if goal.achieved_at is not None else ""
+    return f"{goal.progress}/{goal.target} {goal.kind}{achieved}"
+
+
+def format_habit_row(habit, goals=()):
+    """
+    Format a habit summary as a row of the habits table.
+
+    Args:
+        habit (HabitSummary): Habit to format
+        goals (Sequence[GoalProgress]): Goals of the habit
+
+    Returns:
+        tuple: Cell strings
+    """
+    streak_icon = "🔥" if habit.current_streak > 0 else ""
+    trophy_icon = "🏆" if habit.max_streak > 0 else ""
+    formatted_start_date = habit.created_at.strftime("%m-%d-%Y")
+
+    # Format last completion time
+    last_completion = habit.last_completed_at
+    formatted_last_completion = (last_completion.strftime("%m-%d-%Y %H:%M") 
+                         if last_completion 
+                         else "Never")
+    return (
+        str(habit.id),
+        habit.name,
+        formatted_start_date,
+        habit.periodicity,
+        f"{streak_icon} {habit.current_streak}",
+        f"{trophy_icon} {habit.max_streak}",
+        formatted_last_completion,
+        "\n".join(format_goal(goal) for goal in goals),
+    )
+
+
+def display_habits(page_size=50, periodicity=None, sort="id", descending=False, tag=None):
+    session = get_db_session()
+    # Reset lapsed streaks in bulk so the stored values can be displayed as-is
+    refresh_stale_streaks(session)
+    pages = iter_habit_summary_pages(session, page_size, periodicity, sort, descending, tag)
+
+    def format_page(page):
+        # One query loads the stored progress of all goals of the page
+        goals = load_goal_progress(session, [habit.id for habit in page])
+        return [format_habit_row(habit, goals.get(habit.id, ())) for habit in page]
+
+    print_table_pages("Your Habits", HABIT_TABLE_COLUMNS, (format_page(page) for page in pages))
     session.close()
 
 
-def complete_habit():
+def add_habit(session, name, description, periodicity):
+    """
+    Add a new habit together with its creation event and commit it.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        name (str): Name of the habit
+        description (str): Description of the habit
+        periodicity (str): Periodicity, e.g. 'daily' or '3 times per week'
+
+    Returns:
+        Habit: The new habit
+
+    Raises:
+        ValueError: If the periodicity is not supported
+    """
+    new_habit = Habit(name=name, description=description, periodicity=periodicity)
+    session.add(new_habit)
+    record_event(
+        session, HABIT_CREATED, new_habit,
+        name=name, description=description, periodicity=new_habit.periodicity,
+    )
+    session.commit()
+    return new_habit
+
+
+@app.command()
+def create_habit(name: str, description: str, periodicity: str):
+    """Create a new habit"""
     session = get_db_session()
-    habits = session.query(Habit).all()
+    try:
+        add_habit(session, name, description, periodicity)
+    except ValueError as error:
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+    finally:
+        session.close()
+    print(f"[green]Created new habit: {name}[/green]")
 
-    habit_id = typer.prompt("Enter the ID of the habit you want to complete")
-    habit = session.get(Habit, habit_id)
 
-    if habit:
-        habit.complete(session)
-        session.commit()
-        print(f"[green]Habit '{habit.name}' completed![/green]")
+HABIT_HELP = "ID or name of the habit; a unique prefix or part of the name is enough"
+
+
+def parse_completion_time(value):
+    """
+    Parse a completion time given on the command line.
+
+    Args:
+        value (str): ISO date or time, e.g. '2024-05-01' or '2024-05-01T07:30'; UTC unless an offset is given
+
+    Returns:
+        datetime: The time in UTC; dates without a time are taken as midnight UTC
+
+    Raises:
+        ValueError: If the value is not an ISO date or time
+    """
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid time '{value}', expected an ISO date or time like 2024-05-01T07:30") from None
+    return moment.astimezone(UTC) if moment.tzinfo else moment.replace(tzinfo=UTC)
+
+
+def get_habit_completion(session, habit, completion_id=None):
+    """
+    Get a completion of a habit by id, or its most recent completion.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        habit (Habit): The habit
+        completion_id (int, optional): ID of the completion
+
+    Returns:
+        Completion: The completion
+
+    Raises:
+        ValueError: If the habit has no such completion
+    """
+    query = session.query(Completion).filter(Completion.habit_id == habit.id)
+    if completion_id is not None:
+        completion = query.filter(Completion.id == completion_id).first()
     else:
-        print("[red]Habit not found.[/red]")
+        completion = query.order_by(Completion.period_start.desc(), Completion.completed_at.desc()).first()
+    if completion is None:
+        raise ValueError("Completion not found.")
+    return completion
 
-    session.close()
 
+@app.command()
+def history(
+    habit: str = typer.Argument(..., help=HABIT_HELP),
+    limit: int = typer.Option(20, help="Number of most recent completions to show"),
+):
+    """List the most recent completions of a habit with their IDs"""
+    session = get_db_session()
+    try:
+        habit = resolve_habit(session, habit)
+        completions = (
+            session.query(Completion.id, Completion.completed_at)
+            .filter(Completion.habit_id == habit.id)
+            .order_by(Completion.period_start.desc(), Completion.completed_at.desc())
+            .limit(limit)
+            .all()
+        )
+    except ValueError as error:
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+    finally:
+        session.close()
+    print_table_pages(
+        f"Completions of '{habit.name}'",
+        [("ID", "cyan", 8), ("Completed (UTC)", "blue", 16)],
+        [[(str(completion_id), completed_at.strftime("%Y-%m-%d %H:%M")) for completion_id, completed_at in completions]],
+    )
 
-def create_habit_interactive():
-    name = typer.prompt("Enter habit name")
-    description = typer.prompt("Enter habit description")
-    periodicity = typer.prompt("Enter habit periodicity (daily/weekly)")
-    create_habit(name, description, periodicity)
 
+def _change_completions(habit, change):
+    """
+    Apply a change to a habit's completions in one transaction and print the repaired streaks.
 
-def edit_habit():
+    Args:
+        habit (str): ID or name of the habit
+        change (Callable): Called with the session and the habit; returns the message to print
+    """
     session = get_db_session()
-    habit_id = typer.prompt("Enter the ID of the habit you want to edit")
-    habit = session.get(Habit, habit_id)
+    try:
+        habit = resolve_habit(session, habit)
+        message = change(session, habit)
+        session.commit()
+        print(f"[green]{message} Current streak: {habit.current_streak}, "
+              f"record streak: {habit.max_streak}.[/green]")
+    except ValueError as error:
+        session.rollback()
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+    finally:
+        session.close()
 
-    if habit:
-        name = typer.prompt(
-            "Enter new name (or press Enter to keep current)", default=habit.name
-        )
-        description = typer.prompt(
-            "Enter new description (or press Enter to keep current)",
-            default=habit.description,
-        )
 
-        habit.name = name
-        habit.description = description
+@app.command()
+def backfill(
+    habit: str = typer.Argument(..., help=HABIT_HELP),
+    when: str = typer.Argument(..., help="ISO date or time of the completion, UTC unless an offset is given"),
+):
+    """Record a completion that was forgotten at the time"""
+    def change(session, habit):
+        completed_at = habit.add_completion(session, parse_completion_time(when)).astimezone(UTC)
+        return f"Recorded a completion of '{habit.name}' at {completed_at:%Y-%m-%d %H:%M} UTC."
+    _change_completions(habit, change)
+
+
+@app.command()
+def undo(
+    habit: str = typer.Argument(..., help=HABIT_HELP),
+    completion_id: Optional[int] = typer.Option(None, help="Completion to remove (see 'history'); default: the latest"),
+):
+    """Remove a mistaken completion of a habit"""
+    def change(session, habit):
+        completion = get_habit_completion(session, habit, completion_id)
+        habit.remove_completion(session, completion)
+        return f"Removed the completion of '{habit.name}' from {completion.completed_at:%Y-%m-%d %H:%M} UTC."
+    _change_completions(habit, change)
+
+
+@app.command()
+def edit_completion(
+    habit: str = typer.Argument(..., help=HABIT_HELP),
+    completion_id: int = typer.Argument(..., help="Completion to correct (see 'history')"),
+    when: str = typer.Argument(..., help="Corrected ISO date or time, UTC unless an offset is given"),
+):
+    """Correct the time of a completion (see 'history' for completion IDs)"""
+    def change(session, habit):
+        completion = get_habit_completion(session, habit, completion_id)
+        completed_at = habit.move_completion(session, completion, parse_completion_time(when)).astimezone(UTC)
+        return f"Moved the completion of '{habit.name}' to {completed_at:%Y-%m-%d %H:%M} UTC."
+    _change_completions(habit, change)
+
+
+@app.command()
+def add_goal(
+    habit: str = typer.Argument(..., help=HABIT_HELP),
+    kind: str = typer.Argument(..., help=f"Goal kind: {', '.join(GOAL_KINDS)}"),
+    target: int = typer.Argument(..., help="Number of completions or streak length to reach"),
+):
+    """Set a goal for a habit"""
+    session = get_db_session()
+    try:
+        habit = resolve_habit(session, habit)
+        goal = habit.add_goal(kind, target)
         session.commit()
-        print(f"[green]Habit '{habit.name}' updated![/green]")
-    else:
-        print("[red]Habit not found.[/red]")
+        print(f"[green]Set goal {goal.id} for '{habit.name}': {format_goal(goal)}[/green]")
+    except ValueError as error:
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+    finally:
+        session.close()
 
-    session.close()
+
+@app.command()
+def remove_goal(goal_id: int):
+    """Remove a goal"""
+    session = get_db_session()
+    try:
+        goal = session.get(Goal, goal_id)
+        if goal is None:
+            print("[red]Goal not found.[/red]")
+            raise typer.Exit(code=1)
+        session.delete(goal)
+        session.commit()
+        print(f"[green]Goal {goal_id} removed.[/green]")
+    finally:
+        session.close()
 
 
-def delete_habit():
+@app.command()
+def goals(
+    achieved: Optional[bool] = typer.Option(None, "--achieved/--open", help="Only list achieved or open goals"),
+):
+    """List the goals of all habits with their progress"""
     session = get_db_session()
-    habit_id = typer.prompt("Enter the ID of the habit you want to delete")
-    habit = session.get(Habit, habit_id)
+    try:
+        names = {habit.id: habit.name for habit in analytics.get_all_habits(session)}
+        rows = [
+            (str(goal.id), names[habit_id], format_goal(goal),
+             goal.achieved_at.strftime("%m-%d-%Y %H:%M") if goal.achieved_at else "")
+            for habit_id, habit_goals in load_goal_progress(session, achieved=achieved).items()
+            for goal in habit_goals
+        ]
+        stats = analytics.get_goal_stats(session)
+    finally:
+        session.close()
+    print_table_pages(
+        "Goals",
+        [("ID", "cyan", 5), ("Habit", "magenta", 18), ("Progress", "green", 20), ("Achieved", "blue", 16)],
+        [sorted(rows, key=lambda row: int(row[0]))],
+    )
+    print(f"{stats['achieved']} of {stats['total']} goal(s) achieved.")
+
 
-    if habit:
-        session.delete(habit)
+@app.command()
+def tag(habit: str = typer.Argument(..., help=HABIT_HELP), names: List[str] = typer.Argument(..., help="Tags to add, e.g. health work")):
+    """Add tags to a habit"""
+    session = get_db_session()
+    try:
+        habit = resolve_habit(session, habit)
+        habit.add_tags(session, names)
         session.commit()
-        print(f"[green]Habit '{habit.name}' deleted![/green]")
-    else:
-        print("[red]Habit not found.[/red]")
+        print(f"[green]Tags of '{habit.name}': {', '.join(t.name for t in habit.tags)}[/green]")
+    except ValueError as error:
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+    finally:
+        session.close()
+
+
+@app.command()
+def untag(habit: str = typer.Argument(..., help=HABIT_HELP), names: List[str] = typer.Argument(..., help="Tags to remove")):
+    """Remove tags from a habit"""
+    session = get_db_session()
+    try:
+        habit = resolve_habit(session, habit)
+        habit.remove_tags(session, names)
+        session.commit()
+        print(f"[green]Tags of '{habit.name}': {', '.join(t.name for t in habit.tags) or 'none'}[/green]")
+    except ValueError as error:
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+    finally:
+        session.close()
+
+
+@app.command()
+def tags():
+    """Print completion and streak statistics per tag as JSON"""
+    session = get_db_session()
+    try:
+        stats = analytics.get_tag_stats(session)
+    finally:
+        session.close()
+    typer.echo(json.dumps(stats, indent=2))
+
+
+@app.command("list")
+def list_habits(
+    page_size: int = typer.Option(50, help="Number of habits loaded and printed at a time"),
+    periodicity: Optional[str] = typer.Option(None, help="Only list daily or weekly habits"),
+    sort: str = typer.Option("id", help=f"Sort by: {', '.join(HABIT_SORT_COLUMNS)}"),
+    desc: bool = typer.Option(False, "--desc", help="Sort in descending order"),
+    tag: Optional[str] = typer.Option(None, help="Only list habits with this tag"),
+):
+    """List habits page by page"""
+    try:
+        display_habits(page_size, periodicity, sort, desc, tag)
+    except ValueError as error:
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def leaderboard(
+    metric: str = typer.Option(
+        "current_streak",
+        help=f"Ranking metric: {', '.join(analytics.RANKING_METRICS)}",
+    ),
+    limit: int = typer.Option(10, help="Number of habits to show"),
+    periodicity: Optional[str] = typer.Option(None, help="Only rank daily or weekly habits"),
+    tag: Optional[str] = typer.Option(None, help="Only rank habits with this tag"),
+):
+    """Print the top habits for a metric as JSON"""
+    session = get_db_session()
+    try:
+        ranking = analytics.get_top_habits(session, metric, limit, periodicity, tag)
+    except ValueError as error:
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+    finally:
+        session.close()
+    typer.echo(json.dumps(ranking, indent=2))
+
+
+@app.command()
+def refresh_streaks(
+    interval: int = typer.Option(
+        0, help="Keep running and refresh every INTERVAL seconds (0 runs once)"
+    ),
+):
+    """Reset the stored current streak of habits whose period has lapsed"""
+    while True:
+        session = get_db_session()
+        reset = refresh_stale_streaks(session)
+        session.close()
+        print(f"[green]Reset {reset} lapsed streak(s).[/green]")
+        if interval <= 0:
+            break
+        time.sleep(interval)
 
+
+@app.command()
+def compact():
+    """Merge duplicate daily completions recorded on the same day"""
+    session = get_db_session()
+    removed = compact_daily_completions(session)
+    vacuum_database(session.get_bind())
     session.close()
+    print(f"[green]Removed {removed} duplicate completion(s).[/green]")
+
+
+@app.command()
+def archive(
+    older_than_days: int = typer.Option(
+        365, help="Archive completions older than this many days"
+    ),
+):
+    """Collapse old completions into compact streak runs"""
+    session = get_db_session()
+    try:
+        archived = archive_completions(session, older_than_days)
+    except ValueError as error:
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+    finally:
+        session.close()
+    print(f"[green]Archived {archived} completion(s).[/green]")
 
 
-def show_analytics_menu():
+@app.command()
+def purge(
+    batch_size: int = typer.Option(10000, help="Rows removed per statement"),
+    interval: int = typer.Option(
+        0, help="Keep running and purge every INTERVAL seconds (0 runs once)"
+    ),
+):
+    """Remove deleted habits and their completion history"""
     while True:
-        choice = typer.prompt(
-            "\nAnalytics Menu:\n"
-            "1. Get all habits\n"
-            "2. Get habits by periodicity\n"
-            "3. Get longest run streak\n"
-            "4. Get longest run streak for a habit\n"
-            "5. Get days since last completion\n"
-            "6. Back to main menu\n"
-            "Enter your choice"
-        )
+        session = get_db_session()
+        try:
+            result = purge_deleted_habits(session, batch_size)
+        except ValueError as error:
+            print(f"[red]{error}[/red]")
+            raise typer.Exit(code=1)
+        finally:
+            session.close()
+        print(f"[green]Purged {result.habits} deleted habit(s) with {result.completions} completion(s), "
+              f"{result.runs} archived run(s) and {result.goals} goal(s).[/green]")
+        if interval <= 0:
+            break
+        time.sleep(interval)
 
-        if choice == "1":
-            display_habits()
-        elif choice == "2":
-            periodicity = typer.prompt("Enter periodicity (daily/weekly)")
-            habits = analytics.get_habits_by_periodicity(get_db_session(), periodicity)
-            display_habits_list(habits)
-        elif choice == "3":
-            streak = analytics.get_longest_run_streak(get_db_session())
-            print(f"Longest run streak: {streak}")
-        elif choice == "4":
-            habit_id = typer.prompt("Enter habit ID")
-            streak = analytics.get_longest_run_streak_for_habit(
-                get_db_session(), int(habit_id)
+
+@app.command()
+def recompute(
+    workers: int = typer.Option(0, help="Worker processes (0 uses one per CPU)"),
+    partition_size: int = typer.Option(1000, help="Habits handed to a worker at a time"),
+):
+    """Recalculate the current and maximum streak of every habit from its completions"""
+    session = get_db_session()
+    total = session.query(Habit).count()
+    started = time.perf_counter()
+    try:
+        with Progress(console=console, transient=True) as progress:
+            task = progress.add_task("Recomputing streaks", total=total)
+            updated = recompute_streaks(
+                session, workers or None, partition_size,
+                progress=lambda checked: progress.advance(task, checked),
             )
-            print(f"Longest run streak for habit: {streak}")
-        elif choice == "5":
-            habit_id = typer.prompt("Enter habit ID")
-            days = analytics.get_days_since_last_completion(
-                get_db_session(), int(habit_id)
+    except ValueError as error:
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+    finally:
+        session.close()
+    elapsed = time.perf_counter() - started
+    print(f"[green]Updated the streaks of {updated} of {total} habit(s) in {elapsed:.1f}s.[/green]")
+
+
+@app.command()
+def backup(
+    destination: str = typer.Argument(..., help="Backup file to write; a .gz suffix compresses it"),
+    compress: bool = typer.Option(False, help="gzip the backup regardless of its suffix"),
+    verify: bool = typer.Option(True, help="Run an integrity check on the backup"),
+    step_pages: int = typer.Option(1024, help="Database pages copied per step (-1 copies at once)"),
+    sleep: float = typer.Option(0.01, help="Seconds other connections get between steps"),
+):
+    """Write a consistent snapshot of the database while it stays in use"""
+    from backup import backup_database
+    try:
+        with Progress(console=console, transient=True) as progress:
+            task = progress.add_task("Backing up", total=None)
+            result = backup_database(
+                destination, compress=compress or None, verify=verify, step_pages=step_pages, sleep=sleep,
+                progress=lambda copied, total: progress.update(task, completed=copied, total=total),
             )
-            print(f"Days since last completion: {days}")
-        elif choice == "6":
-            break
-        else:
-            print("Invalid choice. Please try again.")
+    except (OSError, ValueError) as error:
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+    print(f"[green]Backed up {result.pages} page(s) to {result.path} "
+          f"({result.size / 1024 / 1024:.1f} MB) in {result.seconds:.1f}s.[/green]")
 
 
-def display_habits_list(habits):
-    table = Table(title="Habits")
-    table.add_column("ID", style="cyan")
-    table.add_column("Name", style="magenta")
-    table.add_column("Periodicity", style="green")
+@app.command()
+def restore(
+    backup_file: str = typer.Argument(..., help="Backup file written by 'backup'"),
+    yes: bool = typer.Option(False, "--yes", help="Don't ask for confirmation"),
+    verify: bool = typer.Option(True, help="Run an integrity check on the backup first"),
+    step_pages: int = typer.Option(1024, help="Database pages copied per step (-1 copies at once)"),
+):
+    """Replace all habits and completions with the contents of a backup"""
+    from backup import restore_database
+    if not yes and not typer.confirm("This replaces all current habit data. Continue?"):
+        raise typer.Exit()
+    try:
+        with Progress(console=console, transient=True) as progress:
+            task = progress.add_task("Restoring", total=None)
+            result = restore_database(
+                backup_file, verify=verify, step_pages=step_pages,
+                progress=lambda copied, total: progress.update(task, completed=copied, total=total),
+            )
+    except (OSError, ValueError) as error:
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+    # Backups of older versions get the current schema
+    create_db()
+    print(f"[green]Restored {result.pages} page(s) from {backup_file} in {result.seconds:.1f}s.[/green]")
+
+
+@app.command()
+def build_index():
+    """Build the memory-mapped period index that serves streak lookups without the database"""
+    from periodindex import build_period_index
+    result = build_period_index(get_engine(), get_settings().period_index_file)
+    print(f"[green]Indexed {result.completions} completion(s) of {result.habits} habit(s) in {result.path} "
+          f"({result.size / 1024 / 1024:.1f} MB).[/green]")
 
-    for habit in habits:
-        table.add_row(str(habit.id), habit.name, habit.periodicity)
 
-    console.print("\n")
-    console.print(table)
+@app.command("snapshot")
+def snapshot_command(
+    output: Optional[str] = typer.Option(None, help="Snapshot file to write (default: habits-snapshot.npz)"),
+):
+    """Write a read-only columnar snapshot of the habits for offline analytics"""
+    # Imported here, so other commands don't pay for loading numpy
+    from snapshot import SNAPSHOT_FILE, export_snapshot
+    try:
+        result = export_snapshot(get_engine(), output or SNAPSHOT_FILE)
+    except OSError as error:
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+    print(f"[green]Wrote {result.habits} habit(s), {result.completions} completion(s) and {result.runs} "
+          f"archived run(s) to {result.path} ({result.size / 1024 / 1024:.1f} MB).[/green]")
 
 
 @app.command()
-def create_habit(name: str, description: str, periodicity: str):
-    """Create a new habit"""
+def analyze_snapshot(
+    snapshot_file: Optional[str] = typer.Argument(
+        None, help="Snapshot file written by 'snapshot' (default: habits-snapshot.npz)"
+    ),
+    periodicity: Optional[str] = typer.Option(None, help="Only analyze habits with this periodicity"),
+):
+    """Print the longest streaks and days since the last completion from a snapshot as JSON"""
+    from snapshot import SNAPSHOT_FILE, Snapshot, get_habit_metrics, get_habits_by_periodicity
+    try:
+        snapshot = Snapshot.load(snapshot_file or SNAPSHOT_FILE)
+        indexes = None if periodicity is None else get_habits_by_periodicity(snapshot, periodicity)
+    except ValueError as error:
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+    metrics = get_habit_metrics(snapshot, indexes)
+    typer.echo(json.dumps({
+        'created_at': snapshot.created_at.isoformat(),
+        'longest_run_streak': max((habit['max_streak'] for habit in metrics), default=0),
+        'habits': metrics,
+    }, indent=2))
+
+
+@app.command("seed")
+def seed_command(
+    habits: int = typer.Option(100, help="Number of habits to generate"),
+    days: int = typer.Option(365, help="Length of the completion history in days"),
+    random_seed: int = typer.Option(0, "--seed", help="Seed for reproducible data"),
+    batch_size: int = typer.Option(10000, help="Completions written per bulk insert"),
+):
+    """Generate habits with a random completion history for demos and load tests"""
+    from seeding import generate_habit_specs, seed_habits
     session = get_db_session()
-    new_habit = Habit(name=name, description=description, periodicity=periodicity)
-    session.add(new_habit)
-    session.commit()
-    print(f"[green]Created new habit: {name}[/green]")
+    specs = generate_habit_specs(habits, random.Random(random_seed))
+    started = time.perf_counter()
+    result = seed_habits(session, specs, history_days=days, seed=random_seed, batch_size=batch_size)
+    elapsed = time.perf_counter() - started
     session.close()
+    print(f"[green]Created {result.habits} habit(s) with {result.completions} completion(s) "
+          f"in {elapsed:.1f}s.[/green]")
+
+
+@app.command()
+def remind(
+    at: Optional[List[str]] = typer.Option(
+        None, help="Time of day (HH:MM, UTC) to send reminders at; repeat for several. Without it, runs once"
+    ),
+    within: float = typer.Option(24, help="Remind of periods ending within this many hours"),
+    sink: str = typer.Option("stdout", help="Where reminders go: stdout, file or webhook"),
+    output: Optional[str] = typer.Option(
+        None, help="File the file sink appends JSON lines to (default: reminders.jsonl)"
+    ),
+    url: Optional[str] = typer.Option(None, help="Endpoint the webhook sink posts to"),
+):
+    """Remind of habits whose current period has no completion yet"""
+    from reminders import (
+        FileSink, StdoutSink, WebhookSink, REMINDER_LOG_FILE, parse_times, run_scheduler, send_reminders,
+    )
+    try:
+        times = parse_times(at or [])
+        if sink == "stdout":
+            reminder_sink = StdoutSink()
+        elif sink == "file":
+            reminder_sink = FileSink(output or REMINDER_LOG_FILE)
+        elif sink == "webhook" and url:
+            reminder_sink = WebhookSink(url)
+        else:
+            raise ValueError("Sink must be stdout, file or webhook (with --url)")
+    except ValueError as error:
+        print(f"[red]{error}[/red]")
+        raise typer.Exit(code=1)
+
+    window = timedelta(hours=within)
+    try:
+        if not times:
+            sent = send_reminders(get_db_session, reminder_sink, within=window)
+            print(f"[green]Sent {sent} reminder(s).[/green]")
+            return
+        print(f"[green]Sending reminders daily at {', '.join(t.strftime('%H:%M') for t in times)} UTC "
+              f"(Ctrl+C to stop)[/green]")
+        run_scheduler(
+            get_db_session, reminder_sink, times, window,
+            on_tick=lambda run_at, sent: print(f"[green]{run_at:%H:%M}: sent {sent} reminder(s).[/green]"),
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reminder_sink.close()
+
+
+@app.command()
+def events(
+    since: int = typer.Option(0, help="Only print events with a higher sequence number"),
+    follow: bool = typer.Option(False, "--follow", help="Keep running and print new events as they are recorded"),
+    poll_interval: float = typer.Option(1.0, help="Seconds between checks for new events with --follow"),
+    limit: Optional[int] = typer.Option(None, help="Print at most this many events"),
+):
+    """Print habit change events after a sequence number as JSON lines"""
+    from events import iter_events, follow_events
+    if since < 0:
+        print("[red]--since must not be negative[/red]")
+        raise typer.Exit(code=1)
+    try:
+        if follow:
+            for count, event in enumerate(follow_events(get_db_session, since, poll_interval), start=1):
+                typer.echo(event.to_json())
+                if limit is not None and count >= limit:
+                    break
+        else:
+            session = get_db_session()
+            try:
+                for event in iter_events(session, since, limit=limit):
+                    typer.echo(event.to_json())
+            finally:
+                session.close()
+    except KeyboardInterrupt:
+        pass
+
+
+def _close_queue(queue):
+    """Write the remaining queued completions and report errors and dead-lettered entries."""
+    try:
+        queue.close()
+    except Exception as error:
+        print(f"[red]Writing queued completions failed: {error}[/red]")
+        if queue.pending:
+            print(f"[yellow]{queue.pending} completion(s) stay in {queue.log_path} "
+                  f"and are replayed on the next start.[/yellow]")
+    if queue.dead_lettered:
+        print(f"[yellow]Moved {queue.dead_lettered} completion(s) that could not be written "
+              f"to {queue.dead_letter_path}.[/yellow]")
+
+
+@app.command()
+def serve(
+    host: str = typer.Option("127.0.0.1", help="Address to listen on"),
+    port: int = typer.Option(8000, help="Port to listen on"),
+    pool_size: Optional[int] = typer.Option(
+        None, help="Database connections kept open for requests (default: pool_size setting)"
+    ),
+    quiet: bool = typer.Option(False, help="Don't log every request"),
+    write_behind: Optional[bool] = typer.Option(
+        None, "--write-behind/--no-write-behind",
+        help="Queue completions and group-commit them instead of one transaction per request "
+             "(default: write_behind setting)",
+    ),
+    flush_interval: float = typer.Option(1.0, help="Seconds between flushes of queued completions"),
+    max_batch_size: int = typer.Option(500, help="Queued completions written per transaction"),
+    queue_log: Optional[str] = typer.Option(
+        None, help="Append-only log of queued completions (default: completions.queue)"
+    ),
+):
+    """Serve habits and analytics as a JSON HTTP API"""
+    # Imported by the commands that use them, so other commands start faster
+    from server import HabitServer
+    from writebehind import CompletionQueue, QUEUE_LOG_FILE
+    engine = create_pooled_engine(pool_size=pool_size)
+    queue = None
+    if get_settings().write_behind if write_behind is None else write_behind:
+        queue = CompletionQueue(
+            queue_log or QUEUE_LOG_FILE, sessionmaker(bind=engine),
+            flush_interval=flush_interval, max_batch_size=max_batch_size,
+        )
+        replayed = queue.start()
+        if replayed:
+            print(f"[yellow]Replayed {replayed} queued completion(s).[/yellow]")
+    httpd = HabitServer((host, port), engine, quiet=quiet, completion_queue=queue)
+    print(f"[green]Serving on http://{host}:{port} (Ctrl+C to stop)[/green]")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        if queue is not None:
+            _close_queue(queue)
+        engine.dispose()
+
+
+@app.command()
+def ingest(
+    flush_interval: float = typer.Option(1.0, help="Seconds between flushes of queued completions"),
+    max_batch_size: int = typer.Option(500, help="Queued completions written per transaction"),
+    queue_log: Optional[str] = typer.Option(
+        None, help="Append-only log of queued completions (default: completions.queue)"
+    ),
+):
+    """Record completions read from stdin as 'HABIT_ID[,ISO_TIME]' lines in write-behind mode"""
+    from writebehind import CompletionQueue, QUEUE_LOG_FILE
+    queue = CompletionQueue(
+        queue_log or QUEUE_LOG_FILE, get_db_session, flush_interval=flush_interval, max_batch_size=max_batch_size
+    )
+    replayed = queue.start()
+    if replayed:
+        print(f"[yellow]Replayed {replayed} queued completion(s).[/yellow]")
+    queued = 0
+    try:
+        for number, line in enumerate(sys.stdin, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            habit_id, _, completed_at = line.partition(",")
+            try:
+                completion_time = datetime.fromisoformat(completed_at) if completed_at else None
+                queue.enqueue(int(habit_id), completion_time)
+            except ValueError as error:
+                print(f"[red]Line {number}: {error}[/red]")
+                continue
+            queued += 1
+    finally:
+        _close_queue(queue)
+    print(f"[green]Recorded {queued} completion(s).[/green]")
+    if queue.skipped:
+        print(f"[yellow]Skipped {queue.skipped} completion(s) of habits that no longer exist.[/yellow]")
 
 
 if __name__ == "__main__":
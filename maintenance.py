@@ -0,0 +1,457 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timedelta, UTC
+from itertools import groupby
+from operator import itemgetter
+import os
+from sqlalchemy import Integer, and_, cast, create_engine, delete, func, insert, or_, select, text, update
+from sqlalchemy.orm import Session, aliased
+from models import Habit, Completion, CompletionRun, Goal, completion_kind, habit_tags
+from periods import PERIOD_EPOCH, get_period_rule
+
+
+def get_streak_cutoffs(at_time: datetime, periodicities=('daily', 'weekly')) -> dict:
+    """
+    Calculate, per periodicity, the time before which a last completion breaks the streak.
+
+    Mirrors the rules of Habit.calculate_streak: a streak survives for the
+    grace days of the periodicity's rule after the last completion, e.g.
+    until the end of the next day for daily habits and seven days for weekly ones.
+
+    Args:
+        at_time (datetime): Reference time
+        periodicities (Iterable[str]): Periodicities to calculate the cutoff for
+
+    Returns:
+        dict: Naive UTC cutoff datetime keyed by periodicity
+    """
+    today = at_time.astimezone(UTC).date()
+    return {
+        periodicity: datetime.combine(
+            today - timedelta(days=get_period_rule(periodicity).grace_days), datetime.min.time()
+        )
+        for periodicity in periodicities
+    }
+
+
+def refresh_stale_streaks(session: Session, at_time: datetime = None) -> int:
+    """
+    Reset current_streak for every habit whose last period has lapsed.
+
+    Lapsed habits are found and reset by a single bulk UPDATE that uses the
+    (periodicity, last_completed_at) index, so no habit or completion
+    objects are loaded. For periodicities needing several completions per
+    period the last completion may belong to an unfinished period, so such
+    streaks are only reset once that completion is past the grace days too;
+    Habit.refresh_streaks and recompute_streaks apply the exact rule.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        at_time (datetime, optional): Reference time. Defaults to current UTC time
+
+    Returns:
+        int: Number of habits whose streak was reset
+    """
+    if at_time is None:
+        at_time = datetime.now(UTC)
+    elif at_time.tzinfo is None:
+        raise ValueError("at_time must be timezone-aware")
+
+    periodicities = session.scalars(select(Habit.periodicity).distinct()).all()
+    lapsed = [
+        and_(Habit.periodicity == periodicity, Habit.last_completed_at < cutoff)
+        for periodicity, cutoff in get_streak_cutoffs(at_time, periodicities).items()
+    ]
+    result = session.execute(
+        update(Habit)
+        .where(Habit.current_streak > 0)
+        .where(or_(Habit.last_completed_at.is_(None), *lapsed))
+        .values(current_streak=0)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount
+
+
+def compact_daily_completions(session: Session) -> int:
+    """
+    Merge duplicate daily completions, e.g. after the unique index was dropped.
+
+    Keeps the latest completion per habit and day, deletes the rest with a
+    single DELETE, creates the unique (habit_id, day) index and refreshes
+    the completion counts of the habits stored as daily completions and
+    the progress of their completion goals.
+    Duplicates of databases from older versions are already merged when
+    their completions are migrated to the completions table.
+
+    Args:
+        session (Session): SQLAlchemy database session
+
+    Returns:
+        int: Number of duplicate completions removed
+    """
+    duplicates = (
+        "SELECT id, habit_id, completed_at FROM ("
+        "  SELECT id, habit_id, completed_at, ROW_NUMBER() OVER ("
+        "    PARTITION BY habit_id, period_start ORDER BY completed_at DESC, id DESC"
+        "  ) AS position FROM completions WHERE kind = 'daily'"
+        ") WHERE position > 1"
+    )
+    # Completion goals stop counting the removed completions made since they were set
+    session.execute(text(
+        "UPDATE goals SET progress = MAX(0, progress - ("
+        f"  SELECT COUNT(*) FROM ({duplicates}) AS duplicate"
+        "  WHERE duplicate.habit_id = goals.habit_id AND duplicate.completed_at >= goals.created_at"
+        ")) WHERE kind = 'completions'"
+    ))
+    session.execute(text(
+        "UPDATE goals SET achieved_at = NULL WHERE kind = 'completions' AND progress < target"
+    ))
+    result = session.execute(text(f"DELETE FROM completions WHERE id IN (SELECT id FROM ({duplicates}))"))
+    for index in Completion.__table__.indexes:
+        index.create(session.connection(), checkfirst=True)
+    session.execute(text(
+        "UPDATE habits SET completion_count = "
+        "(SELECT COUNT(*) FROM completions WHERE habit_id = habits.id AND kind = 'daily') "
+        "WHERE periodicity != 'weekly'"
+    ))
+    session.commit()
+    return result.rowcount
+
+
+def vacuum_database(engine):
+    """
+    Rebuild the database file to give pages freed by deletions back to the filesystem.
+
+    Args:
+        engine (Engine): SQLAlchemy engine bound to the database
+    """
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+
+
+
+def _period_number(day, rule):
+    """SQL expression numbering the periods of a rule from PERIOD_EPOCH, for a date column."""
+    return cast(func.julianday(day) - func.julianday(PERIOD_EPOCH.isoformat()), Integer) // rule.length_days
+
+
+def archive_completions(session: Session, horizon_days: int = 365, at_time: datetime = None) -> int:
+    """
+    Collapse completions older than the horizon into CompletionRun segments.
+
+    For every habit with old completions, the periods are read in order with a
+    column-only query per habit, merged with the habit's existing runs and written back
+    as runs; the archived completions are then removed with one DELETE per
+    habit. The horizon is moved to the end of the period it falls into, so
+    periods are archived whole, and only completed periods become runs.
+    Completions of periods below the quota of their periodicity, e.g. two
+    completions of a '3 times per week' habit, are no part of a run and stay
+    as they are, so counts of completions don't change.
+    Streaks, last completion and analytics keep working on the merged runs.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        horizon_days (int): Completions older than this many days are archived
+        at_time (datetime, optional): Reference time. Defaults to current UTC time
+
+    Returns:
+        int: Number of completions archived
+
+    Raises:
+        ValueError: If the horizon is shorter than one week
+    """
+    if horizon_days < 7:
+        raise ValueError("horizon_days must be at least 7")
+    if at_time is None:
+        at_time = datetime.now(UTC)
+    cutoff = at_time.astimezone(UTC).date() - timedelta(days=horizon_days)
+
+    archived = 0
+    habits = session.execute(
+        select(Completion.habit_id, Habit.periodicity)
+        .join(Habit, Habit.id == Completion.habit_id)
+        .where(Completion.period_start < cutoff)
+        .distinct()
+    ).all()
+    for habit_id, periodicity in habits:
+        rule = get_period_rule(periodicity)
+        boundary = rule.period_key(cutoff)
+        if boundary < cutoff:
+            boundary += rule.length
+        old_periods = session.scalars(
+            select(Completion.period_start)
+            .where(Completion.habit_id == habit_id, Completion.period_start < boundary)
+            .order_by(Completion.period_start)
+        ).all()
+        existing_runs = session.execute(
+            select(CompletionRun.start_period, CompletionRun.end_period)
+            .where(CompletionRun.habit_id == habit_id)
+            .order_by(CompletionRun.start_period)
+        ).all()
+        runs = rule.merge_runs(rule.completed_periods(old_periods), existing_runs)
+
+        session.execute(delete(CompletionRun).where(CompletionRun.habit_id == habit_id))
+        session.execute(insert(CompletionRun), [
+            {'habit_id': habit_id, 'start_period': start, 'end_period': end}
+            for start, end in runs
+        ])
+        archive = delete(Completion).where(Completion.habit_id == habit_id, Completion.period_start < boundary)
+        if rule.quota > 1:
+            # Periods below the quota keep their completions
+            other = aliased(Completion)
+            completed = (
+                select(_period_number(other.period_start, rule))
+                .where(other.habit_id == habit_id, other.period_start < boundary)
+                .group_by(_period_number(other.period_start, rule))
+                .having(func.count() >= rule.quota)
+            )
+            archive = archive.where(_period_number(Completion.period_start, rule).in_(completed))
+        result = session.execute(archive.execution_options(synchronize_session=False))
+        archived += result.rowcount
+
+    session.commit()
+    return archived
+
+
+@dataclass(frozen=True)
+class PurgeResult:
+    """
+    Summary of a purge of deleted habits.
+
+    Attributes:
+        habits (int): Number of habits removed
+        completions (int): Number of completions removed
+        runs (int): Number of archived completion runs removed
+        goals (int): Number of goals removed
+    """
+    habits: int
+    completions: int
+    runs: int
+    goals: int
+
+
+def purge_deleted_habits(session: Session, batch_size: int = 10000, at_time: datetime = None) -> PurgeResult:
+    """
+    Remove soft-deleted habits together with their completion history and goals.
+
+    Completions, runs and goals are removed with core DELETE statements of at most
+    `batch_size` rows, each committed on its own, so no ORM objects are
+    loaded and the database is never locked for longer than one chunk.
+    Habits are removed last, so an interrupted purge simply continues on
+    the next run. Only habits deleted before the purge started are
+    affected.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        batch_size (int): Maximum number of rows removed per statement
+        at_time (datetime, optional): Purge habits deleted up to this time. Defaults to current UTC time
+
+    Returns:
+        PurgeResult: Number of habits, completions, runs and goals removed
+
+    Raises:
+        ValueError: If batch_size is smaller than 1
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    if at_time is None:
+        at_time = datetime.now(UTC)
+    deleted_ids = select(Habit.id).where(Habit.deleted_at <= at_time.astimezone(UTC).replace(tzinfo=None))
+
+    removed = {}
+    for model in (Completion, CompletionRun, Goal):
+        table = model.__table__
+        chunk = select(table.c.id).where(table.c.habit_id.in_(deleted_ids)).limit(batch_size)
+        removed[model] = 0
+        while True:
+            result = session.execute(delete(table).where(table.c.id.in_(chunk)))
+            session.commit()
+            removed[model] += result.rowcount
+            if result.rowcount < batch_size:
+                break
+
+    # A habit has few tags, so its links are removed together with it
+    session.execute(delete(habit_tags).where(habit_tags.c.habit_id.in_(deleted_ids)))
+    result = session.execute(delete(Habit.__table__).where(Habit.id.in_(deleted_ids)))
+    session.commit()
+    return PurgeResult(
+        habits=result.rowcount,
+        completions=removed[Completion],
+        runs=removed[CompletionRun],
+        goals=removed[Goal],
+    )
+
+
+def partition_habit_ids(session: Session, partition_size: int = 1000) -> list:
+    """
+    Split the habit IDs into contiguous ranges of up to `partition_size` habits.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        partition_size (int): Maximum number of habits per range
+
+    Returns:
+        list: (first_id, last_id) tuples in ascending order
+    """
+    ids = session.scalars(select(Habit.id).order_by(Habit.id)).all()
+    return [
+        (ids[start], ids[min(start + partition_size, len(ids)) - 1])
+        for start in range(0, len(ids), partition_size)
+    ]
+
+
+def compute_partition_streaks(conn, first_id: int, last_id: int, at_date) -> tuple:
+    """
+    Calculate the streaks and next deadline of the habits in an ID range from their stored periods.
+
+    The completions are streamed in (habit_id, period) order from the
+    per-habit index of the completions table and each habit is evaluated
+    as soon as its rows are read, so memory stays proportional to the
+    habits of the range rather than their completions. The rules are those
+    of Habit.refresh_streaks, including archived runs and the periodicity's
+    PeriodRule.
+
+    Args:
+        conn (Connection): SQLAlchemy connection
+        first_id (int): First habit ID of the range
+        last_id (int): Last habit ID of the range
+        at_date (date): UTC date the current streak and deadline are calculated for
+
+    Returns:
+        tuple: Number of habits checked and a list of dicts with id,
+               current_streak, max_streak and next_due_at (naive UTC) for
+               the habits whose stored values differ
+    """
+    habits = {
+        habit_id: (periodicity, current_streak, max_streak, next_due_at)
+        for habit_id, periodicity, current_streak, max_streak, next_due_at in conn.execute(
+            select(Habit.id, Habit.periodicity, Habit.current_streak, Habit.max_streak, Habit.next_due_at)
+            .where(Habit.id.between(first_id, last_id))
+        )
+    }
+    archived = defaultdict(list)
+    for habit_id, start, end in conn.execute(
+        select(CompletionRun.habit_id, CompletionRun.start_period, CompletionRun.end_period)
+        .where(CompletionRun.habit_id.between(first_id, last_id))
+        .order_by(CompletionRun.habit_id, CompletionRun.start_period)
+    ):
+        archived[habit_id].append((start, end))
+
+    changes = []
+
+    def evaluate(habit_id, completion_dates):
+        periodicity, stored_current, stored_max, stored_next_due = habits[habit_id]
+        current_streak, max_streak, next_due = get_period_rule(periodicity).summarize(
+            completion_dates, archived.get(habit_id, ()), at_date
+        )
+        next_due_at = datetime.combine(next_due, datetime.min.time())
+        if (current_streak, max_streak, next_due_at) != (stored_current, stored_max, stored_next_due):
+            changes.append({
+                'id': habit_id, 'current_streak': current_streak, 'max_streak': max_streak,
+                'next_due_at': next_due_at,
+            })
+
+    evaluated = set()
+    rows = conn.execute(
+        select(Completion.habit_id, Completion.kind, Completion.completed_at)
+        .where(Completion.habit_id.between(first_id, last_id))
+        .order_by(Completion.habit_id, Completion.period_start)
+    )
+    for habit_id, group in groupby(rows, key=itemgetter(0)):
+        if habit_id not in habits:
+            continue
+        # Completions of another kind than the periodicity stores don't count, as in the ORM
+        kind = completion_kind(habits[habit_id][0])
+        evaluate(habit_id, [completed_at.date() for _, row_kind, completed_at in group if row_kind == kind])
+        evaluated.add(habit_id)
+
+    for habit_id in habits.keys() - evaluated:
+        evaluate(habit_id, [])
+    return len(habits), changes
+
+
+_worker_engines = {}
+
+
+def _recompute_partition(url: str, first_id: int, last_id: int, at_date) -> tuple:
+    """Worker process entry point of recompute_streaks, see compute_partition_streaks."""
+    if url not in _worker_engines:
+        _worker_engines[url] = create_engine(url)
+    with _worker_engines[url].connect() as conn:
+        return compute_partition_streaks(conn, first_id, last_id, at_date)
+
+
+def recompute_streaks(session: Session, workers: int = None, partition_size: int = 1000,
+                      at_time: datetime = None, progress=None) -> int:
+    """
+    Recalculate the stored current and maximum streak and the next deadline of every habit.
+
+    The habit IDs are split into ranges that are evaluated by a pool of
+    worker processes, each reading the committed data of the database file
+    through its own connection (see compute_partition_streaks). Only habits
+    whose values changed are written back, with one bulk UPDATE once all
+    ranges are done. In-memory databases can't be shared between processes
+    and are evaluated in this process on the session's connection, as is
+    everything when `workers` is 1. So are sessions inside a savepoint, e.g.
+    of a caller that owns the transaction: their commit only releases the
+    savepoint, and workers wouldn't see the data.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs
+        partition_size (int): Habits per range handed to a worker
+        at_time (datetime, optional): Reference time. Defaults to current UTC time
+        progress (Callable, optional): Called with the number of habits of each finished range
+
+    Returns:
+        int: Number of habits whose streaks were updated
+
+    Raises:
+        ValueError: If partition_size or workers is smaller than 1
+    """
+    if partition_size < 1:
+        raise ValueError("partition_size must be at least 1")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    elif workers < 1:
+        raise ValueError("workers must be at least 1")
+    if at_time is None:
+        at_time = datetime.now(UTC)
+    elif at_time.tzinfo is None:
+        raise ValueError("at_time must be timezone-aware")
+    at_date = at_time.astimezone(UTC).date()
+
+    partitions = partition_habit_ids(session, partition_size)
+    url = session.get_bind().engine.url
+    if url.database in (None, "", ":memory:") or session.connection().in_nested_transaction():
+        workers = 1
+
+    changes = []
+    if workers == 1 or len(partitions) == 1:
+        conn = session.connection()
+        for first_id, last_id in partitions:
+            checked, partition_changes = compute_partition_streaks(conn, first_id, last_id, at_date)
+            changes.extend(partition_changes)
+            if progress:
+                progress(checked)
+    else:
+        # Workers only see committed data
+        session.commit()
+        url = url.render_as_string(hide_password=False)
+        with ProcessPoolExecutor(max_workers=min(workers, len(partitions))) as executor:
+            futures = [
+                executor.submit(_recompute_partition, url, first_id, last_id, at_date)
+                for first_id, last_id in partitions
+            ]
+            for future in as_completed(futures):
+                checked, partition_changes = future.result()
+                changes.extend(partition_changes)
+                if progress:
+                    progress(checked)
+
+    if changes:
+        session.execute(update(Habit), changes)
+    session.commit()
+    return len(changes)
@@ -1,33 +1,87 @@
-from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey
-from sqlalchemy.orm import relationship, Session, declarative_base, validates
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Index, Table, func, inspect, select, text
+from sqlalchemy.orm import relationship, Session, declarative_base, object_session, synonym, validates
 from datetime import datetime, timedelta, UTC
+from itertools import groupby
+import json
+from periods import PeriodRule, PeriodSummary, get_period_rule
 
 Base = declarative_base()
 
+def due_datetime(due_date):
+    """
+    Get the deadline of a period as a UTC datetime.
+
+    Args:
+        due_date (date): First day after the period, as returned by PeriodRule.next_due
+
+    Returns:
+        datetime: Midnight UTC at the start of the day
+    """
+    return datetime.combine(due_date, datetime.min.time(), tzinfo=UTC)
+
+def _initial_next_due(context):
+    """
+    Derive the first deadline of a new habit: the end of the period it is created in.
+
+    Args:
+        context (DefaultExecutionContext): SQLAlchemy execution context of the insert
+
+    Returns:
+        datetime: End of the current period
+    """
+    parameters = context.get_current_parameters()
+    created_at = parameters.get('created_at') or datetime.now(UTC)
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(UTC)
+    return due_datetime(get_period_rule(parameters['periodicity']).next_due(None, created_at.date()))
+
 class Habit(Base):
     """
-    Represents a trackable habit with daily or weekly periodicity.
+    Represents a trackable habit with a periodicity such as daily, weekly,
+    'every N days' or 'X times per week' (see periods.get_period_rule).
+    Weekly habits store their completions as WeeklyCompletion records, all
+    other periodicities as one DailyCompletion per day.
 
     Attributes:
         id (int): Primary key
         name (str): Name of the habit
         description (str): Optional description of the habit
-        periodicity (str): Frequency of the habit ('daily' or 'weekly')
+        periodicity (str): Frequency of the habit, e.g. 'daily', 'weekly' or '3 times per week'
         created_at (datetime): When the habit was created
         current_streak (int): Number of consecutive successful completions
         max_streak (int): Highest streak achieved
+        last_completed_at (datetime): Time of the most recent completion
+        completion_count (int): Number of recorded completions
+        deleted_at (datetime): When the habit was deleted, None while it is active.
+                               Completions of deleted habits are removed by maintenance.purge_deleted_habits
+        next_due_at (datetime): End of the earliest period, from the current one on, that isn't
+                                completed yet; the deadline reminders are sent for
         daily_completions (list): Related DailyCompletion records
         weekly_completions (list): Related WeeklyCompletion records
+        completion_runs (list): Related CompletionRun records of archived completions
+        goals (list): Related Goal records
+        tags (list): Tag records the habit is grouped under
     """
     __tablename__ = 'habits'
+    __table_args__ = (
+        Index('ix_habits_periodicity_last_completed_at', 'periodicity', 'last_completed_at'),
+        # Reminder ticks range-scan the deadlines of active habits only
+        Index('ix_habits_deleted_at_next_due_at', 'deleted_at', 'next_due_at'),
+        # Name lookups too short for the search table range-scan the names of active habits
+        Index('ix_habits_deleted_at_name', 'deleted_at', text('name COLLATE NOCASE')),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
     description = Column(String)
-    periodicity = Column(String, nullable=False)  # 'daily' or 'weekly'
+    periodicity = Column(String, nullable=False)  # Canonical name of a PeriodRule
     created_at = Column(DateTime, default=lambda: datetime.now(UTC))
-    current_streak = Column(Integer, default=0)
-    max_streak = Column(Integer, default=0)
+    current_streak = Column(Integer, default=0, index=True)
+    max_streak = Column(Integer, default=0, index=True)
+    last_completed_at = Column(DateTime(timezone=True), index=True)
+    completion_count = Column(Integer, default=0)
+    deleted_at = Column(DateTime(timezone=True), index=True)
+    next_due_at = Column(DateTime(timezone=True), default=_initial_next_due)
     daily_completions = relationship(
         "DailyCompletion",
         back_populates="habit",
@@ -42,15 +96,40 @@ class Habit(Base):
         lazy="select",
         cascade="all, delete-orphan"
     )
+    completion_runs = relationship(
+        "CompletionRun",
+        back_populates="habit",
+        order_by="CompletionRun.start_period",  # Oldest first
+        lazy="select",
+        cascade="all, delete-orphan"
+    )
+    goals = relationship(
+        "Goal",
+        back_populates="habit",
+        order_by="Goal.id",
+        lazy="select",
+        cascade="all, delete-orphan"
+    )
+    tags = relationship(
+        "Tag",
+        secondary="habit_tags",
+        back_populates="habits",
+        order_by="Tag.name",
+        lazy="select"
+    )
 
-    VALID_PERIODICITIES = ['daily', 'weekly']
+    # PeriodIndex serving the completion history without the database, set by periodindex.enable_period_index
+    period_index = None
 
     @validates('periodicity')
     def validate_periodicity(self, key, periodicity):
-        """Validate that periodicity is either 'daily' or 'weekly'"""
-        if periodicity not in self.VALID_PERIODICITIES:
-            raise ValueError(f"Periodicity must be one of: {', '.join(self.VALID_PERIODICITIES)}")
-        return periodicity
+        """Validate the periodicity and store it in its canonical spelling"""
+        return get_period_rule(periodicity).name
+
+    @property
+    def period_rule(self) -> PeriodRule:
+        """PeriodRule: Rule mapping the habit's completions to periods."""
+        return get_period_rule(self.periodicity)
 
     def complete(self, session: Session, completion_time=None):
         """
@@ -63,16 +142,61 @@ class Habit(Base):
         Raises:
             ValueError: If habit has invalid periodicity
         """
-        # Ensure completion_time is UTC-aware
+        completion_time = self.record_completion(session, completion_time)
+
+        # Recalculate streaks after recording completion
+        self.refresh_streaks(completion_time)
+
+    def soft_delete(self, at_time=None):
+        """
+        Mark the habit as deleted without touching its completion history.
+
+        Args:
+            at_time (datetime, optional): Time of deletion. Defaults to current UTC time
+        """
+        self.deleted_at = (at_time or datetime.now(UTC)).astimezone(UTC)
+
+    def record_completion(self, session: Session, completion_time=None, load_history=True):
+        """
+        Store a completion without recalculating the streaks.
+        When recording several completions at once, call refresh_streaks once afterwards.
+
+        Args:
+            session (Session): SQLAlchemy database session
+            completion_time (datetime, optional): Time of completion. Defaults to current UTC time
+            load_history (bool): Add the completion to the loaded completion collection. If False,
+                                 it is only linked to the habit, so the collection isn't loaded
+
+        Returns:
+            datetime: The recorded completion time
+
+        Raises:
+            ValueError: If completion_time is not timezone-aware
+        """
         if completion_time is None:
             completion_time = datetime.now(UTC)
         elif completion_time.tzinfo is None:
             raise ValueError("completion_time must be timezone-aware")
-        
-        if self.periodicity == 'daily':
-            new_completion = DailyCompletion(habit=self, completed_at=completion_time)
-            session.add(new_completion)
-        elif self.periodicity == 'weekly':
+        # The stored time and the period keys all derive from the UTC time
+        completion_time = completion_time.astimezone(UTC)
+
+        if completion_model_for(self.periodicity) is DailyCompletion:
+            day = completion_time.date()
+            existing_completion = session.query(DailyCompletion).filter(
+                DailyCompletion.habit_id == self.id,
+                DailyCompletion.day == day
+            ).first()
+
+            if existing_completion:
+                # Only one completion is kept per day, holding the latest time
+                if completion_time > existing_completion.completed_at.replace(tzinfo=UTC):
+                    existing_completion.completed_at = completion_time
+            else:
+                self._add_completion_record(
+                    session, DailyCompletion(day=day, completed_at=completion_time), load_history
+                )
+                self._count_completion(completion_time, 1)
+        else:
             week_start = self._get_week_start(completion_time)
             existing_completion = session.query(WeeklyCompletion).filter(
                 WeeklyCompletion.habit_id == self.id,
@@ -81,15 +205,392 @@ class Habit(Base):
             
             if existing_completion:
                 # Update existing completion if it's earlier than the new one
-                if completion_time > existing_completion.completed_at:
+                if completion_time > existing_completion.completed_at.replace(tzinfo=UTC):
                     existing_completion.completed_at = completion_time
             else:
-                new_completion = WeeklyCompletion(habit=self, week_start=week_start, completed_at=completion_time)
-                session.add(new_completion)
+                self._add_completion_record(
+                    session, WeeklyCompletion(week_start=week_start, completed_at=completion_time), load_history
+                )
+                self._count_completion(completion_time, 1)
 
-        # Recalculate streaks after recording completion
-        self.current_streak = self.calculate_streak(completion_time)
-        self.max_streak = self.calculate_max_streak()
+        last_completed_at = self.last_completed_at
+        if last_completed_at is None or completion_time > last_completed_at.replace(tzinfo=UTC):
+            self.last_completed_at = completion_time
+        record_event(session, HABIT_COMPLETED, self, completed_at=completion_time.isoformat())
+        return completion_time
+
+    def _add_completion_record(self, session: Session, completion, load_history):
+        """Add a new completion record to the habit, through the collection if load_history is set."""
+        if load_history:
+            self._get_completions().append(completion)
+        else:
+            # Setting the habit doesn't load an unloaded completion collection
+            completion.habit = self
+            session.add(completion)
+
+    def refresh_streaks(self, at_time=None):
+        """
+        Recalculate the stored current and maximum streak and the next deadline
+        from the completion history, in a single pass.
+
+        Args:
+            at_time (datetime, optional): Calculate the current streak as of this time.
+                                          Defaults to current UTC time
+        """
+        if at_time is None:
+            at_time = datetime.now(UTC)
+        elif at_time.tzinfo is None:
+            raise ValueError("at_time must be timezone-aware")
+
+        summary = self.period_rule.summarize(
+            self._get_completion_dates(), self._get_archived_runs(), at_time.astimezone(UTC).date()
+        )
+        self._store_streaks(summary, at_time)
+
+    def _store_streaks(self, summary, at_time):
+        """
+        Store calculated streaks and the next deadline and advance the streak goals.
+
+        Args:
+            summary (PeriodSummary): Streaks and deadline to store
+            at_time (datetime): Time they were calculated for
+        """
+        self.current_streak = summary.current_streak
+        self.max_streak = summary.max_streak
+        self.next_due_at = due_datetime(summary.next_due)
+        for goal in self.goals:
+            if goal.kind == GOAL_STREAK:
+                # A streak can't be longer than the record, e.g. after a completion was removed
+                goal.update_progress(min(max(goal.progress, self.current_streak), self.max_streak), at_time)
+
+    def _count_completion(self, completed_at, delta):
+        """
+        Adjust the completion count and the completion goals for an added (+1) or removed (-1) completion.
+        Goals only count completions made since they were set.
+
+        Args:
+            completed_at (datetime): UTC-aware time of the completion
+            delta (int): 1 for an added completion, -1 for a removed one
+        """
+        self.completion_count = (self.completion_count or 0) + delta
+        for goal in self.goals:
+            if goal.kind == GOAL_COMPLETIONS and completed_at >= goal.created_at.replace(tzinfo=UTC):
+                goal.update_progress(goal.progress + delta, completed_at)
+
+    def add_completion(self, session: Session, completion_time, at_time=None):
+        """
+        Record a completion at any time, e.g. a forgotten one, and repair the streaks locally.
+
+        Unlike complete(), the streaks are calculated as of at_time, not as of
+        the completion, and only the runs next to the completion's period are
+        read (see repair_streaks).
+
+        Args:
+            session (Session): SQLAlchemy database session
+            completion_time (datetime): Timezone-aware time of the completion
+            at_time (datetime, optional): Time to calculate the streaks for. Defaults to current UTC time
+
+        Returns:
+            datetime: The recorded completion time
+
+        Raises:
+            ValueError: If a time is not timezone-aware or the completion is in the future
+        """
+        at_time = self._check_at_time(at_time)
+        if completion_time is None or completion_time.tzinfo is None:
+            raise ValueError("completion_time must be timezone-aware")
+        if completion_time > at_time:
+            raise ValueError("Completions can't be recorded in the future")
+        period = self.period_rule.period_key(completion_time)
+        was_completed = self._is_period_completed(session, period)
+        self.record_completion(session, completion_time, load_history=False)
+        self.repair_streaks(session, period, was_completed, at_time)
+        return completion_time
+
+    def remove_completion(self, session: Session, completion, at_time=None):
+        """
+        Delete a completion of the habit and update the stored statistics and goals.
+        The streaks are repaired locally (see repair_streaks).
+
+        Args:
+            session (Session): SQLAlchemy database session
+            completion (Completion): Completion of this habit to delete
+            at_time (datetime, optional): Time to calculate the streaks for. Defaults to current UTC time
+
+        Raises:
+            ValueError: If the completion belongs to another habit
+        """
+        if completion.habit_id != self.id:
+            raise ValueError("Completion does not belong to this habit")
+        at_time = self._check_at_time(at_time)
+        completed_at = completion.completed_at
+        if completed_at.tzinfo is None:
+            completed_at = completed_at.replace(tzinfo=UTC)
+        period = self.period_rule.period_key(completed_at)
+        was_completed = self._is_period_completed(session, period)
+
+        collection = 'daily_completions' if completion_model_for(self.periodicity) is DailyCompletion \
+            else 'weekly_completions'
+        if collection not in inspect(self).unloaded and completion in getattr(self, collection):
+            getattr(self, collection).remove(completion)
+        session.delete(completion)
+        session.flush()
+        self._count_completion(completed_at, -1)
+
+        last_completed_at = session.scalar(
+            select(Completion.completed_at).where(Completion.habit_id == self.id)
+            .order_by(Completion.period_start.desc(), Completion.completed_at.desc()).limit(1)
+        )
+        if last_completed_at is None and self.completion_runs:
+            last_completed_at = due_datetime(self.completion_runs[-1].end_period)
+        self.last_completed_at = last_completed_at.replace(tzinfo=UTC) if last_completed_at else None
+        self.repair_streaks(session, period, was_completed, at_time)
+        record_event(session, HABIT_COMPLETION_REMOVED, self, completed_at=completed_at.astimezone(UTC).isoformat())
+
+    def move_completion(self, session: Session, completion, completion_time, at_time=None):
+        """
+        Correct the time of a completion: remove it and record it at the new time.
+
+        Args:
+            session (Session): SQLAlchemy database session
+            completion (Completion): Completion of this habit to change
+            completion_time (datetime): Timezone-aware corrected time
+            at_time (datetime, optional): Time to calculate the streaks for. Defaults to current UTC time
+
+        Returns:
+            datetime: The recorded completion time
+
+        Raises:
+            ValueError: If the completion belongs to another habit or the new time is invalid
+        """
+        at_time = self._check_at_time(at_time)
+        if completion_time is None or completion_time.tzinfo is None:
+            raise ValueError("completion_time must be timezone-aware")
+        if completion_time > at_time:
+            raise ValueError("Completions can't be recorded in the future")
+        self.remove_completion(session, completion, at_time)
+        return self.add_completion(session, completion_time, at_time)
+
+    def repair_streaks(self, session: Session, period, was_completed, at_time=None):
+        """
+        Update the stored streaks after completions of one period were added or removed.
+
+        Instead of reading the whole history, only the runs of completed periods
+        next to the changed period and the latest run are read, walking the
+        (habit_id, period_start) index outwards until the first gap; archived
+        runs are merged in as by a full recalculation. The result equals
+        refresh_streaks as long as the stored streaks were up to date before
+        the change. Only when the removal splits the run that holds the record
+        can the new record be anywhere in the history; then the streaks are
+        recalculated in full.
+
+        Args:
+            session (Session): SQLAlchemy database session
+            period (date): Key of the period whose completions changed
+            was_completed (bool): Whether the period was completed before the change
+            at_time (datetime, optional): Time to calculate the streaks for. Defaults to current UTC time
+        """
+        at_time = self._check_at_time(at_time)
+        if self.max_streak is None:
+            self.refresh_streaks(at_time)
+            return
+        rule = self.period_rule
+        archived = self._get_archived_runs()
+        is_completed = self._is_period_completed(session, period)
+
+        max_streak = self.max_streak
+        if is_completed != was_completed:
+            run_length = (self._count_adjacent_periods(session, period, -1, archived) + 1
+                          + self._count_adjacent_periods(session, period, 1, archived))
+            if is_completed:
+                max_streak = max(max_streak, run_length)
+            elif run_length >= max_streak:
+                self.refresh_streaks(at_time)
+                return
+
+        at_date = at_time.astimezone(UTC).date()
+        latest, last_completion_date = self._latest_completed_period(session)
+        if archived and (latest is None or archived[-1][1] > latest):
+            latest = archived[-1][1]
+            if last_completion_date is None:
+                last_completion_date = latest
+        current_streak = 0
+        if latest is not None and (at_date - last_completion_date).days <= rule.grace_days:
+            current_streak = self._count_adjacent_periods(session, latest, -1, archived) + 1
+        self._store_streaks(PeriodSummary(current_streak, max_streak, rule.next_due(latest, at_date)), at_time)
+
+    @staticmethod
+    def _check_at_time(at_time):
+        """Default at_time to the current UTC time and reject naive times."""
+        if at_time is None:
+            return datetime.now(UTC)
+        if at_time.tzinfo is None:
+            raise ValueError("at_time must be timezone-aware")
+        return at_time
+
+    def _is_period_completed(self, session: Session, period):
+        """
+        Check whether a period holds its quota of completions, with an indexed count.
+
+        Args:
+            session (Session): SQLAlchemy database session
+            period (date): Period key
+
+        Returns:
+            bool: True if the period is completed
+        """
+        rule = self.period_rule
+        count = session.scalar(
+            select(func.count()).select_from(Completion).where(
+                Completion.habit_id == self.id,
+                Completion.period_start >= period,
+                Completion.period_start < period + rule.length,
+            )
+        )
+        return count >= rule.quota
+
+    def _count_adjacent_periods(self, session: Session, period, direction, archived):
+        """
+        Count the consecutive completed periods next to a period, not counting the period itself.
+
+        Completions are streamed from the index in the walking direction and
+        stop being read at the first period that isn't completed.
+
+        Args:
+            session (Session): SQLAlchemy database session
+            period (date): Period key to start from
+            direction (int): -1 to walk back in time, 1 to walk forward
+            archived (list): (start, end) period keys of the archived runs, oldest first
+
+        Returns:
+            int: Number of completed periods
+        """
+        rule = self.period_rule
+        step = rule.length * direction
+        backwards = direction < 0
+        query = select(Completion.period_start).where(Completion.habit_id == self.id)
+        if backwards:
+            query = query.where(Completion.period_start < period).order_by(Completion.period_start.desc())
+        else:
+            query = query.where(Completion.period_start >= period + rule.length).order_by(Completion.period_start)
+        rows = session.scalars(query.execution_options(yield_per=256))
+        groups = ((key, sum(1 for _ in group)) for key, group in groupby(rows, key=rule.period_key))
+
+        count = 0
+        expected = period + step
+        group = next(groups, None)
+        try:
+            while True:
+                run = next((run for run in archived if run[0] <= expected <= run[1]), None)
+                if run is not None:
+                    # Skip the whole archived run
+                    edge = run[0] if backwards else run[1]
+                    count += abs((edge - expected).days) // rule.length_days + 1
+                    expected = edge + step
+                    continue
+                while group is not None and (group[0] > expected if backwards else group[0] < expected):
+                    group = next(groups, None)
+                if group is None or group[0] != expected or group[1] < rule.quota:
+                    return count
+                count += 1
+                expected += step
+                group = next(groups, None)
+        finally:
+            rows.close()
+
+    def _latest_completed_period(self, session: Session):
+        """
+        Find the latest period that holds its quota of completions, reading from the newest completion back.
+
+        Args:
+            session (Session): SQLAlchemy database session
+
+        Returns:
+            tuple: (period key, UTC date of its last completion), or (None, None) without completed periods
+        """
+        rule = self.period_rule
+        rows = session.execute(
+            select(Completion.period_start, Completion.completed_at)
+            .where(Completion.habit_id == self.id)
+            .order_by(Completion.period_start.desc())
+            .execution_options(yield_per=256)
+        )
+        try:
+            for key, group in groupby(rows, key=lambda row: rule.period_key(row[0])):
+                dates = [completed_at.date() for _, completed_at in group]
+                if len(dates) >= rule.quota:
+                    return key, max(dates)
+            return None, None
+        finally:
+            rows.close()
+
+    def add_tags(self, session: Session, names):
+        """
+        Tag the habit, creating tags that don't exist yet.
+
+        Args:
+            session (Session): SQLAlchemy database session
+            names (Iterable[str]): Tag names
+
+        Returns:
+            list: Normalized names of the tags that were added
+
+        Raises:
+            ValueError: If a name is empty
+        """
+        tags = [get_or_create_tag(session, name) for name in names]
+        added = [tag for tag in dict.fromkeys(tags) if tag not in self.tags]
+        self.tags.extend(added)
+        if added:
+            record_event(session, HABIT_UPDATED, self, tags=[tag.name for tag in self.tags])
+        return [tag.name for tag in added]
+
+    def remove_tags(self, session: Session, names):
+        """
+        Remove tags from the habit. Tags the habit doesn't have are ignored.
+
+        Args:
+            session (Session): SQLAlchemy database session
+            names (Iterable[str]): Tag names
+
+        Returns:
+            list: Normalized names of the tags that were removed
+        """
+        names = {normalize_tag_name(name) for name in names}
+        removed = [tag for tag in self.tags if tag.name in names]
+        for tag in removed:
+            self.tags.remove(tag)
+        if removed:
+            record_event(session, HABIT_UPDATED, self, tags=[tag.name for tag in self.tags])
+        return [tag.name for tag in removed]
+
+    def add_goal(self, kind, target, at_time=None):
+        """
+        Set a goal for the habit.
+
+        Completion goals count the completions made from now on; streak goals
+        start from the current streak.
+
+        Args:
+            kind (str): GOAL_COMPLETIONS or GOAL_STREAK
+            target (int): Number of completions or streak length to reach
+            at_time (datetime, optional): Time the goal is set. Defaults to current UTC time
+
+        Returns:
+            Goal: The new goal
+
+        Raises:
+            ValueError: If the kind is unknown or the target is not positive
+        """
+        if kind not in GOAL_KINDS:
+            raise ValueError(f"Goal kind must be one of: {', '.join(GOAL_KINDS)}")
+        if target < 1:
+            raise ValueError("Goal target must be at least 1")
+        at_time = (at_time or datetime.now(UTC)).astimezone(UTC)
+        goal = Goal(kind=kind, target=target, progress=0, created_at=at_time)
+        self.goals.append(goal)
+        goal.update_progress((self.current_streak or 0) if kind == GOAL_STREAK else 0, at_time)
+        return goal
 
     def _update_streak(self, completion_time):
         """
@@ -117,30 +618,14 @@ class Habit(Base):
 
         Returns:
             bool: True if completion maintains streak, False otherwise
-
-        Raises:
-            ValueError: If habit has invalid periodicity
         """
-        if self.periodicity == 'daily':
-            last_completion = self.daily_completions[-1] if self.daily_completions else None
-            if not last_completion:
-                return True
-            # Ensure both dates are UTC-aware before comparison
-            last_completion_date = last_completion.completed_at.replace(tzinfo=UTC).date()
-            completion_date = completion_time.replace(tzinfo=UTC).date()
-            return (completion_date - last_completion_date) <= timedelta(days=1)
-        elif self.periodicity == 'weekly':
-            last_completion = self.weekly_completions[-1] if self.weekly_completions else None
-            if not last_completion:
-                return True
-            # Ensure both dates are UTC-aware before comparison
-            current_week_start = self._get_week_start(completion_time.replace(tzinfo=UTC))
-            last_week_start = self._get_week_start(last_completion.completed_at.replace(tzinfo=UTC))
-            return (current_week_start - last_week_start) <= timedelta(weeks=1)
-        else:
-            raise ValueError(f"Invalid periodicity: {self.periodicity}")
+        completions = self._get_completions()
+        if not completions:
+            return True
+        rule = self.period_rule
+        last_period = rule.period_key(completions[-1].completed_at)
+        return rule.period_key(completion_time) - last_period <= rule.length
 
-    
     def calculate_streak(self, at_time=None):
         """
         Calculate the current streak based on completion history.
@@ -156,49 +641,9 @@ class Habit(Base):
         elif at_time.tzinfo is None:
             raise ValueError("at_time must be timezone-aware")
 
-        completions = (self.daily_completions if self.periodicity == 'daily' 
-                      else self.weekly_completions)
-        
-        if not completions:
-            return 0
-
-        # Check if the last completion is recent enough to count
-        last_completion_date = completions[-1].completed_at.date()
-        days_since_last = (at_time.date() - last_completion_date).days
-    
-        # If too much time has passed, streak is broken
-        if (self.periodicity == 'daily' and days_since_last > 1) or \
-        (self.periodicity == 'weekly' and days_since_last > 7):
-            return 0
-
-        streak = 1
-        if self.periodicity == 'daily':
-            # Get all completion dates and sort them
-            completion_dates = sorted([c.completed_at.date() for c in completions], reverse=True)
-            
-            current_date = completion_dates[0]
-            
-            for next_date in completion_dates[1:]:
-                if (current_date - next_date) == timedelta(days=1):
-                    streak += 1
-                    current_date = next_date
-                else:
-                    break
-                    
-        else:  # weekly
-            # Get all completion weeks and sort them
-            completion_weeks = sorted([self._get_week_start(c.completed_at) for c in completions], reverse=True)
-            
-            current_week = completion_weeks[0]
-            
-            for next_week in completion_weeks[1:]:
-                if (current_week - next_week) == timedelta(weeks=1):
-                    streak += 1
-                    current_week = next_week
-                else:
-                    break
-
-        return streak 
+        completion_dates, archived_runs = self._get_period_history()
+        current_streak, _ = self.period_rule.streaks(completion_dates, archived_runs, at_time.astimezone(UTC).date())
+        return current_streak
 
     def calculate_max_streak(self):
         """
@@ -207,56 +652,95 @@ class Habit(Base):
         Returns:
             int: Maximum streak achieved
         """
-        completions = (self.daily_completions if self.periodicity == 'daily' 
-                      else self.weekly_completions)
-        
-        if not completions:
-            return 0
+        _, max_streak = self.period_rule.streaks(*self._get_period_history())
+        return max_streak
 
-        max_streak = current_streak = 1
-        
-        if self.periodicity == 'daily':
-            completion_dates = sorted([c.completed_at.date() for c in completions])
-            current_date = completion_dates[0]
-            
-            for next_date in completion_dates[1:]:
-                if (next_date - current_date) == timedelta(days=1):
-                    current_streak += 1
-                    max_streak = max(max_streak, current_streak)
-                else:
-                    current_streak = 1
-                current_date = next_date
-        else:  # weekly
-            completion_weeks = sorted([self._get_week_start(c.completed_at) for c in completions])
-            current_week = completion_weeks[0]
-            
-            for next_week in completion_weeks[1:]:
-                if (next_week - current_week) == timedelta(weeks=1):
-                    current_streak += 1
-                    max_streak = max(max_streak, current_streak)
-                else:
-                    current_streak = 1
-                current_week = next_week
+    def get_period_runs(self):
+        """
+        Get the runs of consecutive completed periods, oldest first.
+
+        Archived runs and the completed periods of the remaining completions
+        are merged, so the work is proportional to the number of archived
+        runs plus the number of recent completions.
+
+        Returns:
+            list: (start, end) tuples with the key of the first and last period of each run
+        """
+        rule = self.period_rule
+        return rule.merge_runs(rule.completed_periods(self._get_completion_dates()), self._get_archived_runs())
+
+    def _get_completions(self):
+        """Get the completion records of the habit, oldest first."""
+        if completion_model_for(self.periodicity) is DailyCompletion:
+            return self.daily_completions
+        return self.weekly_completions
+
+    def _get_completion_dates(self):
+        """
+        Get the UTC date of every stored completion in ascending order.
+
+        Returns:
+            list: One date per completion
+        """
+        dates = []
+        for completion in self._get_completions():
+            completed_at = completion.completed_at
+            # Loaded completions are naive UTC, new ones may carry any timezone
+            dates.append(completed_at.astimezone(UTC).date() if completed_at.tzinfo else completed_at.date())
+        dates.sort()
+        return dates
+
+    def _get_archived_runs(self):
+        """Get the (start, end) period keys of the archived runs, oldest first."""
+        return [(run.start_period, run.end_period) for run in self.completion_runs]
+
+    def _get_period_history(self):
+        """Get the completion dates and archived runs, from the period index if it covers the habit."""
+        history = self._get_indexed_history()
+        if history is not None:
+            return history.completion_dates(), history.archived_runs
+        return self._get_completion_dates(), self._get_archived_runs()
+
+    def _get_indexed_history(self):
+        """
+        Look the habit up in the period index.
+
+        The index only holds committed completions, so it isn't used while
+        the session has completion changes of the habit that aren't committed.
+
+        Returns:
+            IndexedHistory: Completion history from the index, None if it can't be used
+        """
+        index = Habit.period_index
+        if index is None or self.id is None or self.created_at is None:
+            return None
+        session = object_session(self)
+        if session is not None:
+            if self.id in {habit_id for habit_id, _, _ in session.info.get(UNCOMMITTED_COMPLETIONS, ())}:
+                return None
+            for completion in (*session.new, *session.dirty, *session.deleted):
+                # New completions only get their habit_id when they are flushed
+                if isinstance(completion, Completion) and completion.habit_id in (self.id, None):
+                    return None
+        return index.lookup(self.id, self.created_at)
 
-        return max_streak
-    
     def get_last_completion(self):
         """
         Get the most recent completion time for the habit.
+        Falls back to the start of the last archived period when all completions are archived.
 
         Returns:
             datetime: The last completion time, or None if never completed
         """
-        if self.periodicity == 'daily':
-            last_completion = (self.daily_completions[-1]
-                         if self.daily_completions 
-                         else None)
-        else:  # weekly
-            last_completion = (self.weekly_completions[-1]
-                         if self.weekly_completions 
-                         else None)
-    
-        return last_completion.completed_at if last_completion else None
+        history = self._get_indexed_history()
+        if history is not None:
+            return history.last_completed_at()
+        completions = self._get_completions()
+        if completions:
+            return completions[-1].completed_at
+        if self.completion_runs:
+            return datetime.combine(self.completion_runs[-1].end_period, datetime.min.time(), tzinfo=UTC)
+        return None
 
     @staticmethod
     def _get_week_start(date):
@@ -271,38 +755,336 @@ class Habit(Base):
         """
         return date.date() - timedelta(days=date.weekday())
 
-class DailyCompletion(Base):
+def get_active_habit(session: Session, habit_id):
+    """
+    Get a habit by id unless it has been deleted.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        habit_id (int): ID of the habit
+
+    Returns:
+        Habit: The habit, or None if it doesn't exist or is deleted
+    """
+    habit = session.get(Habit, habit_id)
+    if habit is None or habit.deleted_at is not None:
+        return None
+    return habit
+
+HABIT_CREATED = 'habit_created'
+HABIT_UPDATED = 'habit_updated'
+HABIT_DELETED = 'habit_deleted'
+HABIT_COMPLETED = 'habit_completed'
+HABIT_COMPLETION_REMOVED = 'habit_completion_removed'
+
+# Completion changes of a session that are flushed but not committed yet, kept in Session.info
+UNCOMMITTED_COMPLETIONS = 'uncommitted_completions'
+
+GOAL_COMPLETIONS = 'completions'
+GOAL_STREAK = 'streak'
+GOAL_KINDS = (GOAL_COMPLETIONS, GOAL_STREAK)
+
+def record_event(session: Session, event_type, habit, **data):
+    """
+    Add an event to the habit event log in the session's current transaction,
+    so it is committed (or rolled back) together with the change it describes.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        event_type (str): One of HABIT_CREATED, HABIT_UPDATED, HABIT_DELETED, HABIT_COMPLETED
+                          or HABIT_COMPLETION_REMOVED
+        habit (Habit): The changed habit; new habits are flushed to get their ID
+        **data: JSON-serializable details stored as the event payload
+
+    Returns:
+        HabitEvent: The pending event
+    """
+    if habit.id is None:
+        session.flush()
+    event = HabitEvent(event_type=event_type, habit_id=habit.id, payload=json.dumps(data))
+    session.add(event)
+    return event
+
+def completion_kind(periodicity):
+    """
+    Get the kind of completion records stored for habits with a periodicity.
+
+    Args:
+        periodicity (str): Periodicity of the habit
+
+    Returns:
+        str: 'weekly' for weekly habits, 'daily' for all others
+    """
+    return 'weekly' if periodicity == 'weekly' else 'daily'
+
+def completion_model_for(periodicity):
+    """
+    Get the model storing the completions of habits with a periodicity.
+
+    Args:
+        periodicity (str): Periodicity of the habit
+
+    Returns:
+        type: WeeklyCompletion for weekly habits, DailyCompletion for all others
+    """
+    return WeeklyCompletion if completion_kind(periodicity) == 'weekly' else DailyCompletion
+
+def _completion_period(context):
+    """
+    Derive the period of a completion for inserts that don't set it explicitly.
+
+    Args:
+        context (DefaultExecutionContext): SQLAlchemy execution context of the insert
+
+    Returns:
+        date: UTC day of the completion, or the Monday of its week for weekly completions
+    """
+    parameters = context.get_current_parameters()
+    completed_at = parameters.get('completed_at') or datetime.now(UTC)
+    if completed_at.tzinfo is not None:
+        completed_at = completed_at.astimezone(UTC)
+    if parameters.get('kind') == 'weekly':
+        return Habit._get_week_start(completed_at)
+    return completed_at.date()
+
+class Completion(Base):
     """
-    Records a single completion of a daily habit.
+    Records a single completion of a habit.
+
+    All completions share one table, so questions across habits (e.g. all
+    completions of a day) are answered by a single indexed query. The kind
+    tells how a completion is stored: 'daily' completions are kept once per
+    habit and UTC day, 'weekly' completions once per habit and week, keyed
+    by the Monday of the week. Use the DailyCompletion and WeeklyCompletion
+    subclasses to create them.
 
     Attributes:
         id (int): Primary key
         habit_id (int): Foreign key to associated habit
+        kind (str): 'daily' or 'weekly'
+        period_start (date): UTC day (daily) or Monday of the week (weekly) of the completion
         completed_at (datetime): When the habit was completed
-        habit (Habit): Related habit object
     """
-    __tablename__ = 'daily_completions'
+    __tablename__ = 'completions'
+    __table_args__ = (
+        Index('ix_completions_habit_period', 'habit_id', 'period_start'),
+        Index('uq_completions_habit_day', 'habit_id', 'period_start', unique=True,
+              sqlite_where=text("kind = 'daily'")),
+        Index('ix_completions_completed_at', 'completed_at'),
+    )
 
     id = Column(Integer, primary_key=True)
-    habit_id = Column(Integer, ForeignKey('habits.id'))
+    habit_id = Column(Integer, ForeignKey('habits.id'), nullable=False)
+    kind = Column(String, nullable=False)
+    period_start = Column(Date, nullable=False, default=_completion_period)
     completed_at = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
+
+    __mapper_args__ = {'polymorphic_on': kind}
+
+class DailyCompletion(Completion):
+    """
+    Records a single completion of a habit stored per day (every periodicity except weekly).
+    Only one completion is stored per habit and day.
+
+    Attributes:
+        day (date): UTC day of the completion, stored as period_start
+        habit (Habit): Related habit object
+    """
+    __mapper_args__ = {'polymorphic_identity': 'daily'}
+
+    day = synonym('period_start')
     habit = relationship("Habit", back_populates="daily_completions")
 
-class WeeklyCompletion(Base):
+class WeeklyCompletion(Completion):
+    """
+    Records the completion of a weekly habit in one week.
+    Only one completion is stored per habit and week, holding the latest time.
+
+    Attributes:
+        week_start (date): Monday date of the completion week, stored as period_start
+        habit (Habit): Related habit object
+    """
+    __mapper_args__ = {'polymorphic_identity': 'weekly'}
+
+    week_start = synonym('period_start')
+    habit = relationship("Habit", back_populates="weekly_completions")
+
+
+# Association of habits and tags. The primary key serves lookups by habit,
+# the (tag_id, habit_id) index filters and groups by tag
+habit_tags = Table(
+    'habit_tags',
+    Base.metadata,
+    Column('habit_id', Integer, ForeignKey('habits.id'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True),
+    Index('ix_habit_tags_tag_habit', 'tag_id', 'habit_id'),
+)
+
+
+def normalize_tag_name(name):
     """
-    Records a single completion of a weekly habit.
+    Get the canonical spelling of a tag: lowercase with single spaces.
+
+    Args:
+        name (str): Tag name as entered
+
+    Returns:
+        str: Normalized tag name
+
+    Raises:
+        ValueError: If the name is empty
+    """
+    normalized = " ".join(str(name).lower().split())
+    if not normalized:
+        raise ValueError("Tag name must not be empty")
+    return normalized
+
+
+def get_or_create_tag(session: Session, name):
+    """
+    Get the tag with a name, creating it if it doesn't exist yet.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        name (str): Tag name, normalized with normalize_tag_name
+
+    Returns:
+        Tag: The existing or new tag
+
+    Raises:
+        ValueError: If the name is empty
+    """
+    name = normalize_tag_name(name)
+    tag = session.query(Tag).filter(Tag.name == name).first()
+    if tag is None:
+        tag = Tag(name=name)
+        session.add(tag)
+    return tag
+
+
+class Tag(Base):
+    """
+    Label for grouping habits, e.g. 'health' or 'chores'. A habit can have any number of tags.
+
+    Attributes:
+        id (int): Primary key
+        name (str): Unique, normalized name of the tag
+        habits (list): Habits with the tag
+    """
+    __tablename__ = 'tags'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+    habits = relationship("Habit", secondary=habit_tags, back_populates="tags", lazy="select")
+
+
+class CompletionRun(Base):
+    """
+    Archived run of consecutive completed periods of a habit.
+    Replaces the individual completions of the run once they are archived.
 
     Attributes:
         id (int): Primary key
         habit_id (int): Foreign key to associated habit
-        week_start (date): Monday date of the completion week
-        completed_at (datetime): When the habit was completed
+        start_period (date): First day (daily) or Monday (weekly) of the run
+        end_period (date): Last day (daily) or Monday (weekly) of the run
         habit (Habit): Related habit object
     """
-    __tablename__ = 'weekly_completions'
+    __tablename__ = 'completion_runs'
+    __table_args__ = (
+        Index('ix_completion_runs_habit_start', 'habit_id', 'start_period'),
+    )
 
     id = Column(Integer, primary_key=True)
-    habit_id = Column(Integer, ForeignKey('habits.id'))
-    week_start = Column(Date, nullable=False)
-    completed_at = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
-    habit = relationship("Habit", back_populates="weekly_completions")
+    habit_id = Column(Integer, ForeignKey('habits.id'), nullable=False)
+    start_period = Column(Date, nullable=False)
+    end_period = Column(Date, nullable=False)
+    habit = relationship("Habit", back_populates="completion_runs")
+
+
+class Goal(Base):
+    """
+    Target set for a habit: a number of completions or a streak length.
+
+    Progress is a counter kept up to date by Habit.complete,
+    Habit.remove_completion and Habit.refresh_streaks, so showing it never
+    counts completions. Completion goals count the completions made since
+    the goal was set, streak goals hold the longest streak reached since.
+
+    Attributes:
+        id (int): Primary key
+        habit_id (int): Foreign key to associated habit
+        kind (str): 'completions' or 'streak'
+        target (int): Value to reach
+        progress (int): Current value
+        created_at (datetime): When the goal was set
+        achieved_at (datetime): When the target was reached, None while it isn't
+        habit (Habit): Related habit object
+    """
+    __tablename__ = 'goals'
+
+    id = Column(Integer, primary_key=True)
+    habit_id = Column(Integer, ForeignKey('habits.id'), nullable=False, index=True)
+    kind = Column(String, nullable=False)
+    target = Column(Integer, nullable=False)
+    progress = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(UTC))
+    achieved_at = Column(DateTime(timezone=True), index=True)
+    habit = relationship("Habit", back_populates="goals")
+
+    def update_progress(self, progress, at_time):
+        """
+        Store new progress and mark the goal achieved, or no longer achieved, accordingly.
+
+        Args:
+            progress (int): New progress
+            at_time (datetime): Time of the change, recorded when the target is reached
+        """
+        self.progress = max(progress, 0)
+        if self.progress < self.target:
+            self.achieved_at = None
+        elif self.achieved_at is None:
+            self.achieved_at = at_time
+
+
+class QueueCheckpoint(Base):
+    """
+    Position of a write-behind completion queue that has been applied to the database.
+    Updated in the same transaction as the completions it covers.
+
+    Attributes:
+        name (str): Name of the queue
+        applied_seq (int): Sequence number of the last applied queue entry
+    """
+    __tablename__ = 'queue_checkpoints'
+
+    name = Column(String, primary_key=True)
+    applied_seq = Column(Integer, nullable=False, default=0)
+
+
+class HabitEvent(Base):
+    """
+    Entry of the append-only log of habit changes, for consumers that follow
+    changes incrementally (see events.py).
+
+    Events are written in the transaction of the change and numbered by an
+    AUTOINCREMENT key, so sequence numbers only grow and are never reused.
+    SQLite commits one writer at a time, so an event is visible only after
+    every event with a lower number, and reading from the last number seen
+    misses nothing. habit_id is not a foreign key: events outlive purged habits.
+
+    Attributes:
+        seq (int): Sequence number of the event
+        event_type (str): Kind of change, e.g. 'habit_completed'
+        habit_id (int): ID of the changed habit
+        occurred_at (datetime): When the event was recorded
+        payload (str): JSON object with the details of the change
+    """
+    __tablename__ = 'habit_events'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    seq = Column(Integer, primary_key=True)
+    event_type = Column(String, nullable=False)
+    habit_id = Column(Integer, nullable=False, index=True)
+    occurred_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(UTC))
+    payload = Column(String, nullable=False, default='{}')
@@ -0,0 +1,414 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, UTC
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import Integer, cast, event, func, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from database import read_transaction
+from models import Habit, Completion, CompletionRun, UNCOMMITTED_COMPLETIONS
+
+PERIOD_INDEX_FILE = "habits.idx"
+
+_MAGIC = b"HAPIIDX1"
+# Magic, number of habits, size of the base written by build_period_index
+_HEADER = struct.Struct("<8sqq")
+# Habit ID, creation time, offset of its data, number of completions, number of archived runs
+_ENTRY = struct.Struct("<qqqqq")
+# Habit ID, completion time, ADDED or REMOVED
+_RECORD = struct.Struct("<qqq")
+ADDED = 1
+REMOVED = -1
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+_EPOCH_ORDINAL = _EPOCH.date().toordinal()
+_MICROSECONDS_PER_DAY = 86400 * 10**6
+# julianday() of the day before date.min, so julianday(day) - _JULIAN_OFFSET is date.toordinal()
+_JULIAN_OFFSET = 1721424.5
+
+
+def to_microseconds(moment: datetime) -> int:
+    """Convert a naive UTC or timezone-aware time to microseconds since 1970-01-01 UTC."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=UTC)
+    return (moment - _EPOCH) // timedelta(microseconds=1)
+
+
+def _pack(values) -> bytes:
+    """Little-endian int64 bytes of the values."""
+    packed = array("q", values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(buffer) -> array:
+    """int64 values of little-endian bytes."""
+    values = array("q")
+    values.frombytes(buffer)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class IndexedHistory(NamedTuple):
+    """
+    Completion history of a habit as stored in the period index.
+
+    Attributes:
+        completion_times (List[int]): Completion times in microseconds since 1970-01-01 UTC, ascending
+        archived_runs (List[Tuple[date, date]]): (start, end) period keys of the archived runs, oldest first
+    """
+    completion_times: List[int]
+    archived_runs: List[Tuple[date, date]]
+
+    def completion_dates(self) -> List[date]:
+        """List[date]: UTC date of every completion, ascending."""
+        return [date.fromordinal(_EPOCH_ORDINAL + time // _MICROSECONDS_PER_DAY) for time in self.completion_times]
+
+    def last_completed_at(self) -> Optional[datetime]:
+        """
+        Get the most recent completion time, like Habit.get_last_completion.
+
+        Returns:
+            datetime: UTC-aware time of the last completion, the start of the last archived
+                      period when all completions are archived, or None if never completed
+        """
+        if self.completion_times:
+            return _EPOCH + timedelta(microseconds=self.completion_times[-1])
+        if self.archived_runs:
+            return datetime.combine(self.archived_runs[-1][1], datetime.min.time(), tzinfo=UTC)
+        return None
+
+
+@dataclass(frozen=True)
+class PeriodIndexResult:
+    """
+    Summary of a period index build.
+
+    Attributes:
+        path (str): Path of the written index
+        habits (int): Number of indexed habits
+        completions (int): Number of indexed completions
+        size (int): Size of the written file in bytes
+    """
+    path: str
+    habits: int
+    completions: int
+    size: int
+
+
+def build_period_index(engine: Engine, path: str = PERIOD_INDEX_FILE) -> PeriodIndexResult:
+    """
+    Write the period index of all active habits from the database.
+
+    The completions and archived runs are read in one read transaction,
+    streamed in habit order and written as one block per habit; changes
+    committed later are appended by PeriodIndex.track. The file is written
+    next to `path` and moved into place, so open indexes switch to the new
+    file on their next lookup. Changes appended by other processes while
+    the index is rebuilt can be missed until the next rebuild.
+
+    Args:
+        engine (Engine): Engine of the database to index
+        path (str): Index file to write
+
+    Returns:
+        PeriodIndexResult: Path and counts of the index
+    """
+    completed_at = Completion.completed_at
+    # SQLite stores times as 'YYYY-MM-DD HH:MM:SS.ffffff'
+    microseconds = (
+        cast(func.strftime('%s', completed_at), Integer) * 10**6
+        + cast(func.substr(completed_at, 21, 6), Integer)
+    )
+    active = Habit.deleted_at.is_(None)
+    temporary_path = f"{path}.tmp"
+    completions = 0
+    try:
+        with read_transaction(engine) as conn, open(temporary_path, "wb") as file:
+            habits = conn.execute(select(Habit.id, Habit.created_at).where(active).order_by(Habit.id)).all()
+            runs = {
+                habit_id: [ordinal for _, start, end in rows for ordinal in (start, end)]
+                for habit_id, rows in groupby(conn.execute(
+                    select(CompletionRun.habit_id,
+                           cast(func.julianday(CompletionRun.start_period) - _JULIAN_OFFSET, Integer),
+                           cast(func.julianday(CompletionRun.end_period) - _JULIAN_OFFSET, Integer))
+                    .join(Habit, Habit.id == CompletionRun.habit_id)
+                    .where(active)
+                    .order_by(CompletionRun.habit_id, CompletionRun.start_period)
+                ), key=itemgetter(0))
+            }
+            times = groupby(conn.execute(
+                select(Completion.habit_id, microseconds)
+                .join(Habit, Habit.id == Completion.habit_id)
+                .where(active)
+                .order_by(Completion.habit_id, Completion.period_start)
+            ), key=itemgetter(0))
+            next_group = next(times, None)
+
+            offset = _HEADER.size + _ENTRY.size * len(habits)
+            file.seek(offset)
+            entries = []
+            for habit_id, created_at in habits:
+                habit_times = []
+                if next_group is not None and next_group[0] == habit_id:
+                    habit_times = [time for _, time in next_group[1]]
+                    next_group = next(times, None)
+                habit_runs = runs.get(habit_id, [])
+                file.write(_pack(habit_times))
+                file.write(_pack(habit_runs))
+                entries.append(_ENTRY.pack(
+                    habit_id, to_microseconds(created_at or _EPOCH), offset, len(habit_times), len(habit_runs) // 2
+                ))
+                offset += 8 * (len(habit_times) + len(habit_runs))
+                completions += len(habit_times)
+
+            file.seek(0)
+            file.write(_HEADER.pack(_MAGIC, len(habits), offset))
+            file.write(b"".join(entries))
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    return PeriodIndexResult(path, len(habits), completions, os.path.getsize(path))
+
+
+class PeriodIndex:
+    """
+    Memory-mapped completion history of every habit, for lookups without the database.
+
+    The file holds a table of habits sorted by ID, found by binary search,
+    pointing to each habit's sorted completion times and archived runs.
+    Completions recorded or removed after the index was built are appended
+    to the end of the file as fixed-size records, which every open index
+    reads on its next lookup, so several processes can share one file.
+
+    Only habits that existed when the index was built are served; for all
+    others lookup returns None and callers read the database instead.
+    Bulk changes that bypass the session (seeding, archiving, purging) are
+    picked up by rebuilding the index with build_period_index.
+
+    Args:
+        path (str): Index file written by build_period_index
+
+    Raises:
+        ValueError: If the file is not a period index
+    """
+
+    def __init__(self, path: str = PERIOD_INDEX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._map = None
+        self._listeners = []
+        self._open()
+
+    def _open(self):
+        """Map the index file and read the records appended to it."""
+        file = open(self.path, "rb")
+        try:
+            header = file.read(_HEADER.size)
+            if len(header) < _HEADER.size or not header.startswith(_MAGIC):
+                raise ValueError(f"{self.path} is not a period index")
+            _, habit_count, base_size = _HEADER.unpack(header)
+            mapped = mmap.mmap(file.fileno(), base_size, access=mmap.ACCESS_READ)
+        except BaseException:
+            file.close()
+            raise
+        if self._file is not None:
+            self._map_close()
+        self._file, self._map = file, mapped
+        self._habit_count, self._base_size = habit_count, base_size
+        self._inode = os.fstat(file.fileno()).st_ino
+        self._read_until = self._base_size
+        self._changes = {}
+        self._read_records()
+
+    def _map_close(self):
+        """Unmap and close the current file."""
+        self._map.close()
+        self._file.close()
+
+    def close(self):
+        """Stop tracking changes and close the index file."""
+        self.untrack()
+        with self._lock:
+            if self._file is not None:
+                self._map_close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _read_records(self):
+        """Apply the change records appended since the last read."""
+        self._file.seek(self._read_until)
+        data = self._file.read()
+        data = data[:len(data) - len(data) % _RECORD.size]
+        for habit_id, time, change in _RECORD.iter_unpack(data):
+            self._changes.setdefault(habit_id, []).append((change, time))
+        self._read_until += len(data)
+
+    def refresh(self):
+        """Switch to a rebuilt index file and read newly appended records."""
+        try:
+            status = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if status.st_ino != self._inode:
+            self._open()
+        elif status.st_size > self._read_until:
+            self._read_records()
+
+    def _find(self, habit_id: int) -> Optional[tuple]:
+        """Binary search the habit table for a habit's entry."""
+        low, high = 0, self._habit_count
+        while low < high:
+            middle = (low + high) // 2
+            entry = _ENTRY.unpack_from(self._map, _HEADER.size + middle * _ENTRY.size)
+            if entry[0] < habit_id:
+                low = middle + 1
+            elif entry[0] > habit_id:
+                high = middle
+            else:
+                return entry
+        return None
+
+    def lookup(self, habit_id: int, created_at: datetime) -> Optional[IndexedHistory]:
+        """
+        Get the completion history of a habit.
+
+        Args:
+            habit_id (int): ID of the habit
+            created_at (datetime): Creation time of the habit, so a reused ID isn't mistaken for a purged habit
+
+        Returns:
+            IndexedHistory: Completion times and archived runs, None if the index doesn't cover the habit
+        """
+        with self._lock:
+            if self._file is None:
+                return None
+            self.refresh()
+            entry = self._find(habit_id)
+            if entry is None or entry[1] != to_microseconds(created_at):
+                return None
+            _, _, offset, count, run_count = entry
+            end = offset + 8 * count
+            times = _unpack(self._map[offset:end]).tolist()
+            ordinals = _unpack(self._map[end:end + 16 * run_count])
+            changes = self._changes.get(habit_id, ())
+        if changes:
+            for change, time in changes:
+                if change == ADDED:
+                    times.append(time)
+                elif time in times:
+                    times.remove(time)
+            times.sort()
+        runs = [
+            (date.fromordinal(ordinals[position]), date.fromordinal(ordinals[position + 1]))
+            for position in range(0, len(ordinals), 2)
+        ]
+        return IndexedHistory(times, runs)
+
+    def append(self, changes: Iterable[Tuple[int, int, int]]):
+        """
+        Append committed completion changes to the index file.
+
+        Args:
+            changes (Iterable[tuple]): (habit ID, completion time in microseconds, ADDED or REMOVED)
+        """
+        data = b"".join(_RECORD.pack(*change) for change in changes)
+        if not data:
+            return
+        # A single append keeps the records of concurrent writers whole
+        with open(self.path, "ab") as file:
+            file.write(data)
+
+    def track(self, target=Session):
+        """
+        Append the completion changes of every committed transaction of `target` to the index.
+
+        Args:
+            target: Session class, sessionmaker or session whose transactions are tracked
+        """
+        for name, listener in (
+            ("after_flush", self._collect_changes),
+            ("after_commit", self._append_changes),
+            ("after_rollback", self._discard_changes),
+        ):
+            event.listen(target, name, listener)
+            self._listeners.append((target, name, listener))
+
+    def untrack(self):
+        """Stop appending changes to the index."""
+        while self._listeners:
+            event.remove(*self._listeners.pop())
+
+    @staticmethod
+    def _collect_changes(session, flush_context):
+        """Remember the completions a flush added, moved or deleted until the transaction ends."""
+        changes = session.info.setdefault(UNCOMMITTED_COMPLETIONS, [])
+        for completion in session.new:
+            if isinstance(completion, Completion):
+                changes.append((completion.habit_id, to_microseconds(completion.completed_at), ADDED))
+        for completion in session.deleted:
+            if isinstance(completion, Completion):
+                previous = inspect(completion).attrs.completed_at.history.deleted
+                completed_at = previous[0] if previous else completion.completed_at
+                changes.append((completion.habit_id, to_microseconds(completed_at), REMOVED))
+        for completion in session.dirty:
+            if isinstance(completion, Completion):
+                history = inspect(completion).attrs.completed_at.history
+                if history.deleted and history.added:
+                    changes.append((completion.habit_id, to_microseconds(history.deleted[0]), REMOVED))
+                    changes.append((completion.habit_id, to_microseconds(history.added[0]), ADDED))
+
+    def _append_changes(self, session):
+        """Append the changes of a committed transaction."""
+        self.append(session.info.pop(UNCOMMITTED_COMPLETIONS, ()))
+
+    @staticmethod
+    def _discard_changes(session):
+        """Forget the changes of a rolled back transaction."""
+        session.info.pop(UNCOMMITTED_COMPLETIONS, None)
+
+
+def enable_period_index(path: str = PERIOD_INDEX_FILE, target=Session) -> PeriodIndex:
+    """
+    Serve Habit.calculate_streak, calculate_max_streak and get_last_completion
+    from a period index and keep it up to date with the completions committed
+    through `target`.
+
+    Args:
+        path (str): Index file written by build_period_index
+        target: Session class, sessionmaker or session whose completions are appended
+
+    Returns:
+        PeriodIndex: The opened index
+
+    Raises:
+        ValueError: If the file is not a period index
+    """
+    index = PeriodIndex(path)
+    index.track(target)
+    Habit.period_index = index
+    return index
+
+
+def disable_period_index():
+    """Read streaks from the database again and close the enabled period index."""
+    index, Habit.period_index = Habit.period_index, None
+    if index is not None:
+        index.close()
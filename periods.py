@@ -0,0 +1,288 @@
+import heapq
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, UTC
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+# A Monday, so periods whose length is a multiple of seven days start on Mondays
+PERIOD_EPOCH = date(1970, 1, 5)
+
+_EVERY_N_DAYS = re.compile(r"^every\s+(\d+)\s+days?$")
+_TIMES_PER_WEEK = re.compile(r"^(\d+)\s+times?\s+(?:per|a)\s+week$")
+
+PERIODICITY_FORMATS = "daily, weekly, 'every N days' or 'X times per week'"
+
+
+class PeriodSummary(NamedTuple):
+    """
+    Streaks and next deadline of a completion history.
+
+    Attributes:
+        current_streak (int): Current streak
+        max_streak (int): Maximum streak
+        next_due (date): First day after the earliest period, from the current one on,
+                         that isn't completed yet. None without a reference date
+    """
+    current_streak: int
+    max_streak: int
+    next_due: Optional[date]
+
+
+@dataclass(frozen=True)
+class PeriodRule:
+    """
+    Maps completion times to periods and decides which periods are completed.
+
+    Every time falls into a period identified by its key, the date of the
+    period's first day. Periods are `length_days` long and aligned to
+    PERIOD_EPOCH, so weekly periods start on Mondays. A period is completed
+    once it holds `quota` completions.
+
+    Attributes:
+        name (str): Periodicity as stored on the habit
+        length_days (int): Length of one period in days
+        quota (int): Completions needed to complete a period
+    """
+    name: str
+    length_days: int
+    quota: int = 1
+
+    @property
+    def length(self) -> timedelta:
+        """timedelta: Length of one period."""
+        return timedelta(days=self.length_days)
+
+    @property
+    def grace_days(self) -> int:
+        """int: Days a streak survives after the last completion of its latest period."""
+        return self.length_days
+
+    def period_key(self, moment) -> date:
+        """
+        Get the key of the period containing a date or time.
+
+        Args:
+            moment (date | datetime): A date, a naive UTC datetime or a timezone-aware datetime
+
+        Returns:
+            date: First day of the period
+        """
+        if isinstance(moment, datetime):
+            if moment.tzinfo is not None:
+                moment = moment.astimezone(UTC)
+            moment = moment.date()
+        if self.length_days == 1:
+            return moment
+        return moment - timedelta(days=(moment - PERIOD_EPOCH).days % self.length_days)
+
+    def completed_periods(self, completion_dates: Iterable[date]) -> List[Tuple[date, date]]:
+        """
+        Group completion dates into periods and keep the completed ones.
+
+        Args:
+            completion_dates (Iterable[date]): One date per completion, sorted by period
+
+        Returns:
+            list: (period key, date of the period's last completion) of every completed period, oldest first
+        """
+        length = self.length
+        quota = self.quota
+        completed = []
+        key = key_end = last_date = None
+        count = 0
+        for day in completion_dates:
+            # The key is only calculated when a date leaves the current period
+            if key_end is None or not key <= day < key_end:
+                key = self.period_key(day)
+                key_end = key + length
+                count, last_date = 1, day
+            else:
+                count += 1
+                if day > last_date:
+                    last_date = day
+            if count == quota:
+                completed.append((key, last_date))
+            elif count > quota:
+                completed[-1] = (key, last_date)
+        return completed
+
+    def merge_runs(self, completed: List[Tuple[date, date]], archived_runs: Iterable = ()) -> list:
+        """
+        Combine completed periods and archived runs into runs of consecutive periods.
+
+        Args:
+            completed (list): Completed periods as returned by completed_periods
+            archived_runs (Iterable): (start, end) period keys of archived runs, oldest first
+
+        Returns:
+            list: (start, end) period keys of each run, oldest first
+        """
+        recent = [(key, key) for key, _ in completed]
+        archived_runs = list(archived_runs)
+        return merge_period_runs(heapq.merge(archived_runs, recent) if archived_runs else recent, self.length)
+
+    def run_streaks(self, runs: list, last_completion_date: Optional[date] = None,
+                    at_date: Optional[date] = None) -> Tuple[int, int]:
+        """
+        Calculate the current and maximum streak from runs of consecutive periods.
+
+        Args:
+            runs (list): (start, end) period keys, oldest first
+            last_completion_date (date, optional): Date of the last completion of the latest run
+            at_date (date, optional): Date the current streak is calculated for.
+                                      The current streak is 0 if either date is missing
+
+        Returns:
+            tuple: (current_streak, max_streak)
+        """
+        if not runs:
+            return 0, 0
+
+        period_days = self.length_days
+        lengths = [(end - start).days // period_days + 1 for start, end in runs]
+
+        # The current streak is the latest run, unless too much time has passed since
+        current_streak = 0
+        if last_completion_date is not None and at_date is not None:
+            if (at_date - last_completion_date).days <= self.grace_days:
+                current_streak = lengths[-1]
+        return current_streak, max(lengths)
+
+    def next_due(self, latest_completed: Optional[date], at_date: date) -> date:
+        """
+        Get the deadline for the next completion that keeps the streak going.
+
+        Args:
+            latest_completed (date, optional): Key of the latest completed period
+            at_date (date): Current date
+
+        Returns:
+            date: First day after the earliest period, from the one containing
+                  at_date on, that isn't completed yet
+        """
+        current = self.period_key(at_date)
+        if latest_completed is not None and latest_completed >= current:
+            return latest_completed + 2 * self.length
+        return current + self.length
+
+    def summarize(self, completion_dates: Iterable[date], archived_runs: Iterable = (),
+                  at_date: Optional[date] = None) -> PeriodSummary:
+        """
+        Calculate the streaks and next deadline of a completion history.
+
+        Works in a single pass over the completions plus the archived runs.
+        The current streak is measured from the last completion of the
+        latest completed period, or from the start of the last archived
+        period when no completed period is left.
+
+        Args:
+            completion_dates (Iterable[date]): One date per completion, sorted by period
+            archived_runs (Iterable): (start, end) period keys of archived runs, oldest first
+            at_date (date, optional): Date the current streak and deadline are calculated for
+
+        Returns:
+            PeriodSummary: Current and maximum streak and the next deadline
+        """
+        completed = self.completed_periods(completion_dates)
+        runs = self.merge_runs(completed, archived_runs)
+        if completed:
+            last_completion_date = completed[-1][1]
+        else:
+            last_completion_date = runs[-1][1] if runs else None
+        current_streak, max_streak = self.run_streaks(runs, last_completion_date, at_date)
+        next_due = None
+        if at_date is not None:
+            next_due = self.next_due(runs[-1][1] if runs else None, at_date)
+        return PeriodSummary(current_streak, max_streak, next_due)
+
+    def streaks(self, completion_dates: Iterable[date], archived_runs: Iterable = (),
+                at_date: Optional[date] = None) -> Tuple[int, int]:
+        """
+        Calculate the current and maximum streak of a completion history.
+
+        Args:
+            completion_dates (Iterable[date]): One date per completion, sorted by period
+            archived_runs (Iterable): (start, end) period keys of archived runs, oldest first
+            at_date (date, optional): Date the current streak is calculated for
+
+        Returns:
+            tuple: (current_streak, max_streak)
+        """
+        current_streak, max_streak, _ = self.summarize(completion_dates, archived_runs, at_date)
+        return current_streak, max_streak
+
+
+DAILY = PeriodRule('daily', 1)
+WEEKLY = PeriodRule('weekly', 7)
+
+
+@lru_cache(maxsize=None)
+def get_period_rule(periodicity: str) -> PeriodRule:
+    """
+    Parse a periodicity into its period rule.
+
+    Supported are 'daily', 'weekly', 'every N days' and 'X times per week'
+    (case and spacing are ignored). The rule's name is the canonical
+    spelling, which is what habits store.
+
+    Args:
+        periodicity (str): Periodicity to parse
+
+    Returns:
+        PeriodRule: The rule of the periodicity
+
+    Raises:
+        ValueError: If the periodicity is not supported
+    """
+    if not isinstance(periodicity, str):
+        raise ValueError(f"Periodicity must be one of: {PERIODICITY_FORMATS}")
+    normalized = " ".join(periodicity.lower().split())
+    if normalized == DAILY.name:
+        return DAILY
+    if normalized == WEEKLY.name:
+        return WEEKLY
+
+    match = _EVERY_N_DAYS.match(normalized)
+    if match:
+        days = int(match.group(1))
+        if days < 1:
+            raise ValueError("A period must be at least 1 day long")
+        if days in (DAILY.length_days, WEEKLY.length_days):
+            return DAILY if days == DAILY.length_days else WEEKLY
+        return PeriodRule(f"every {days} days", days)
+
+    match = _TIMES_PER_WEEK.match(normalized)
+    if match:
+        times = int(match.group(1))
+        if not 1 <= times <= 7:
+            raise ValueError("A habit can be completed 1 to 7 times per week")
+        return WEEKLY if times == 1 else PeriodRule(f"{times} times per week", 7, times)
+
+    raise ValueError(f"Periodicity must be one of: {PERIODICITY_FORMATS}")
+
+
+def merge_period_runs(segments, period_length):
+    """
+    Merge period segments into runs of consecutive periods.
+
+    Args:
+        segments (iterable): (start, end) date tuples sorted by start
+        period_length (timedelta): Length of one period
+
+    Returns:
+        list: Merged (start, end) tuples, oldest first
+    """
+    runs = []
+    run_start = run_end = None
+    for start, end in segments:
+        if run_end is not None and start <= run_end + period_length:
+            if end > run_end:
+                run_end = end
+        else:
+            if run_end is not None:
+                runs.append((run_start, run_end))
+            run_start, run_end = start, end
+    if run_end is not None:
+        runs.append((run_start, run_end))
+    return runs
@@ -0,0 +1,329 @@
+from dataclasses import dataclass
+from datetime import datetime, UTC
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+from models import Habit, Goal, Tag, habit_tags, normalize_tag_name
+
+
+@dataclass(frozen=True, slots=True)
+class HabitSummary:
+    """
+    Read-only snapshot of the habit columns used by analytics and display.
+
+    Loaded with a column-only query, so no ORM state, identity map entry or
+    relationship collections are created for it.
+
+    Attributes:
+        id (int): Primary key of the habit
+        name (str): Name of the habit
+        description (str): Optional description of the habit
+        periodicity (str): Frequency of the habit ('daily' or 'weekly')
+        created_at (datetime): When the habit was created
+        current_streak (int): Stored current streak
+        max_streak (int): Stored highest streak
+        last_completed_at (datetime): Time of the most recent completion
+    """
+    id: int
+    name: str
+    description: Optional[str]
+    periodicity: str
+    created_at: Optional[datetime]
+    current_streak: int
+    max_streak: int
+    last_completed_at: Optional[datetime]
+
+
+class GoalProgress(NamedTuple):
+    """
+    Read-only goal row with its stored progress.
+
+    Attributes:
+        id (int): Primary key of the goal
+        habit_id (int): Foreign key to associated habit
+        kind (str): 'completions' or 'streak'
+        target (int): Value to reach
+        progress (int): Current value
+        achieved_at (datetime): When the target was reached, None while it isn't
+    """
+    id: int
+    habit_id: int
+    kind: str
+    target: int
+    progress: int
+    achieved_at: Optional[datetime]
+
+
+HABIT_SUMMARY_COLUMNS = (
+    Habit.id,
+    Habit.name,
+    Habit.description,
+    Habit.periodicity,
+    Habit.created_at,
+    Habit.current_streak,
+    Habit.max_streak,
+    Habit.last_completed_at,
+)
+
+
+def filter_by_tag(query, tag: str):
+    """
+    Restrict a query over habits to the habits with a tag.
+
+    Joins through the (tag_id, habit_id) index of the association table, so
+    only the tagged habits are read.
+
+    Args:
+        query (Select): Query selecting from habits
+        tag (str): Tag name, normalized before matching
+
+    Returns:
+        Select: The filtered query
+    """
+    return (
+        query.join(habit_tags, habit_tags.c.habit_id == Habit.id)
+        .join(Tag, Tag.id == habit_tags.c.tag_id)
+        .where(Tag.name == normalize_tag_name(tag))
+    )
+
+
+def load_habit_summaries(session: Session, periodicity: str = None,
+                         habit_id: int = None, tag: str = None) -> List[HabitSummary]:
+    """
+    Load the summaries of active (not deleted) habits ordered by id.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        periodicity (str, optional): Only load habits with this periodicity
+        habit_id (int, optional): Only load the habit with this id
+        tag (str, optional): Only load habits with this tag
+
+    Returns:
+        List[HabitSummary]: Summaries of the matching habits
+    """
+    query = select(*HABIT_SUMMARY_COLUMNS).where(Habit.deleted_at.is_(None)).order_by(Habit.id)
+    if periodicity is not None:
+        query = query.where(Habit.periodicity == periodicity)
+    if habit_id is not None:
+        query = query.where(Habit.id == habit_id)
+    if tag is not None:
+        query = filter_by_tag(query, tag)
+    return [HabitSummary(*row) for row in session.execute(query)]
+
+
+HABIT_SORT_COLUMNS = {
+    'id': Habit.id,
+    'name': Habit.name,
+    'current_streak': Habit.current_streak,
+    'max_streak': Habit.max_streak,
+}
+
+
+def iter_habit_summary_pages(session: Session, page_size: int = 50, periodicity: str = None,
+                             sort: str = 'id', descending: bool = False,
+                             tag: str = None) -> Iterator[List[HabitSummary]]:
+    """
+    Stream the summaries of active habits page by page using keyset pagination.
+
+    Each page is fetched with a query that continues after the (sort value, id)
+    of the previous page's last row instead of using OFFSET, so every page
+    costs the same no matter how deep into the result it is.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        page_size (int): Number of habits per page
+        periodicity (str, optional): Only load habits with this periodicity
+        sort (str): Column to sort by, one of HABIT_SORT_COLUMNS
+        descending (bool): If True, sorts in descending order
+        tag (str, optional): Only load habits with this tag
+
+    Yields:
+        List[HabitSummary]: One page of summaries; the last page may be shorter
+
+    Raises:
+        ValueError: If sort is not supported or page_size is not positive
+    """
+    if sort not in HABIT_SORT_COLUMNS:
+        raise ValueError(f"Sort must be one of: {', '.join(HABIT_SORT_COLUMNS)}")
+    if page_size < 1:
+        raise ValueError("page_size must be at least 1")
+
+    sort_column = HABIT_SORT_COLUMNS[sort]
+    keys = (sort_column, Habit.id) if sort != 'id' else (Habit.id,)
+    query = select(*HABIT_SUMMARY_COLUMNS).where(Habit.deleted_at.is_(None))
+    if periodicity is not None:
+        query = query.where(Habit.periodicity == periodicity)
+    if tag is not None:
+        query = filter_by_tag(query, tag)
+    query = query.order_by(*(key.desc() if descending else key for key in keys)).limit(page_size)
+
+    last_key = None
+    while True:
+        page_query = query
+        if last_key is not None:
+            position = tuple_(*keys)
+            page_query = query.where(position < tuple_(*last_key) if descending else position > tuple_(*last_key))
+        page = [HabitSummary(*row) for row in session.execute(page_query)]
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+        last_key = (getattr(last, sort), last.id) if sort != 'id' else (last.id,)
+
+
+def load_goal_progress(session: Session, habit_ids: Iterable[int] = None,
+                       achieved: Optional[bool] = None) -> Dict[int, List[GoalProgress]]:
+    """
+    Load the goals of active habits with their stored progress, grouped by habit.
+
+    Progress is read from the goal counters, so the cost depends on the
+    number of goals only, not on the completions behind them.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        habit_ids (Iterable[int], optional): Only load the goals of these habits
+        achieved (bool, optional): Only load achieved (True) or open (False) goals
+
+    Returns:
+        Dict[int, List[GoalProgress]]: Goals ordered by id, keyed by habit id
+    """
+    query = (
+        select(Goal.id, Goal.habit_id, Goal.kind, Goal.target, Goal.progress, Goal.achieved_at)
+        .join(Habit, Habit.id == Goal.habit_id)
+        .where(Habit.deleted_at.is_(None))
+        .order_by(Goal.id)
+    )
+    if habit_ids is not None:
+        query = query.where(Goal.habit_id.in_(list(habit_ids)))
+    if achieved is not None:
+        query = query.where(Goal.achieved_at.isnot(None) if achieved else Goal.achieved_at.is_(None))
+    goals = {}
+    for row in session.execute(query):
+        goals.setdefault(row.habit_id, []).append(GoalProgress(*row))
+    return goals
+
+
+class SummaryCache:
+    """
+    Summaries and goals of all active habits kept in memory for a long-lived
+    session, such as the one of the interactive shell.
+
+    They are loaded on first use and served from memory until they are stale:
+    after invalidate() (called by the owner after its own commits), after
+    another connection committed to the database, or on a new UTC day, when
+    stored streaks may have lapsed. Commits of other connections are noticed
+    through PRAGMA data_version, which SQLite answers without reading any
+    table, so checking costs no query of the habits.
+
+    Args:
+        session (Session): Session bound to one connection for the lifetime of the cache
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+        self._version = None
+        self._loaded_on = None
+        self._summaries = []
+        self._by_id = {}
+        self._by_name = {}
+        self._goals = {}
+
+    def _data_version(self) -> int:
+        """Get the data version of the session's connection, which changes on commits of other connections."""
+        return self.session.connection().exec_driver_sql("PRAGMA data_version").scalar()
+
+    def invalidate(self):
+        """Reload the summaries on next use, e.g. after the owner committed a change."""
+        self._loaded_on = None
+
+    def is_stale(self) -> bool:
+        """
+        Check whether the cached summaries have to be reloaded.
+
+        Returns:
+            bool: True if nothing is loaded yet, the cache was invalidated, the
+                  database changed or the day changed since loading
+        """
+        return (
+            self._loaded_on != datetime.now(UTC).date()
+            or self._version != self._data_version()
+        )
+
+    def _load(self):
+        """Load the summaries and goals of all active habits."""
+        # Read the version first, so a commit made while loading triggers another load
+        self._version = self._data_version()
+        self._loaded_on = datetime.now(UTC).date()
+        self._summaries = load_habit_summaries(self.session)
+        self._by_id = {habit.id: habit for habit in self._summaries}
+        self._by_name = {}
+        for habit in self._summaries:
+            self._by_name.setdefault(habit.name.casefold(), []).append(habit)
+        self._goals = load_goal_progress(self.session)
+
+    def summaries(self, periodicity: str = None) -> List[HabitSummary]:
+        """
+        Get the summaries of the active habits ordered by id, reloading them if stale.
+
+        Args:
+            periodicity (str, optional): Only return habits with this periodicity
+
+        Returns:
+            List[HabitSummary]: Summaries of the matching habits
+        """
+        if self.is_stale():
+            self._load()
+        if periodicity is None:
+            return self._summaries
+        return [habit for habit in self._summaries if habit.periodicity == periodicity]
+
+    def goals(self, habit_id: int) -> List[GoalProgress]:
+        """
+        Get the goals of an active habit.
+
+        Args:
+            habit_id (int): ID of the habit
+
+        Returns:
+            List[GoalProgress]: Goals of the habit ordered by id
+        """
+        if self.is_stale():
+            self._load()
+        return self._goals.get(habit_id, [])
+
+    def get(self, habit_id: int) -> Optional[HabitSummary]:
+        """
+        Get the summary of an active habit by id.
+
+        Args:
+            habit_id (int): ID of the habit
+
+        Returns:
+            HabitSummary: The summary, or None if the habit doesn't exist or is deleted
+        """
+        self.summaries()
+        return self._by_id.get(habit_id)
+
+    def find(self, name: str) -> List[HabitSummary]:
+        """
+        Get the active habits with a name, ignoring case.
+
+        Args:
+            name (str): Name of the habit
+
+        Returns:
+            List[HabitSummary]: Habits with that name ordered by id
+        """
+        self.summaries()
+        return self._by_name.get(name.casefold(), [])
+
+    def names(self) -> List[str]:
+        """
+        Get the names of the active habits, e.g. for completion in the shell.
+
+        Returns:
+            List[str]: Names ordered by habit id
+        """
+        return [habit.name for habit in self.summaries()]
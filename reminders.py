@@ -0,0 +1,264 @@
+import json
+import threading
+from abc import ABC, abstractmethod
+import urllib.error
+import urllib.request
+from datetime import datetime, time, timedelta, UTC
+from typing import Callable, List, NamedTuple, Optional, Sequence
+from rich import print
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from models import Habit, due_datetime
+from periods import get_period_rule
+
+REMINDER_LOG_FILE = "reminders.jsonl"
+
+
+class Reminder(NamedTuple):
+    """
+    A habit whose current period has no completion yet.
+
+    Attributes:
+        habit_id (int): ID of the habit
+        name (str): Name of the habit
+        periodicity (str): Periodicity of the habit
+        due_at (datetime): UTC-aware end of the period, when the streak breaks
+        current_streak (int): Streak at stake
+    """
+    habit_id: int
+    name: str
+    periodicity: str
+    due_at: datetime
+    current_streak: int
+
+    def to_dict(self) -> dict:
+        """Return the reminder as a JSON-serializable dict."""
+        return {**self._asdict(), "due_at": self.due_at.isoformat()}
+
+
+def find_due_habits(session: Session, at_time: datetime = None,
+                    within: timedelta = timedelta(hours=24)) -> List[Reminder]:
+    """
+    Find the active habits whose current period ends within a time window without being completed.
+
+    Habits keep the end of their earliest uncompleted period in the indexed
+    next_due_at column, so this is a single range query over the habits
+    that are due, however many habits there are. Deadlines that already
+    passed belong to missed periods; they are moved on to the end of the
+    current period and written back with one bulk UPDATE, and the streak
+    they report is 0.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        at_time (datetime, optional): Reference time. Defaults to current UTC time
+        within (timedelta): Only habits due before at_time + within are returned
+
+    Returns:
+        List[Reminder]: Due habits, earliest deadline first
+    """
+    if at_time is None:
+        at_time = datetime.now(UTC)
+    elif at_time.tzinfo is None:
+        raise ValueError("at_time must be timezone-aware")
+    now = at_time.astimezone(UTC)
+    horizon = now + within
+
+    rows = session.execute(
+        select(Habit.id, Habit.name, Habit.periodicity, Habit.next_due_at, Habit.current_streak)
+        .where(Habit.deleted_at.is_(None), Habit.next_due_at <= horizon.replace(tzinfo=None))
+        .order_by(Habit.next_due_at, Habit.id)
+    ).all()
+
+    reminders = []
+    missed = []
+    for habit_id, name, periodicity, next_due_at, current_streak in rows:
+        due_at = next_due_at.replace(tzinfo=UTC)
+        if due_at <= now:
+            due_at = due_datetime(get_period_rule(periodicity).next_due(None, now.date()))
+            missed.append({'id': habit_id, 'next_due_at': due_at})
+            current_streak = 0
+            if due_at > horizon:
+                continue
+        reminders.append(Reminder(habit_id, name, periodicity, due_at, current_streak))
+
+    if missed:
+        session.execute(update(Habit), missed)
+        session.commit()
+        reminders.sort(key=lambda reminder: (reminder.due_at, reminder.habit_id))
+    return reminders
+
+
+class ReminderSink(ABC):
+    """Receives the reminders of each scheduler tick. Subclasses implement send."""
+
+    @abstractmethod
+    def send(self, reminders: List[Reminder]):
+        """
+        Deliver the reminders of one tick.
+
+        Args:
+            reminders (List[Reminder]): Due habits, may be empty
+        """
+
+    def close(self):
+        """Release resources held by the sink."""
+
+
+class StdoutSink(ReminderSink):
+    """Prints one line per reminder."""
+
+    def send(self, reminders):
+        for reminder in reminders:
+            streak = f" to keep your streak of {reminder.current_streak}" if reminder.current_streak else ""
+            print(f"[yellow]Reminder:[/yellow] complete '{reminder.name}' ({reminder.periodicity}) "
+                  f"before {reminder.due_at:%Y-%m-%d %H:%M} UTC{streak}")
+
+
+class FileSink(ReminderSink):
+    """
+    Appends one JSON line per reminder to a file.
+
+    Args:
+        path (str): File to append to, created if missing
+    """
+
+    def __init__(self, path=REMINDER_LOG_FILE):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def send(self, reminders):
+        for reminder in reminders:
+            self._file.write(json.dumps(reminder.to_dict()) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class WebhookSink(ReminderSink):
+    """
+    Posts the reminders as JSON to an HTTP endpoint, e.g. a local notification service.
+
+    Each tick is sent as `{"reminders": [...]}` in requests of up to
+    `batch_size` reminders. A failed request is reported and counted but
+    doesn't stop the scheduler.
+
+    Args:
+        url (str): Endpoint receiving the POST requests
+        timeout (float): Seconds to wait for each request
+        batch_size (int): Reminders per request
+    """
+
+    def __init__(self, url, timeout=5.0, batch_size=1000):
+        self.url = url
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.failures = 0
+        self.last_error: Optional[Exception] = None
+
+    def send(self, reminders):
+        for start in range(0, len(reminders), self.batch_size):
+            body = json.dumps({"reminders": [r.to_dict() for r in reminders[start:start + self.batch_size]]})
+            request = urllib.request.Request(
+                self.url, data=body.encode(), headers={"Content-Type": "application/json"}, method="POST"
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+            except (urllib.error.URLError, OSError) as error:
+                self.failures += 1
+                self.last_error = error
+                print(f"[red]Could not deliver reminders to {self.url}: {error}[/red]")
+
+
+def parse_times(values: Sequence[str]) -> List[time]:
+    """
+    Parse times of day in HH:MM format.
+
+    Args:
+        values (Sequence[str]): Times such as "09:00" or "20:30"
+
+    Returns:
+        List[time]: The parsed times, sorted
+
+    Raises:
+        ValueError: If a value is not a valid time
+    """
+    times = []
+    for value in values:
+        try:
+            times.append(datetime.strptime(value, "%H:%M").time())
+        except ValueError:
+            raise ValueError(f"Invalid time '{value}', expected HH:MM") from None
+    return sorted(times)
+
+
+def next_run(now: datetime, times: Sequence[time]) -> datetime:
+    """
+    Get the next UTC time after `now` at one of the given times of day.
+
+    Args:
+        now (datetime): Timezone-aware current time
+        times (Sequence[time]): Times of day in UTC, sorted
+
+    Returns:
+        datetime: The next run time
+
+    Raises:
+        ValueError: If no times are given
+    """
+    now = now.astimezone(UTC)
+    for days in (0, 1):
+        day = now.date() + timedelta(days=days)
+        for time_of_day in times:
+            candidate = datetime.combine(day, time_of_day, tzinfo=UTC)
+            if candidate > now:
+                return candidate
+    raise ValueError("At least one time is required")
+
+
+def send_reminders(session_factory: Callable[[], Session], sink: ReminderSink, at_time: datetime = None,
+                   within: timedelta = timedelta(hours=24)) -> int:
+    """
+    Run one scheduler tick: find the due habits and hand them to the sink.
+
+    Args:
+        session_factory (Callable): Returns a new SQLAlchemy session
+        sink (ReminderSink): Receives the reminders
+        at_time (datetime, optional): Reference time. Defaults to current UTC time
+        within (timedelta): Window of the deadlines to remind of
+
+    Returns:
+        int: Number of reminders sent
+    """
+    session = session_factory()
+    try:
+        reminders = find_due_habits(session, at_time, within)
+    finally:
+        session.close()
+    sink.send(reminders)
+    return len(reminders)
+
+
+def run_scheduler(session_factory: Callable[[], Session], sink: ReminderSink, times: Sequence[time],
+                  within: timedelta = timedelta(hours=24), stop: Optional[threading.Event] = None,
+                  on_tick: Optional[Callable[[datetime, int], None]] = None):
+    """
+    Send reminders every day at the given times until `stop` is set.
+
+    Args:
+        session_factory (Callable): Returns a new SQLAlchemy session
+        sink (ReminderSink): Receives the reminders
+        times (Sequence[time]): Times of day in UTC to run at, sorted
+        within (timedelta): Window of the deadlines to remind of
+        stop (threading.Event, optional): Ends the loop when set
+        on_tick (Callable, optional): Called with the run time and number of reminders after each tick
+    """
+    stop = stop or threading.Event()
+    while True:
+        run_at = next_run(datetime.now(UTC), times)
+        if stop.wait(max(0.0, (run_at - datetime.now(UTC)).total_seconds())):
+            return
+        sent = send_reminders(session_factory, sink, run_at, within)
+        if on_tick:
+            on_tick(run_at, sent)
@@ -0,0 +1,216 @@
+from difflib import SequenceMatcher
+from typing import List, NamedTuple
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from models import Habit, get_active_habit
+
+# Names of active habits, kept in sync with the habits table by the triggers below. The trigram
+# tokenizer makes MATCH find any substring of three or more characters, ignoring case.
+SEARCH_TABLE = "habit_search"
+SEARCH_SCHEMA = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(name, tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert AFTER INSERT ON habits "
+    f"WHEN new.deleted_at IS NULL BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, name) VALUES (new.id, new.name); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update AFTER UPDATE OF name, deleted_at ON habits BEGIN "
+    f"DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id; "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, name) SELECT new.id, new.name WHERE new.deleted_at IS NULL; END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON habits BEGIN "
+    f"DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id; END",
+]
+
+MATCH_EXACT = 'exact'
+MATCH_PREFIX = 'prefix'
+MATCH_SUBSTRING = 'substring'
+MATCH_FUZZY = 'fuzzy'
+MATCH_KINDS = (MATCH_EXACT, MATCH_PREFIX, MATCH_SUBSTRING, MATCH_FUZZY)
+
+# Candidates read from the search table per lookup, and the similarity fuzzy matches need
+MAX_CANDIDATES = 50
+FUZZY_CUTOFF = 0.6
+
+
+class HabitMatch(NamedTuple):
+    """
+    Habit found by a name lookup.
+
+    Attributes:
+        id (int): Primary key of the habit
+        name (str): Name of the habit
+        kind (str): How the name matched, one of MATCH_KINDS from best to worst
+        score (float): Similarity of the name to the searched text, from 0 to 1
+    """
+    id: int
+    name: str
+    kind: str
+    score: float
+
+
+def create_search_index(conn) -> bool:
+    """
+    Create the habit name search table and its triggers, filling it if it is new.
+
+    Args:
+        conn (Connection): SQLAlchemy connection inside a transaction
+
+    Returns:
+        bool: True if the table was created, False if it existed or SQLite lacks FTS5
+    """
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": SEARCH_TABLE}
+    ).scalar()
+    try:
+        for statement in SEARCH_SCHEMA:
+            conn.exec_driver_sql(statement)
+    except OperationalError:
+        # SQLite builds without FTS5: lookups fall back to scanning the habit names
+        return False
+    if exists:
+        return False
+    conn.exec_driver_sql(
+        f"INSERT INTO {SEARCH_TABLE}(rowid, name) SELECT id, name FROM habits WHERE deleted_at IS NULL"
+    )
+    return True
+
+
+def _quote(term: str) -> str:
+    """Quote a term as an FTS5 string, so its characters aren't read as query syntax."""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _candidates(session: Session, query: str) -> List[tuple]:
+    """
+    Read the (id, name) pairs of active habits that may match a search text.
+
+    Texts of three or more characters are looked up as substrings, exact
+    names and prefixes first so no name is cut off that could make a match
+    ambiguous. If no name contains the text, names sharing its trigrams are
+    read, which finds names with typos. Shorter texts can only be matched as
+    a prefix of the name, which the (deleted_at, name) index of the habits
+    table answers as a range of names, the exact name first.
+    """
+    if len(query) < 3:
+        return session.execute(text(
+            "SELECT id, name FROM habits WHERE deleted_at IS NULL "
+            "AND name >= :name COLLATE NOCASE AND name < :next_name COLLATE NOCASE "
+            "ORDER BY name COLLATE NOCASE LIMIT :limit"
+        ), {"name": query, "next_name": query[:-1] + chr(ord(query[-1]) + 1), "limit": MAX_CANDIDATES}).all()
+    prefix = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    parameters = {"name": query, "prefix": prefix, "limit": MAX_CANDIDATES}
+    match = text(
+        f"SELECT rowid, name FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match "
+        f"ORDER BY name = :name COLLATE NOCASE DESC, name LIKE :prefix ESCAPE '\\' DESC, rank LIMIT :limit"
+    )
+    rows = session.execute(match, {**parameters, "match": _quote(query)}).all()
+    if rows:
+        return rows
+    trigrams = dict.fromkeys(query[i:i + 3] for i in range(len(query) - 2))
+    parameters["match"] = " OR ".join(_quote(trigram) for trigram in trigrams)
+    return session.execute(match, parameters).all()
+
+
+def _scan_candidates(session: Session) -> List[tuple]:
+    """Read the (id, name) pairs of all active habits, for databases without the search table."""
+    return session.execute(
+        text("SELECT id, name FROM habits WHERE deleted_at IS NULL ORDER BY id")
+    ).all()
+
+
+def find_habits(session: Session, query: str, limit: int = 5) -> List[HabitMatch]:
+    """
+    Find active habits by name, prefix, part of the name or a misspelled name.
+
+    Candidates are read from the habit_search table, so the cost depends on
+    the number of matching names, not on the number of habits.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        query (str): Text to search for, ignoring case and surrounding spaces
+        limit (int): Maximum number of matches to return
+
+    Returns:
+        List[HabitMatch]: Best matches first: exact names, then names starting with the
+                          text, containing it, and names similar to it
+    """
+    query = " ".join(query.split()).casefold()
+    if not query:
+        return []
+    try:
+        candidates = _candidates(session, query)
+    except OperationalError:
+        candidates = _scan_candidates(session)
+
+    matches = []
+    for habit_id, name in candidates:
+        folded = name.casefold()
+        score = SequenceMatcher(None, query, folded).ratio()
+        if folded == query:
+            kind = MATCH_EXACT
+        elif folded.startswith(query):
+            kind = MATCH_PREFIX
+        elif query in folded:
+            kind = MATCH_SUBSTRING
+        elif score >= FUZZY_CUTOFF:
+            kind = MATCH_FUZZY
+        else:
+            continue
+        matches.append(HabitMatch(habit_id, name, kind, score))
+    matches.sort(key=lambda match: (MATCH_KINDS.index(match.kind), -match.score, match.id))
+    return matches[:limit]
+
+
+def _describe(matches: List[HabitMatch]) -> str:
+    """Format matches as e.g. "'Morning run' (ID 1), 'Morning pages' (ID 2)"."""
+    return ", ".join(f"'{match.name}' (ID {match.id})" for match in matches)
+
+
+def pick_habit(query: str, matches: List[HabitMatch]) -> HabitMatch:
+    """
+    Choose the habit a search text refers to.
+
+    A match is only chosen if it is the single best one of its kind.
+    Misspelled names are never chosen, but suggested in the error.
+
+    Args:
+        query (str): The searched text
+        matches (List[HabitMatch]): Matches found by find_habits
+
+    Returns:
+        HabitMatch: The chosen habit
+
+    Raises:
+        ValueError: If no habit, several habits or only misspelled names match
+    """
+    if not matches:
+        raise ValueError(f"Habit '{query}' not found.")
+    best = [match for match in matches if match.kind == matches[0].kind]
+    if best[0].kind == MATCH_FUZZY:
+        raise ValueError(f"Habit '{query}' not found. Did you mean {_describe(best)}?")
+    if len(best) > 1:
+        raise ValueError(f"'{query}' matches several habits: {_describe(best)}. Use the ID or the full name.")
+    return best[0]
+
+
+def resolve_habit(session: Session, value: str) -> Habit:
+    """
+    Get the active habit given on the command line by ID or name.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        value (str): ID, name, unique prefix or unique part of the name of the habit
+
+    Returns:
+        Habit: The habit
+
+    Raises:
+        ValueError: If no single active habit matches
+    """
+    value = value.strip()
+    if not value:
+        raise ValueError("Name or ID of a habit is required.")
+    if value.isdigit():
+        habit = get_active_habit(session, int(value))
+        if habit is not None:
+            return habit
+    return session.get(Habit, pick_habit(value, find_habits(session, value)).id)
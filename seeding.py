@@ -0,0 +1,276 @@
+import random
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta, UTC
+from typing import Callable, List, Optional, Sequence, Tuple
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+from models import Habit, Completion, completion_kind, due_datetime
+from periods import get_period_rule
+
+# A pattern receives the period index (0 = current period, 1 = the one before, ...)
+# and the seeded random generator, and returns the number of completions in that period
+Pattern = Callable[[int, random.Random], int]
+
+
+@dataclass(frozen=True)
+class HabitSpec:
+    """
+    Describes a habit to seed and how its completion history looks.
+
+    Attributes:
+        name (str): Name of the habit
+        description (str): Description of the habit
+        periodicity (str): Periodicity with one completion per period, e.g. 'daily', 'weekly' or 'every 3 days'
+        pattern (Pattern): Number of completions per period index
+        times_of_day (tuple): Completion times used for the 1st, 2nd, ... completion of a period
+    """
+    name: str
+    description: str
+    periodicity: str
+    pattern: Pattern
+    times_of_day: Tuple[time, ...] = (time(0, 0),)
+
+
+@dataclass(frozen=True)
+class SeedResult:
+    """
+    Summary of a seeding run.
+
+    Attributes:
+        habits (int): Number of habits created
+        completions (int): Number of completions created
+    """
+    habits: int
+    completions: int
+
+
+def every_period() -> Pattern:
+    """Complete every period."""
+    return lambda index, rng: 1
+
+
+def skipping(skipped: Sequence[int]) -> Pattern:
+    """Complete every period except the given period indexes."""
+    skipped = frozenset(skipped)
+    return lambda index, rng: 0 if index in skipped else 1
+
+
+def skipping_multiples(*divisors: int) -> Pattern:
+    """Skip every period whose index is a multiple of one of the divisors."""
+    return lambda index, rng: 0 if any(index % divisor == 0 for divisor in divisors) else 1
+
+
+def with_probability(probability: float) -> Pattern:
+    """Complete each period with the given probability."""
+    return lambda index, rng: 1 if rng.random() < probability else 0
+
+
+def with_extra(pattern: Pattern, extra: Sequence[int]) -> Pattern:
+    """Add a second completion to the given period indexes of another pattern."""
+    extra = frozenset(extra)
+    return lambda index, rng: pattern(index, rng) + (1 if index in extra else 0)
+
+
+PREDEFINED_HABITS = [
+    # Consistent with an 8-day break in the middle
+    HabitSpec("Exercise", "30 minutes of exercise", "daily", skipping(range(10, 18))),
+    # Perfect streak for the whole history
+    HabitSpec("Read", "Read for 30 minutes", "daily", every_period()),
+    # Inconsistent with multiple breaks: skips every 3rd and 7th day
+    HabitSpec("Meditate", "Meditate for 10 minutes", "daily", skipping_multiples(3, 7)),
+    # Weekly, missed once, with two completions in the first and fifth week
+    HabitSpec(
+        "Clean kitchen", "Deep clean the kitchen", "weekly",
+        with_extra(skipping([2]), extra=[0, 4]),
+        times_of_day=(time(10, 0), time(15, 0)),
+    ),
+    # Very consistent with just a couple misses
+    HabitSpec("Walk dog", "Walk the dog for 30 minutes", "daily", skipping([7, 23, 30])),
+]
+
+
+def generate_habit_specs(count: int, rng: random.Random, weekly_share: float = 0.2) -> List[HabitSpec]:
+    """
+    Generate specs for load-test habits with random completion probabilities.
+
+    Args:
+        count (int): Number of habits
+        rng (random.Random): Seeded random generator
+        weekly_share (float): Fraction of weekly habits
+
+    Returns:
+        List[HabitSpec]: Generated habit specs
+    """
+    specs = []
+    for number in range(1, count + 1):
+        periodicity = "weekly" if rng.random() < weekly_share else "daily"
+        probability = round(rng.uniform(0.5, 0.98), 2)
+        specs.append(HabitSpec(
+            name=f"Habit {number}",
+            description=f"Generated {periodicity} habit completed {probability:.0%} of the time",
+            periodicity=periodicity,
+            pattern=with_probability(probability),
+        ))
+    return specs
+
+
+def _insert_statement(connection, table, columns):
+    """
+    Compile a positional INSERT statement for executemany on the DBAPI cursor.
+
+    Args:
+        connection (Connection): SQLAlchemy connection
+        table (Table): Target table
+        columns (Sequence[str]): Column names in the order of the row tuples
+
+    Returns:
+        str: SQL string with positional placeholders
+
+    Raises:
+        ValueError: If the columns are not in the table's column order
+    """
+    compiled = insert(table).compile(dialect=connection.dialect, column_keys=list(columns))
+    # Placeholders follow the table's column order, which the row tuples must match
+    if list(compiled.positiontup) != list(columns):
+        raise ValueError(f"Columns must be given in table order: {compiled.positiontup}")
+    return str(compiled)
+
+
+def _bind_processor(column, dialect):
+    """
+    Get the function converting Python values of a column to their database form.
+
+    Args:
+        column (Column): Table column
+        dialect (Dialect): Database dialect
+
+    Returns:
+        Callable: Conversion function
+    """
+    return column.type.dialect_impl(dialect).bind_processor(dialect) or (lambda value: value)
+
+
+def seed_habits(session: Session, specs: Sequence[HabitSpec], history_days: int = 30,
+                seed: int = 0, now: Optional[datetime] = None, batch_size: int = 10000) -> SeedResult:
+    """
+    Create habits with a generated completion history using bulk inserts.
+
+    Completions are generated period by period going back `history_days`
+    from today and written with core bulk inserts in batches of
+    `batch_size` rows. Values are converted to their database form once
+    per distinct day and time instead of once per row, and the streaks and
+    completion stats of every habit are computed once at the end from the
+    generated periods. The result only depends on the specs, `seed`,
+    `history_days` and the date of `now`.
+
+    Args:
+        session (Session): SQLAlchemy database session
+        specs (Sequence[HabitSpec]): Habits to create
+        history_days (int): Length of the generated history in days
+        seed (int): Seed of the random generator used by the patterns
+        now (datetime, optional): Reference time. Defaults to current UTC time
+        batch_size (int): Number of completions inserted per statement
+
+    Returns:
+        SeedResult: Number of habits and completions created
+
+    Raises:
+        ValueError: If a spec's periodicity needs several completions per period
+    """
+    for spec in specs:
+        if get_period_rule(spec.periodicity).quota > 1:
+            raise ValueError(f"Can't seed '{spec.periodicity}' habits, only one completion per period is generated")
+    if now is None:
+        now = datetime.now(UTC)
+    rng = random.Random(seed)
+    today = now.astimezone(UTC).date()
+    created_at = datetime.combine(today - timedelta(days=history_days), time(0, 0), tzinfo=UTC)
+    first_id = (session.query(func.max(Habit.id)).scalar() or 0) + 1
+
+    # Core statements on the session's connection skip ORM bookkeeping per row
+    connection = session.connection()
+    dialect = connection.dialect
+    to_date = _bind_processor(Completion.__table__.c.period_start, dialect)
+    to_datetime = _bind_processor(Completion.__table__.c.completed_at, dialect)
+    statement = _insert_statement(
+        connection, Completion.__table__, ('habit_id', 'kind', 'period_start', 'completed_at')
+    )
+    batch = []
+    calendars = {}
+
+    def calendar(periodicity, times_of_day):
+        """Periods by index with their completion times, converted once per periodicity and times."""
+        key = (periodicity, times_of_day)
+        if key not in calendars:
+            rule = get_period_rule(periodicity)
+            weekly_storage = completion_kind(periodicity) == 'weekly'
+            entries = []
+            for index in range((history_days + rule.length_days - 1) // rule.length_days):
+                day = today - timedelta(days=index * rule.length_days)
+                period = rule.period_key(day)
+                # Weekly completions store their week, daily completions their day
+                stored = period if weekly_storage else day
+                times = [datetime.combine(day, time_of_day, tzinfo=UTC) for time_of_day in times_of_day]
+                entries.append((period, to_date(stored), times, [to_datetime(t) for t in times]))
+            calendars[key] = entries
+        return calendars[key]
+
+    def flush():
+        if batch:
+            connection.exec_driver_sql(statement, batch)
+            batch.clear()
+
+    habits = []
+    completions = 0
+    for habit_id, spec in enumerate(specs, start=first_id):
+        entries = calendar(spec.periodicity, spec.times_of_day)
+        kind = completion_kind(spec.periodicity)
+        # At most one completion per day is stored outside of weekly habits
+        max_per_period = 1 if kind == 'daily' else len(spec.times_of_day)
+        runs = []  # (first, last) period index of each run of consecutive periods
+        last_completed = 0
+        count = 0
+        # Walk from the oldest period to the current one so runs come out sorted
+        for index in range(len(entries) - 1, -1, -1):
+            completed = min(spec.pattern(index, rng), max_per_period)
+            if completed <= 0:
+                continue
+            if runs and runs[-1][1] == index + 1:
+                runs[-1][1] = index
+            else:
+                runs.append([index, index])
+            period_value, time_values = entries[index][1], entries[index][3]
+            for time_value in time_values[:completed]:
+                batch.append((habit_id, kind, period_value, time_value))
+            last_completed = completed
+            count += completed
+            if len(batch) >= batch_size:
+                flush()
+        completions += count
+
+        last_completed_at = max(entries[runs[-1][1]][2][:last_completed]) if runs else None
+        rule = get_period_rule(spec.periodicity)
+        current_streak, max_streak = rule.run_streaks(
+            [(entries[first][0], entries[last][0]) for first, last in runs],
+            last_completed_at.date() if last_completed_at else None,
+            today,
+        )
+        next_due = rule.next_due(entries[runs[-1][1]][0] if runs else None, today)
+        habits.append({
+            'id': habit_id,
+            'name': spec.name,
+            'description': spec.description,
+            'periodicity': rule.name,
+            'created_at': created_at,
+            'current_streak': current_streak,
+            'max_streak': max_streak,
+            'last_completed_at': last_completed_at,
+            'completion_count': count,
+            'next_due_at': due_datetime(next_due),
+        })
+
+    flush()
+    for start in range(0, len(habits), batch_size):
+        connection.execute(insert(Habit.__table__), habits[start:start + batch_size])
+    session.commit()
+    return SeedResult(habits=len(habits), completions=completions)
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import re
+import threading
+from dataclasses import asdict
+from datetime import date, datetime, UTC
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.orm import sessionmaker
+from maintenance import refresh_stale_streaks
+from models import Habit, get_active_habit
+from readmodels import load_habit_summaries
+import analytics
+
+# Largest number of entries a ranking returns
+MAX_PAGE_SIZE = 100
+
+
+class HabitRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the habit JSON API.
+
+    Every request gets its own session from the server's session factory,
+    which draws connections from the shared engine pool.
+
+    Routes:
+        GET  /habits                      Summaries of all habits (supports ETag / If-None-Match)
+        GET  /habits/<id>                 Summary of one habit
+        POST /habits/<id>/complete        Record a completion (queued with 202 in write-behind mode)
+        GET  /habits/<id>/stats           Longest streak and days since last completion (from the
+                                          period index when it is enabled)
+        GET  /analytics/longest-streak    Longest streak across all habits
+        GET  /analytics/top               Ranking, see analytics.get_top_habits (limit 1 to MAX_PAGE_SIZE)
+
+    Invalid parameters are answered with 400, a locked or unavailable
+    database with 503 and other database errors with 500, each with a JSON
+    error message.
+
+    Streaks are served as stored, after the server has reset the lapsed ones
+    of the day, so bodies and ETags never carry a streak that has lapsed.
+    """
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; avoid delayed-ACK stalls on keep-alive connections
+    disable_nagle_algorithm = True
+
+    ROUTES = [
+        ("GET", re.compile(r"^/habits$"), "list_habits"),
+        ("GET", re.compile(r"^/habits/(\d+)$"), "get_habit"),
+        ("POST", re.compile(r"^/habits/(\d+)/complete$"), "complete_habit"),
+        ("GET", re.compile(r"^/habits/(\d+)/stats$"), "habit_stats"),
+        ("GET", re.compile(r"^/analytics/longest-streak$"), "longest_streak"),
+        ("GET", re.compile(r"^/analytics/top$"), "top_habits"),
+    ]
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _dispatch(self, method):
+        # No route reads a body; drain it so it isn't taken for the next request on the connection
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            return self._send_json({"error": "Invalid Content-Length"}, HTTPStatus.BAD_REQUEST)
+        if length:
+            self.rfile.read(length)
+        url = urlsplit(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        for route_method, pattern, handler_name in self.ROUTES:
+            match = pattern.match(url.path)
+            if match and route_method == method:
+                with self.server.session_factory() as session:
+                    try:
+                        self.server.refresh_streaks(session)
+                        getattr(self, handler_name)(session, *(int(group) for group in match.groups()))
+                    except ValueError as error:
+                        session.rollback()
+                        self._send_json({"error": str(error)}, HTTPStatus.BAD_REQUEST)
+                    except OperationalError as error:
+                        # E.g. the database is locked by another writer; the client may retry
+                        session.rollback()
+                        self.log_error("Database unavailable: %s", error)
+                        self._send_json({"error": "Database unavailable"}, HTTPStatus.SERVICE_UNAVAILABLE)
+                    except SQLAlchemyError as error:
+                        session.rollback()
+                        self.log_error("Database error: %s", error)
+                        self._send_json({"error": "Database error"}, HTTPStatus.INTERNAL_SERVER_ERROR)
+                return
+        self._send_json({"error": "Not found"}, HTTPStatus.NOT_FOUND)
+
+    def _send_json(self, payload, status=HTTPStatus.OK, etag=False):
+        body = json.dumps(payload, default=_json_default).encode("utf-8")
+        tag = f'"{hashlib.sha1(body).hexdigest()}"' if etag else None
+        if tag and self.headers.get("If-None-Match") == tag:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", tag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if tag:
+            self.send_header("ETag", tag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_not_found(self):
+        self._send_json({"error": "Habit not found"}, HTTPStatus.NOT_FOUND)
+
+    def list_habits(self, session):
+        summaries = load_habit_summaries(session, self.query.get("periodicity"))
+        self._send_json([asdict(summary) for summary in summaries], etag=True)
+
+    def get_habit(self, session, habit_id):
+        summary = _get_summary(session, habit_id)
+        if summary is None:
+            return self._send_not_found()
+        self._send_json(summary, etag=True)
+
+    def complete_habit(self, session, habit_id):
+        habit = get_active_habit(session, habit_id)
+        if habit is None:
+            return self._send_not_found()
+        if self.server.completion_queue is not None:
+            seq = self.server.completion_queue.enqueue(habit_id)
+            return self._send_json({"id": habit_id, "queued": seq}, HTTPStatus.ACCEPTED)
+        habit.complete(session)
+        session.commit()
+        self._send_json(_get_summary(session, habit_id))
+
+    def habit_stats(self, session, habit_id):
+        if Habit.period_index is not None:
+            return self._send_indexed_stats(session, habit_id)
+        if _get_summary(session, habit_id) is None:
+            return self._send_not_found()
+        self._send_json({
+            "id": habit_id,
+            "longest_streak": analytics.get_longest_run_streak_for_habit(session, habit_id),
+            "days_since_last_completion": analytics.get_days_since_last_completion(session, habit_id),
+        })
+
+    def _send_indexed_stats(self, session, habit_id):
+        """Stats calculated from the period index, with a single primary key lookup of the habit."""
+        habit = get_active_habit(session, habit_id)
+        if habit is None:
+            return self._send_not_found()
+        last_completed_at = habit.get_last_completion()
+        self._send_json({
+            "id": habit_id,
+            "longest_streak": habit.calculate_max_streak(),
+            "days_since_last_completion": None if last_completed_at is None
+            else (datetime.now(UTC) - last_completed_at.replace(tzinfo=UTC)).days,
+        })
+
+    def longest_streak(self, session):
+        self._send_json({"longest_streak": analytics.get_longest_run_streak(session)})
+
+    def top_habits(self, session):
+        limit = int(self.query.get("limit", 10))
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        ranking = analytics.get_top_habits(
+            session,
+            self.query.get("metric", "current_streak"),
+            min(limit, MAX_PAGE_SIZE),
+            self.query.get("periodicity"),
+        )
+        self._send_json(ranking, etag=True)
+
+
+class HabitServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server holding the session factory shared by all requests.
+
+    Args:
+        address (tuple): (host, port) to listen on
+        engine (Engine): SQLAlchemy engine whose pool backs the request sessions
+        quiet (bool): If True, requests are not logged
+        completion_queue (CompletionQueue, optional): If given, completions are
+            queued and group-committed instead of written per request
+    """
+    daemon_threads = True
+
+    def __init__(self, address, engine, quiet=False, completion_queue=None):
+        super().__init__(address, HabitRequestHandler)
+        self.session_factory = sessionmaker(bind=engine)
+        self.quiet = quiet
+        self.completion_queue = completion_queue
+        self._streaks_refreshed_on = None
+        self._refresh_lock = threading.Lock()
+
+    def refresh_streaks(self, session):
+        """
+        Reset the lapsed streaks once per UTC day.
+
+        Streaks only lapse when the day changes; completions keep their
+        habit's streak up to date themselves.
+
+        Args:
+            session (Session): SQLAlchemy database session of the request
+        """
+        today = datetime.now(UTC).date()
+        if self._streaks_refreshed_on == today:
+            return
+        with self._refresh_lock:
+            if self._streaks_refreshed_on != today:
+                refresh_stale_streaks(session)
+                self._streaks_refreshed_on = today
+
+
+def _get_summary(session, habit_id):
+    """Return the summary of one habit as a dict, or None if it doesn't exist."""
+    summaries = load_habit_summaries(session, habit_id=habit_id)
+    return asdict(summaries[0]) if summaries else None
+
+
+def _json_default(value):
+    """Serialize dates and datetimes as ISO 8601 strings."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
@@ -0,0 +1,387 @@
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, UTC
+from functools import cached_property
+from itertools import chain
+from typing import List, Optional
+import numpy as np
+from sqlalchemy import Integer, case, cast, func, select
+from sqlalchemy.engine import Engine
+from database import read_transaction
+from models import Habit, Completion, CompletionRun
+from periods import PERIOD_EPOCH, get_period_rule
+
+SNAPSHOT_FILE = "habits-snapshot.npz"
+SNAPSHOT_VERSION = 2
+SECONDS_PER_DAY = 86400
+# Days from 1970-01-01, the origin of the stored day numbers, to the first period
+_EPOCH_OFFSET = (PERIOD_EPOCH - date(1970, 1, 1)).days
+
+
+def _epoch_seconds(column):
+    """SQL expression for a stored date or time as whole seconds since 1970-01-01 UTC."""
+    return cast(func.strftime('%s', column), Integer)
+
+
+def _fetch_columns(conn, query, columns: int) -> np.ndarray:
+    """Run an integer-only query and stream its rows into a (rows, columns) int64 array."""
+    values = np.fromiter(chain.from_iterable(conn.execute(query)), dtype=np.int64)
+    return values.reshape(-1, columns)
+
+
+@dataclass(frozen=True)
+class SnapshotResult:
+    """
+    Summary of a snapshot export.
+
+    Attributes:
+        path (str): Path of the written snapshot
+        habits (int): Number of active habits in the snapshot
+        completions (int): Number of completions in the snapshot
+        runs (int): Number of archived runs in the snapshot
+        size (int): Size of the written file in bytes
+    """
+    path: str
+    habits: int
+    completions: int
+    runs: int
+    size: int
+
+
+def export_snapshot(engine: Engine, path: str = SNAPSHOT_FILE, at_time: Optional[datetime] = None) -> SnapshotResult:
+    """
+    Write a read-only columnar snapshot of the active habits and their history.
+
+    All tables are read with column-only queries in one read transaction,
+    so the snapshot is consistent and writers are only blocked while the
+    rows are read, not while analytics run on the snapshot. Times are
+    stored as seconds and dates as days since 1970-01-01 UTC in a
+    compressed NumPy `.npz` file, which is written next to `path` first
+    and then moved into place.
+
+    Args:
+        engine (Engine): Engine of the database to export
+        path (str): Snapshot file to write
+        at_time (datetime, optional): Time recorded as the snapshot's creation time. Defaults to current UTC time
+
+    Returns:
+        SnapshotResult: Path and row counts of the snapshot
+    """
+    created_at = (at_time or datetime.now(UTC)).astimezone(UTC)
+    active = Habit.deleted_at.is_(None)
+    with read_transaction(engine) as conn:
+        habits = conn.execute(
+            select(Habit.id, Habit.name, Habit.periodicity).where(active).order_by(Habit.id)
+        ).all()
+        # Completions of another kind than the periodicity stores (see completion_kind) don't count for streaks
+        stored_kind = case((Habit.periodicity == 'weekly', 'weekly'), else_='daily')
+        completions = _fetch_columns(conn, (
+            select(Completion.habit_id, _epoch_seconds(Completion.completed_at),
+                   _epoch_seconds(Completion.period_start), cast(Completion.kind == stored_kind, Integer))
+            .join(Habit, Habit.id == Completion.habit_id)
+            .where(active)
+            .order_by(Completion.habit_id, Completion.period_start)
+        ), 4)
+        runs = _fetch_columns(conn, (
+            select(CompletionRun.habit_id, _epoch_seconds(CompletionRun.start_period),
+                   _epoch_seconds(CompletionRun.end_period))
+            .join(Habit, Habit.id == CompletionRun.habit_id)
+            .where(active)
+            .order_by(CompletionRun.habit_id, CompletionRun.start_period)
+        ), 3)
+
+    periodicities = sorted({periodicity for _, _, periodicity in habits})
+    codes = {periodicity: code for code, periodicity in enumerate(periodicities)}
+    arrays = {
+        'version': np.array(SNAPSHOT_VERSION),
+        'created_at': np.array(int(created_at.timestamp()), dtype=np.int64),
+        'periodicities': np.array(periodicities, dtype=str),
+        'habit_ids': np.array([habit_id for habit_id, _, _ in habits], dtype=np.int64),
+        'names': np.array([name for _, name, _ in habits], dtype=str),
+        'periodicity_codes': np.array([codes[periodicity] for _, _, periodicity in habits], dtype=np.int32),
+        'completion_habit_ids': completions[:, 0],
+        'completion_times': completions[:, 1],
+        'completion_periods': completions[:, 2] // SECONDS_PER_DAY,
+        'completion_counted': completions[:, 3].astype(bool),
+        'run_habit_ids': runs[:, 0],
+        'run_starts': runs[:, 1] // SECONDS_PER_DAY,
+        'run_ends': runs[:, 2] // SECONDS_PER_DAY,
+    }
+    temporary_path = f"{path}.tmp"
+    try:
+        with open(temporary_path, "wb") as file:
+            np.savez_compressed(file, **arrays)
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    return SnapshotResult(path, len(habits), len(completions), len(runs), os.path.getsize(path))
+
+
+@dataclass(frozen=True, eq=False)
+class Snapshot:
+    """
+    Columnar copy of the active habits and their completion history.
+
+    Habits are sorted by ID; completions and archived runs are sorted by
+    habit (and time), so every habit's rows are one contiguous slice.
+    Metrics are computed for all habits at once with vectorized
+    operations and cached.
+
+    Attributes:
+        created_at (datetime): Time the snapshot was taken
+        periodicities (np.ndarray): Periodicities, indexed by periodicity_codes
+        habit_ids (np.ndarray): Habit IDs, ascending
+        names (np.ndarray): Habit names
+        periodicity_codes (np.ndarray): Index of every habit's periodicity
+        completion_habit_ids (np.ndarray): Habit ID of every completion
+        completion_times (np.ndarray): Completion times in seconds since 1970-01-01 UTC
+        completion_periods (np.ndarray): Stored period start of every completion in days since 1970-01-01
+        completion_counted (np.ndarray): Whether a completion is of the kind its habit's periodicity stores
+        run_habit_ids (np.ndarray): Habit ID of every archived run
+        run_starts (np.ndarray): First period of every archived run in days since 1970-01-01
+        run_ends (np.ndarray): Last period of every archived run in days since 1970-01-01
+    """
+    created_at: datetime
+    periodicities: np.ndarray
+    habit_ids: np.ndarray
+    names: np.ndarray
+    periodicity_codes: np.ndarray
+    completion_habit_ids: np.ndarray
+    completion_times: np.ndarray
+    completion_periods: np.ndarray
+    completion_counted: np.ndarray
+    run_habit_ids: np.ndarray
+    run_starts: np.ndarray
+    run_ends: np.ndarray
+
+    @classmethod
+    def load(cls, path: str = SNAPSHOT_FILE) -> "Snapshot":
+        """
+        Read a snapshot written by export_snapshot.
+
+        Args:
+            path (str): Snapshot file
+
+        Returns:
+            Snapshot: The loaded snapshot
+
+        Raises:
+            ValueError: If the file is not a snapshot of a supported version
+        """
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+        except (OSError, ValueError) as error:
+            raise ValueError(f"{path} is not a habit snapshot: {error}") from error
+        if arrays.pop('version', None) != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} is not a habit snapshot of version {SNAPSHOT_VERSION}")
+        created_at = datetime.fromtimestamp(int(arrays.pop('created_at')), UTC)
+        return cls(created_at=created_at, **arrays)
+
+    def habit_index(self, habit_id: int) -> Optional[int]:
+        """
+        Find the position of a habit in the habit arrays.
+
+        Args:
+            habit_id (int): ID of the habit
+
+        Returns:
+            int: Index into the habit arrays, None if the habit isn't in the snapshot
+        """
+        index = int(np.searchsorted(self.habit_ids, habit_id))
+        if index < len(self.habit_ids) and self.habit_ids[index] == habit_id:
+            return index
+        return None
+
+    @cached_property
+    def max_streaks(self) -> np.ndarray:
+        """
+        np.ndarray: Record streak of every habit, calculated from its completions and archived runs.
+
+        Follows PeriodRule.summarize: completions of the kind the habit
+        stores are grouped into periods by their stored period start,
+        periods reaching the quota are merged with the archived runs into
+        runs of consecutive periods, and the longest run is the record.
+        Each periodicity is evaluated for all its habits at once.
+        """
+        max_streaks = np.zeros(len(self.habit_ids), dtype=np.int64)
+        completion_habits = np.searchsorted(self.habit_ids, self.completion_habit_ids)
+        run_habits = np.searchsorted(self.habit_ids, self.run_habit_ids)
+        for code, periodicity in enumerate(self.periodicities):
+            rule = get_period_rule(str(periodicity))
+            period_days = rule.length_days
+
+            # Completions of a habit are sorted by period, so each period is a contiguous slice
+            selected = (self.periodicity_codes[completion_habits] == code) & self.completion_counted
+            habits = completion_habits[selected]
+            days = self.completion_periods[selected]
+            keys = days - (days - _EPOCH_OFFSET) % period_days
+            period_starts = np.flatnonzero(np.concatenate((
+                [True], (habits[1:] != habits[:-1]) | (keys[1:] != keys[:-1])
+            ))) if len(keys) else np.empty(0, dtype=np.int64)
+            counts = np.diff(np.append(period_starts, len(keys)))
+            completed = period_starts[counts >= rule.quota]
+
+            archived = self.periodicity_codes[run_habits] == code
+            segment_habits = np.concatenate((habits[completed], run_habits[archived]))
+            if not len(segment_habits):
+                continue
+            segment_starts = np.concatenate((keys[completed], self.run_starts[archived]))
+            segment_ends = np.concatenate((keys[completed], self.run_ends[archived]))
+            order = np.lexsort((segment_starts, segment_habits))
+            segment_habits = segment_habits[order]
+            segment_starts = segment_starts[order]
+            segment_ends = segment_ends[order]
+
+            # Shift every habit into its own range of days so one running maximum serves all habits
+            base = segment_starts.min()
+            stride = segment_ends.max() - base + 2 * period_days + 1
+            shift = segment_habits * stride - base
+            reached = np.maximum.accumulate(segment_ends + shift)
+            new_run = np.concatenate((
+                [True],
+                (segment_habits[1:] != segment_habits[:-1])
+                | (segment_starts[1:] + shift[1:] > reached[:-1] + period_days),
+            ))
+            run_starts = np.flatnonzero(new_run)
+            lengths = (np.maximum.reduceat(segment_ends, run_starts) - segment_starts[run_starts]) // period_days + 1
+            habit_of_run = segment_habits[run_starts]
+            habit_starts = np.flatnonzero(np.concatenate(([True], habit_of_run[1:] != habit_of_run[:-1])))
+            max_streaks[habit_of_run[habit_starts]] = np.maximum.reduceat(lengths, habit_starts)
+        return max_streaks
+
+    @cached_property
+    def last_completion_times(self) -> np.ndarray:
+        """
+        np.ndarray: Last completion time of every habit in seconds, -1 without completions.
+
+        Habits whose completions were all archived have the start of their
+        last archived period instead, like analytics.get_days_since_last_completion.
+        """
+        last = np.full(len(self.habit_ids), -1, dtype=np.int64)
+        if len(self.run_habit_ids):
+            habits = np.searchsorted(self.habit_ids, self.run_habit_ids)
+            np.maximum.at(last, habits, self.run_ends * SECONDS_PER_DAY)
+        if len(self.completion_habit_ids):
+            habits = np.searchsorted(self.habit_ids, self.completion_habit_ids)
+            starts = np.flatnonzero(np.concatenate(([True], habits[1:] != habits[:-1])))
+            last[habits[starts]] = np.maximum.reduceat(self.completion_times, starts)
+        return last
+
+    def days_since_last_completion(self, at_time: Optional[datetime] = None) -> np.ndarray:
+        """
+        Calculate the days elapsed since the last completion of every habit.
+
+        Args:
+            at_time (datetime, optional): Reference time. Defaults to current UTC time
+
+        Returns:
+            np.ndarray: Days per habit, -1 for habits that were never completed
+        """
+        now = int((at_time or datetime.now(UTC)).timestamp())
+        last = self.last_completion_times
+        days = (now - last) // SECONDS_PER_DAY
+        # Archived periods count from the day, like the date arithmetic on the database
+        archived_only = np.isin(self.habit_ids, self.completion_habit_ids, invert=True)
+        days[archived_only] = now // SECONDS_PER_DAY - last[archived_only] // SECONDS_PER_DAY
+        days[last < 0] = -1
+        return days
+
+
+def get_habits_by_periodicity(snapshot: Snapshot, periodicity: str) -> np.ndarray:
+    """
+    Get the habits of a snapshot with a periodicity.
+
+    Args:
+        snapshot (Snapshot): Loaded snapshot
+        periodicity (str): The periodicity to filter by, e.g. 'daily' or 'every 3 days'
+
+    Returns:
+        np.ndarray: Indexes of the habits into the snapshot's habit arrays
+
+    Raises:
+        ValueError: If the periodicity is not supported
+    """
+    name = get_period_rule(periodicity).name
+    codes = np.flatnonzero(snapshot.periodicities == name)
+    if not len(codes):
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(snapshot.periodicity_codes == codes[0])
+
+
+def get_longest_run_streak(snapshot: Snapshot) -> int:
+    """
+    Get the longest streak across all habits of a snapshot.
+
+    Args:
+        snapshot (Snapshot): Loaded snapshot
+
+    Returns:
+        int: Maximum streak across all habits, 0 if there are no habits
+    """
+    return int(snapshot.max_streaks.max()) if len(snapshot.habit_ids) else 0
+
+
+def get_longest_run_streak_for_habit(snapshot: Snapshot, habit_id: int) -> int:
+    """
+    Get the longest streak of a habit in a snapshot.
+
+    Args:
+        snapshot (Snapshot): Loaded snapshot
+        habit_id (int): ID of the habit
+
+    Returns:
+        int: Maximum streak of the habit, 0 if the habit isn't in the snapshot
+    """
+    index = snapshot.habit_index(habit_id)
+    return 0 if index is None else int(snapshot.max_streaks[index])
+
+
+def get_days_since_last_completion(snapshot: Snapshot, habit_id: int,
+                                   at_time: Optional[datetime] = None) -> Optional[int]:
+    """
+    Calculate the days elapsed since the last completion of a habit in a snapshot.
+
+    Args:
+        snapshot (Snapshot): Loaded snapshot
+        habit_id (int): ID of the habit
+        at_time (datetime, optional): Reference time. Defaults to current UTC time
+
+    Returns:
+        int: Number of days since the last completion, None if the habit isn't in the snapshot or never completed
+    """
+    index = snapshot.habit_index(habit_id)
+    if index is None:
+        return None
+    days = int(snapshot.days_since_last_completion(at_time)[index])
+    return None if days < 0 else days
+
+
+def get_habit_metrics(snapshot: Snapshot, indexes: Optional[np.ndarray] = None,
+                      at_time: Optional[datetime] = None) -> List[dict]:
+    """
+    List the metrics of habits in a snapshot.
+
+    Args:
+        snapshot (Snapshot): Loaded snapshot
+        indexes (np.ndarray, optional): Indexes of the habits to list. Defaults to all habits
+        at_time (datetime, optional): Reference time. Defaults to current UTC time
+
+    Returns:
+        List[dict]: id, name, periodicity, max_streak and days_since_last_completion per habit
+    """
+    if indexes is None:
+        indexes = np.arange(len(snapshot.habit_ids))
+    days = snapshot.days_since_last_completion(at_time)
+    return [
+        {
+            'id': int(snapshot.habit_ids[index]),
+            'name': str(snapshot.names[index]),
+            'periodicity': str(snapshot.periodicities[snapshot.periodicity_codes[index]]),
+            'max_streak': int(snapshot.max_streaks[index]),
+            'days_since_last_completion': None if days[index] < 0 else int(days[index]),
+        }
+        for index in indexes
+    ]
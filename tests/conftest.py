@@ -1,13 +1,33 @@
+import os
 import pytest
-from database import setup_test_db, get_db_session
+from sqlalchemy.orm import Session
+from database import create_test_engine
+
+@pytest.fixture(scope="session")
+def db_engine(tmp_path_factory):
+    """
+    Creates the test database and its schema once per test session.
+    The database is in memory unless HAPI_TEST_DB=file is set, in which case
+    a temporary file private to the pytest(-xdist) worker is used.
+    """
+    db_file = None
+    if os.environ.get("HAPI_TEST_DB") == "file":
+        db_file = tmp_path_factory.mktemp("db") / "test_habits.db"
+    engine = create_test_engine(db_file)
+    yield engine
+    engine.dispose()
 
 @pytest.fixture(scope="function")
-def db_session():
+def db_session(db_engine):
     """
     Provides a clean test database session for each test.
     Tables are created but empty - each testcase should create its own data.
+    Everything a test writes, including commits, is rolled back on teardown.
     """
-    setup_test_db()
-    session = get_db_session(test=True)
+    connection = db_engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
     yield session
-    session.close()
\ No newline at end of file
+    session.close()
+    transaction.rollback()
+    connection.close()
@@ -7,6 +7,8 @@ from analytics import (
     get_longest_run_streak,
     get_longest_run_streak_for_habit,
     get_days_since_last_completion,
+    get_top_habits,
+    count_completions,
 )
 
 def test_get_all_habits(db_session):
@@ -143,4 +145,110 @@ def test_get_days_since_last_completion_never_completed(db_session):
 def test_get_days_since_last_completion_nonexistent_habit(db_session):
     """Ensures proper handling when querying non-existent habit IDs."""
     days_since = get_days_since_last_completion(db_session, 999)
-    assert days_since is None
\ No newline at end of file
+    assert days_since is None
+
+def test_get_longest_run_streak_empty_database(db_session):
+    """Ensures the longest streak is 0 instead of failing when there are no habits."""
+    assert get_longest_run_streak(db_session) == 0
+
+def test_get_top_habits_by_current_streak(db_session):
+    """Verifies ranking returns the habits with the highest current streak first."""
+    base_time = datetime.now(UTC)
+    for name, days in [("Short", 2), ("Long", 5), ("Medium", 3)]:
+        habit = Habit(name=name, periodicity="daily")
+        db_session.add(habit)
+        db_session.commit()
+        for days_ago in range(days - 1, -1, -1):
+            habit.complete(db_session, base_time - timedelta(days=days_ago))
+    db_session.commit()
+
+    ranking = get_top_habits(db_session, "current_streak", limit=2)
+    assert [entry["name"] for entry in ranking] == ["Long", "Medium"]
+    assert [entry["current_streak"] for entry in ranking] == [5, 3]
+    assert [entry["rank"] for entry in ranking] == [1, 2]
+
+def test_get_top_habits_by_periodicity(db_session):
+    """Tests restricting a ranking to one periodicity."""
+    daily = Habit(name="Daily", periodicity="daily", max_streak=4)
+    weekly = Habit(name="Weekly", periodicity="weekly", max_streak=2)
+    db_session.add_all([daily, weekly])
+    db_session.commit()
+
+    ranking = get_top_habits(db_session, "max_streak", periodicity="weekly")
+    assert [entry["name"] for entry in ranking] == ["Weekly"]
+
+def test_get_top_habits_days_since_last_completion(db_session):
+    """Verifies at-risk ranking lists never-completed and stale habits first."""
+    base_time = datetime.now(UTC)
+    recent = Habit(name="Recent", periodicity="daily")
+    stale = Habit(name="Stale", periodicity="daily")
+    never = Habit(name="Never", periodicity="daily")
+    db_session.add_all([recent, stale, never])
+    db_session.commit()
+    recent.complete(db_session, base_time)
+    stale.complete(db_session, base_time - timedelta(days=4))
+    db_session.commit()
+
+    ranking = get_top_habits(db_session, "days_since_last_completion")
+    assert [entry["name"] for entry in ranking] == ["Never", "Stale", "Recent"]
+    assert [entry["days_since_last_completion"] for entry in ranking] == [None, 4, 0]
+
+def test_get_top_habits_completion_rate(db_session):
+    """Tests ranking by completions per elapsed period."""
+    base_time = datetime.now(UTC)
+    busy = Habit(name="Busy", periodicity="daily", created_at=base_time - timedelta(days=3))
+    idle = Habit(name="Idle", periodicity="daily", created_at=base_time - timedelta(days=3))
+    db_session.add_all([busy, idle])
+    db_session.commit()
+    for days_ago in range(3, -1, -1):
+        busy.complete(db_session, base_time - timedelta(days=days_ago))
+    idle.complete(db_session, base_time)
+    db_session.commit()
+
+    ranking = get_top_habits(db_session, "completion_rate")
+    assert [entry["name"] for entry in ranking] == ["Busy", "Idle"]
+    assert ranking[0]["completion_rate"] == 1.0
+    assert ranking[1]["completion_rate"] == 0.25
+
+def test_get_top_habits_empty_and_invalid(db_session):
+    """Ensures empty databases rank to an empty list and unknown metrics are rejected."""
+    assert get_top_habits(db_session, "max_streak") == []
+    with pytest.raises(ValueError):
+        get_top_habits(db_session, "name")
+
+def test_deleted_habits_are_excluded(db_session):
+    """Ensures soft-deleted habits no longer appear in any analytics."""
+    kept = Habit(name="Kept", periodicity="daily")
+    deleted = Habit(name="Deleted", periodicity="daily")
+    db_session.add_all([kept, deleted])
+    db_session.commit()
+    base_time = datetime.now(UTC)
+    kept.complete(db_session, base_time)
+    for days_ago in range(3):
+        deleted.complete(db_session, base_time - timedelta(days=days_ago))
+    deleted.soft_delete()
+    db_session.commit()
+
+    assert [h.name for h in get_all_habits(db_session)] == ["Kept"]
+    assert [h.name for h in get_habits_by_periodicity(db_session, "daily")] == ["Kept"]
+    assert get_longest_run_streak(db_session) == 1
+    assert get_longest_run_streak_for_habit(db_session, deleted.id) == 0
+    assert get_days_since_last_completion(db_session, deleted.id) is None
+    assert [entry["name"] for entry in get_top_habits(db_session, "max_streak")] == ["Kept"]
+
+def test_count_completions_across_habits(db_session):
+    """Verifies completions of daily, weekly and custom habits are counted in one range."""
+    habits = [Habit(name=p, periodicity=p) for p in ("daily", "weekly", "3 times per week")]
+    deleted = Habit(name="Deleted", periodicity="daily")
+    db_session.add_all(habits + [deleted])
+    db_session.commit()
+    today = datetime(2024, 5, 1, tzinfo=UTC)
+    for habit in habits + [deleted]:
+        habit.complete(db_session, today + timedelta(hours=9))
+        habit.complete(db_session, today - timedelta(hours=3))
+    deleted.soft_delete()
+    db_session.commit()
+
+    assert count_completions(db_session, today, today + timedelta(days=1)) == 3
+    # The weekly habit keeps a single completion for the week
+    assert count_completions(db_session, today - timedelta(days=1)) == 5
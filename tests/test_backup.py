@@ -0,0 +1,65 @@
+import gzip
+import pytest
+from sqlalchemy.orm import Session
+from database import create_test_engine
+from models import Habit
+from backup import backup_database, restore_database, verify_database
+
+@pytest.fixture
+def db_file(tmp_path):
+    """Provides a database file with two habits."""
+    path = tmp_path / "habits.db"
+    engine = create_test_engine(path)
+    with Session(engine) as session:
+        session.add_all([Habit(name="Read", periodicity="daily"), Habit(name="Clean", periodicity="weekly")])
+        session.commit()
+    engine.dispose()
+    return str(path)
+
+def habit_names(path):
+    """Return the names of the habits stored in a database file."""
+    engine = create_test_engine(path)
+    with Session(engine) as session:
+        names = [habit.name for habit in session.query(Habit).order_by(Habit.id)]
+    engine.dispose()
+    return names
+
+@pytest.mark.parametrize("suffix", ["", ".gz"])
+def test_backup_and_restore(db_file, tmp_path, suffix):
+    """Verifies a backup restores the data it was taken from, with and without compression."""
+    destination = str(tmp_path / f"backup.db{suffix}")
+    steps = []
+    result = backup_database(destination, db_file, step_pages=1, progress=lambda copied, total: steps.append(copied))
+
+    assert result.pages > 1
+    assert steps[-1] == result.pages
+    with open(destination, "rb") as backup:
+        assert (backup.read(2) == b"\x1f\x8b") == (suffix == ".gz")
+    assert not (tmp_path / f"backup.db{suffix}.partial").exists()
+
+    engine = create_test_engine(db_file)
+    with Session(engine) as session:
+        session.add(Habit(name="Added later", periodicity="daily"))
+        session.commit()
+    engine.dispose()
+    assert len(habit_names(db_file)) == 3
+
+    restore_database(destination, db_file)
+    assert habit_names(db_file) == ["Read", "Clean"]
+
+def test_invalid_backups_are_rejected(db_file, tmp_path):
+    """Ensures corrupt backups fail verification and leave the database untouched."""
+    not_a_database = tmp_path / "garbage.db"
+    not_a_database.write_bytes(b"not a database" * 1000)
+    truncated = tmp_path / "truncated.db.gz"
+    truncated.write_bytes(gzip.compress(b"SQLite format 3\x00")[:20])
+
+    with pytest.raises(ValueError):
+        verify_database(str(not_a_database))
+    for backup in (not_a_database, truncated):
+        with pytest.raises(ValueError):
+            restore_database(str(backup), db_file)
+    with pytest.raises(FileNotFoundError):
+        restore_database(str(tmp_path / "missing.db"), db_file)
+    assert habit_names(db_file) == ["Read", "Clean"]
+    assert not (tmp_path / "habits.db.restore").exists()
@@ -0,0 +1,111 @@
+import pytest
+from datetime import datetime, timedelta, UTC
+from models import Habit, DailyCompletion, WeeklyCompletion, CompletionRun
+from maintenance import archive_completions
+from analytics import count_completions, get_days_since_last_completion, get_top_habits
+
+def add_daily_completions(db_session, habit, base_time, days_ago):
+    for days in days_ago:
+        db_session.add(DailyCompletion(habit=habit, completed_at=base_time - timedelta(days=days)))
+    db_session.commit()
+
+def test_archive_daily_completions_into_runs(db_session):
+    """Verifies old daily completions are replaced by runs without changing streaks."""
+    habit = Habit(name="Daily", periodicity="daily")
+    db_session.add(habit)
+    base_time = datetime.now(UTC)
+    # Old history: 20-day run, gap, 5-day run; the current 41-day run crosses the horizon
+    days_ago = list(range(100, 80, -1)) + list(range(70, 65, -1)) + list(range(40, -1, -1))
+    add_daily_completions(db_session, habit, base_time, days_ago)
+    streak_before = habit.calculate_streak(base_time)
+    max_streak_before = habit.calculate_max_streak()
+
+    archived = archive_completions(db_session, horizon_days=30, at_time=base_time)
+
+    assert archived == 20 + 5 + 10
+    runs = db_session.query(CompletionRun).filter_by(habit_id=habit.id).all()
+    assert [(run.end_period - run.start_period).days + 1 for run in runs] == [20, 5, 10]
+    assert db_session.query(DailyCompletion).count() == 31
+    assert habit.calculate_streak(base_time) == streak_before == 41
+    assert habit.calculate_max_streak() == max_streak_before == 41
+
+def test_archive_merges_with_existing_runs(db_session):
+    """Ensures archiving twice extends the existing run instead of adding a new one."""
+    habit = Habit(name="Daily", periodicity="daily")
+    db_session.add(habit)
+    base_time = datetime.now(UTC)
+    add_daily_completions(db_session, habit, base_time, range(60, -1, -1))
+
+    archive_completions(db_session, horizon_days=40, at_time=base_time)
+    archive_completions(db_session, horizon_days=20, at_time=base_time)
+
+    runs = db_session.query(CompletionRun).filter_by(habit_id=habit.id).all()
+    assert len(runs) == 1
+    assert habit.calculate_max_streak() == 61
+
+def test_archive_weekly_completions_into_runs(db_session):
+    """Verifies weekly completions are archived as week runs."""
+    habit = Habit(name="Weekly", periodicity="weekly")
+    db_session.add(habit)
+    base_time = datetime.now(UTC)
+    for weeks_ago in [20, 19, 18, 10, 9, 1, 0]:
+        completion_time = base_time - timedelta(weeks=weeks_ago)
+        db_session.add(WeeklyCompletion(
+            habit=habit,
+            completed_at=completion_time,
+            week_start=habit._get_week_start(completion_time)
+        ))
+    db_session.commit()
+
+    archive_completions(db_session, horizon_days=28, at_time=base_time)
+
+    assert db_session.query(CompletionRun).filter_by(habit_id=habit.id).count() == 2
+    assert db_session.query(WeeklyCompletion).count() == 2
+    assert habit.calculate_streak(base_time) == 2
+    assert habit.calculate_max_streak() == 3
+
+def test_days_since_last_completion_reads_runs(db_session):
+    """Tests the last completion falls back to archived runs once all completions are archived."""
+    habit = Habit(name="Daily", periodicity="daily")
+    db_session.add(habit)
+    base_time = datetime.now(UTC)
+    add_daily_completions(db_session, habit, base_time, [50, 49])
+
+    archive_completions(db_session, horizon_days=30, at_time=base_time)
+
+    assert db_session.query(DailyCompletion).count() == 0
+    assert get_days_since_last_completion(db_session, habit.id) == 49
+    assert habit.get_last_completion().date() == (base_time - timedelta(days=49)).date()
+    assert habit.calculate_streak(base_time) == 0
+
+def test_archive_rejects_short_horizon(db_session):
+    """Ensures horizons shorter than a week are rejected."""
+    with pytest.raises(ValueError):
+        archive_completions(db_session, horizon_days=3)
+
+def test_archive_keeps_periods_below_quota(db_session):
+    """Ensures completions of weeks below the quota are kept, so analytics totals don't change."""
+    habit = Habit(name="Swim", periodicity="3 times per week")
+    db_session.add(habit)
+    db_session.commit()
+    base_time = datetime.now(UTC)
+    week_start = datetime.combine(habit.period_rule.period_key((base_time - timedelta(days=120)).date()),
+                                  datetime.min.time(), UTC) + timedelta(hours=12)
+    habit.add_goal("completions", 10, at_time=week_start - timedelta(days=1))
+    # A completed week followed by a week with two of its three completions
+    for days in [0, 2, 4, 7, 9]:
+        habit.complete(db_session, week_start + timedelta(days=days))
+    db_session.commit()
+    partial_week = (week_start + timedelta(days=7), week_start + timedelta(days=14))
+    count_before = count_completions(db_session, *partial_week)
+    rate_before = get_top_habits(db_session, 'completion_rate')
+    progress_before = habit.goals[0].progress
+
+    archived = archive_completions(db_session, horizon_days=30, at_time=base_time)
+
+    assert archived == 3
+    assert db_session.query(DailyCompletion).count() == 2
+    assert count_completions(db_session, *partial_week) == count_before == 2
+    assert get_top_habits(db_session, 'completion_rate') == rate_before
+    assert habit.goals[0].progress == progress_before == 5
+    assert habit.calculate_max_streak() == 1
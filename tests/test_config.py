@@ -0,0 +1,77 @@
+import pytest
+import config
+import database
+from config import Settings, load_settings, default_config_path
+
+CONFIG = """
+db_file = "/data/hapi/habits.db"
+pool_size = 8
+period_index = false
+
+[pragmas]
+journal_mode = "WAL"
+cache_size = -65536
+"""
+
+def _write_config(tmp_path, text=CONFIG):
+    path = tmp_path / "config.toml"
+    path.write_text(text)
+    return str(path)
+
+def test_layers_override_in_order(tmp_path):
+    """Verifies the environment overrides the config file, which overrides the defaults, and flags override all."""
+    path = _write_config(tmp_path)
+    environ = {"HAPI_POOL_SIZE": "12", "HAPI_PRAGMA_SYNCHRONOUS": "NORMAL", "HAPI_TEST_DB": "file"}
+
+    settings = load_settings(path, environ)
+    assert (settings.db_file, settings.pool_size, settings.max_overflow) == ("/data/hapi/habits.db", 12, 10)
+    assert settings.pragmas == {"journal_mode": "WAL", "cache_size": "-65536", "synchronous": "NORMAL"}
+    assert settings.period_index is False
+
+    settings = load_settings(path, environ, db_file="fast.db", pool_size=None, pragmas={"journal_mode": "DELETE"})
+    assert (settings.db_file, settings.pool_size, settings.pragmas["journal_mode"]) == ("fast.db", 12, "DELETE")
+    assert settings.url() == "sqlite:///fast.db"
+
+def test_config_file_locations(tmp_path):
+    """Tests the config file is found through HAPI_CONFIG or XDG_CONFIG_HOME and is optional there."""
+    assert load_settings(environ={"XDG_CONFIG_HOME": str(tmp_path)}) == Settings()
+
+    xdg_path = default_config_path({"XDG_CONFIG_HOME": str(tmp_path)})
+    assert xdg_path == str(tmp_path / "hapi" / "config.toml")
+    (tmp_path / "hapi").mkdir()
+    (tmp_path / "hapi" / "config.toml").write_text('db_file = "xdg.db"')
+    assert load_settings(environ={"XDG_CONFIG_HOME": str(tmp_path)}).db_file == "xdg.db"
+
+    path = _write_config(tmp_path, 'database_url = "sqlite:////srv/hapi/habits.db"')
+    settings = load_settings(environ={"HAPI_CONFIG": path, "XDG_CONFIG_HOME": str(tmp_path)})
+    assert settings.database_path() == "/srv/hapi/habits.db"
+    with pytest.raises(ValueError):
+        load_settings(environ={"HAPI_CONFIG": str(tmp_path / "missing.toml")})
+
+@pytest.mark.parametrize("text, environ", [
+    ('pool_sizes = 3', {}),
+    ('pool_size = "many"', {}),
+    ('[pragmas]\njournal_mode = "WAL; DROP TABLE habits"', {}),
+    ('database_url = "postgresql://localhost/hapi"', {}),
+    ('db_file = ', {}),
+    ('', {"HAPI_PERIOD_INDEX": "maybe"}),
+    ('', {"HAPI_MAX_OVERFLOW": "-1"}),
+])
+def test_invalid_settings_raise(tmp_path, text, environ):
+    """Ensures unknown keys, wrong types, unsafe pragmas and other databases are rejected."""
+    with pytest.raises(ValueError):
+        load_settings(_write_config(tmp_path, text), environ)
+
+def test_engines_use_settings(tmp_path, monkeypatch):
+    """Verifies engines open the configured database file and run the configured pragmas."""
+    path = _write_config(tmp_path, f'db_file = "{tmp_path / "habits.db"}"\n[pragmas]\njournal_mode = "wal"')
+    monkeypatch.setattr(config, "_settings", None)
+    monkeypatch.setattr(database, "_engines", {})
+    config.configure(path, pool_size=2)
+
+    assert database.get_database_path() == str(tmp_path / "habits.db")
+    for engine in (database.get_engine(), database.create_pooled_engine()):
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        engine.dispose()
+    assert database.create_pooled_engine().pool.size() == 2
@@ -1,4 +1,5 @@
 import pytest
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, UTC
 from models import Habit, DailyCompletion
 
@@ -53,4 +54,30 @@ def test_cascade_delete_completions(db_session):
     db_session.commit()
     
     # Check that completion was cascade deleted
-    assert db_session.query(DailyCompletion).count() == 0
\ No newline at end of file
+    assert db_session.query(DailyCompletion).count() == 0
+
+def test_daily_completion_day_defaults_to_completion_date(db_session):
+    """Verifies the stored day is derived from the completion time when not given."""
+    habit = Habit(name="Test Habit", periodicity="daily")
+    db_session.add(habit)
+    db_session.flush()
+
+    completed_at = datetime(2024, 3, 5, 22, 30, tzinfo=UTC)
+    completion = DailyCompletion(habit=habit, completed_at=completed_at)
+    db_session.add(completion)
+    db_session.commit()
+
+    assert completion.day == completed_at.date()
+
+def test_duplicate_daily_completion_rejected(db_session):
+    """Ensures the database rejects a second completion for the same habit and day."""
+    habit = Habit(name="Test Habit", periodicity="daily")
+    db_session.add(habit)
+    db_session.flush()
+
+    completed_at = datetime(2024, 3, 5, 8, 0, tzinfo=UTC)
+    db_session.add(DailyCompletion(habit=habit, completed_at=completed_at))
+    db_session.add(DailyCompletion(habit=habit, completed_at=completed_at.replace(hour=20)))
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
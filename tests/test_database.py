@@ -0,0 +1,97 @@
+import sqlite3
+from datetime import date, datetime, UTC
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import Session
+import config
+import database
+from database import upgrade_db, migrate_completion_tables
+from models import Base, Habit, Completion, DailyCompletion, WeeklyCompletion
+
+def _create_legacy_database(path):
+    """Create a database with the separate completion tables of older versions."""
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE habits (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, description VARCHAR,
+                             periodicity VARCHAR NOT NULL, created_at DATETIME,
+                             current_streak INTEGER, max_streak INTEGER);
+        CREATE TABLE daily_completions (id INTEGER PRIMARY KEY, habit_id INTEGER, completed_at DATETIME, day DATE);
+        CREATE TABLE weekly_completions (id INTEGER PRIMARY KEY, habit_id INTEGER, week_start DATE NOT NULL,
+                                         completed_at DATETIME);
+        INSERT INTO habits VALUES (1, 'Read', NULL, 'daily', '2024-03-01 00:00:00.000000', 0, 0);
+        INSERT INTO habits VALUES (2, 'Clean', NULL, 'weekly', '2024-03-01 00:00:00.000000', 0, 0);
+        INSERT INTO daily_completions (habit_id, completed_at, day) VALUES
+            (1, '2024-03-04 08:00:00.000000', '2024-03-04'),
+            (1, '2024-03-05 20:00:00.000000', '2024-03-05'),
+            (1, '2024-03-05 07:00:00.000000', '2024-03-05'),
+            (1, '2024-03-06 09:00:00.000000', NULL),
+            (1, '2024-03-07 09:00:00.000000', '2024-03-07');
+        INSERT INTO weekly_completions (habit_id, week_start, completed_at) VALUES
+            (2, '2024-03-04', '2024-03-04 10:00:00.000000'),
+            (2, '2024-03-04', '2024-03-06 10:00:00.000000'),
+            (2, '2024-03-11', '2024-03-12 10:00:00.000000');
+    """)
+    connection.commit()
+    connection.close()
+
+def test_upgrade_moves_legacy_completions(tmp_path):
+    """Verifies upgrading copies both legacy tables into completions, drops them and backfills stats."""
+    path = tmp_path / "legacy.db"
+    _create_legacy_database(path)
+    engine = create_engine(f"sqlite:///{path}")
+
+    upgrade_db(engine)
+
+    table_names = set(inspect(engine).get_table_names())
+    assert "daily_completions" not in table_names and "weekly_completions" not in table_names
+    with Session(engine) as session:
+        daily, weekly = session.get(Habit, 1), session.get(Habit, 2)
+        assert [c.day for c in daily.daily_completions] == [
+            date(2024, 3, 4), date(2024, 3, 5), date(2024, 3, 6), date(2024, 3, 7)
+        ]
+        # The later of the two completions on the same day is kept
+        assert daily.daily_completions[1].completed_at.hour == 20
+        assert [c.week_start for c in weekly.weekly_completions] == [
+            date(2024, 3, 4), date(2024, 3, 4), date(2024, 3, 11)
+        ]
+        assert (daily.completion_count, weekly.completion_count) == (4, 3)
+        assert weekly.last_completed_at.day == 12
+        assert daily.calculate_max_streak() == 4
+        assert weekly.calculate_max_streak() == 2
+        # Both habits missed their last period, so the current one is due
+        assert daily.next_due_at > daily.last_completed_at
+        assert daily.next_due_at.date() == daily.period_rule.next_due(None, datetime.now(UTC).date())
+    engine.dispose()
+
+def test_migration_in_batches_resumes(tmp_path):
+    """Ensures small batches move every row and a second run finds nothing left to move."""
+    path = tmp_path / "legacy.db"
+    _create_legacy_database(path)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+
+    assert migrate_completion_tables(engine, batch_size=2) == 8
+    assert migrate_completion_tables(engine, batch_size=2) == 0
+    with Session(engine) as session:
+        assert session.query(Completion).count() == 7
+        assert session.query(DailyCompletion).count() == 4
+        assert session.query(WeeklyCompletion).count() == 3
+    engine.dispose()
+
+def test_create_db_upgrades_only_other_schema_versions(tmp_path, monkeypatch):
+    """Ensures starting with an up-to-date database skips the schema upgrade."""
+    monkeypatch.setattr(config, "_settings", None)
+    monkeypatch.setattr(database, "_engines", {})
+    config.configure(environ={}, db_file=str(tmp_path / "habits.db"))
+    database.create_db()
+    engine = database.get_engine()
+    assert database.get_schema_version(engine) == database.SCHEMA_VERSION
+
+    upgrades = []
+    monkeypatch.setattr(database, "upgrade_db", upgrades.append)
+    database.create_db()
+    assert upgrades == []
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA user_version = 0")
+    database.create_db()
+    assert upgrades == [engine]
+    engine.dispose()
@@ -0,0 +1,66 @@
+import threading
+from datetime import datetime, UTC
+from sqlalchemy.orm import Session
+from models import Habit, HabitEvent, record_event, HABIT_CREATED, HABIT_COMPLETED, HABIT_DELETED
+from events import iter_events, follow_events
+
+def _create_habit(session, name="Read"):
+    habit = Habit(name=name, periodicity="daily")
+    session.add(habit)
+    record_event(session, HABIT_CREATED, habit, name=name, periodicity="daily")
+    session.commit()
+    return habit
+
+def test_changes_are_logged_in_order(db_session):
+    """Verifies creating, completing and deleting a habit append events with increasing sequence numbers."""
+    habit = _create_habit(db_session)
+    habit.complete(db_session, datetime(2024, 5, 1, 8, 0, tzinfo=UTC))
+    db_session.commit()
+    habit.soft_delete()
+    record_event(db_session, HABIT_DELETED, habit)
+    db_session.commit()
+
+    events = list(iter_events(db_session))
+    assert [event.event_type for event in events] == [HABIT_CREATED, HABIT_COMPLETED, HABIT_DELETED]
+    assert {event.habit_id for event in events} == {habit.id}
+    assert events[0].data == {"name": "Read", "periodicity": "daily"}
+    assert events[1].data == {"completed_at": "2024-05-01T08:00:00+00:00"}
+    assert events[0].seq < events[1].seq < events[2].seq
+
+def test_events_roll_back_with_the_change(db_session):
+    """Ensures an event is only visible when the change it describes is committed."""
+    habit = _create_habit(db_session)
+    habit.complete(db_session, datetime(2024, 5, 1, 8, 0, tzinfo=UTC))
+    db_session.rollback()
+
+    assert [event.event_type for event in iter_events(db_session)] == [HABIT_CREATED]
+    assert db_session.query(HabitEvent).count() == 1
+
+def test_iter_events_since_in_pages(db_session):
+    """Tests reading from a sequence number in small pages returns every later event once."""
+    habit = _create_habit(db_session)
+    for day in range(1, 8):
+        habit.complete(db_session, datetime(2024, 5, day, 8, 0, tzinfo=UTC))
+    db_session.commit()
+
+    first, *rest = list(iter_events(db_session))
+    assert [event.seq for event in iter_events(db_session, since=first.seq, batch_size=3)] == [
+        event.seq for event in rest
+    ]
+    assert len(list(iter_events(db_session, since=first.seq, batch_size=3, limit=4))) == 4
+    assert list(iter_events(db_session, since=rest[-1].seq)) == []
+
+def test_follow_events_continues_after_last_seen(db_session):
+    """Verifies following the log yields old events, then new ones as they are committed."""
+    habit = _create_habit(db_session)
+    stop = threading.Event()
+    # Each poll opens its own session on the test connection
+    stream = follow_events(lambda: Session(bind=db_session.bind), poll_interval=0, stop=stop, batch_size=2)
+
+    assert next(stream).event_type == HABIT_CREATED
+    habit.complete(db_session, datetime(2024, 5, 1, 8, 0, tzinfo=UTC))
+    habit.complete(db_session, datetime(2024, 5, 2, 8, 0, tzinfo=UTC))
+    db_session.commit()
+    assert [next(stream).data["completed_at"][:10] for _ in range(2)] == ["2024-05-01", "2024-05-02"]
+    stop.set()
+    assert list(stream) == []
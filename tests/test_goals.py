@@ -0,0 +1,104 @@
+import pytest
+from datetime import datetime, timedelta, UTC
+import analytics
+from models import Habit, HabitEvent, GOAL_COMPLETIONS, GOAL_STREAK, HABIT_COMPLETION_REMOVED
+from readmodels import load_goal_progress
+
+START = datetime(2024, 5, 1, 8, 0, tzinfo=UTC)
+
+def _habit(session, name="Exercise", periodicity="daily"):
+    habit = Habit(name=name, periodicity=periodicity, created_at=START - timedelta(days=30))
+    session.add(habit)
+    session.commit()
+    return habit
+
+def test_completion_goal_counts_new_completions(db_session):
+    """Verifies completion goals count completions made after they were set, once per day."""
+    habit = _habit(db_session)
+    habit.complete(db_session, START - timedelta(days=1))
+    goal = habit.add_goal(GOAL_COMPLETIONS, 3, START)
+
+    habit.complete(db_session, START)
+    habit.complete(db_session, START + timedelta(hours=2))  # Same day, still one completion
+    habit.complete(db_session, START + timedelta(days=1))
+    db_session.commit()
+    assert (goal.progress, goal.achieved_at) == (2, None)
+
+    habit.complete(db_session, START + timedelta(days=2))
+    db_session.commit()
+    assert goal.progress == 3
+    assert goal.achieved_at.replace(tzinfo=UTC) == START + timedelta(days=2)
+
+def test_streak_goal_keeps_best_streak(db_session):
+    """Ensures streak goals start at the current streak and keep the longest one reached."""
+    habit = _habit(db_session)
+    for day in range(2):
+        habit.complete(db_session, START + timedelta(days=day))
+    goal = habit.add_goal(GOAL_STREAK, 4, START + timedelta(days=1))
+    assert goal.progress == 2
+
+    habit.complete(db_session, START + timedelta(days=2))
+    habit.complete(db_session, START + timedelta(days=5))
+    db_session.commit()
+    assert (habit.current_streak, goal.progress, goal.achieved_at) == (1, 3, None)
+
+    for day in range(6, 9):
+        habit.complete(db_session, START + timedelta(days=day))
+    assert goal.progress == 4 and goal.achieved_at is not None
+
+def test_remove_completion_updates_counters(db_session):
+    """Tests removing a completion lowers the counts, reopens achieved goals and logs an event."""
+    habit = _habit(db_session)
+    completions_goal = habit.add_goal(GOAL_COMPLETIONS, 3, START - timedelta(days=1))
+    streak_goal = habit.add_goal(GOAL_STREAK, 3, START - timedelta(days=1))
+    for day in range(3):
+        habit.complete(db_session, START + timedelta(days=day))
+    db_session.commit()
+    assert completions_goal.achieved_at is not None and streak_goal.achieved_at is not None
+
+    middle = habit.daily_completions[1]
+    habit.remove_completion(db_session, middle, START + timedelta(days=2))
+    db_session.commit()
+
+    assert habit.completion_count == 2
+    assert (habit.current_streak, habit.max_streak) == (1, 1)
+    assert habit.last_completed_at.replace(tzinfo=UTC) == START + timedelta(days=2)
+    assert (completions_goal.progress, completions_goal.achieved_at) == (2, None)
+    assert (streak_goal.progress, streak_goal.achieved_at) == (1, None)
+    assert db_session.query(HabitEvent).filter_by(event_type=HABIT_COMPLETION_REMOVED).count() == 1
+
+    other = _habit(db_session, "Other")
+    with pytest.raises(ValueError):
+        other.remove_completion(db_session, habit.daily_completions[0])
+
+@pytest.mark.parametrize("kind, target", [("monthly", 3), (GOAL_STREAK, 0)])
+def test_add_goal_rejects_invalid(db_session, kind, target):
+    """Ensures unknown goal kinds and targets below 1 raise ValueError."""
+    habit = _habit(db_session)
+    with pytest.raises(ValueError):
+        habit.add_goal(kind, target)
+
+def test_goal_analytics(db_session):
+    """Verifies goal progress and achievement counts are read from the stored counters of active habits."""
+    exercise = _habit(db_session)
+    read = _habit(db_session, "Read", "weekly")
+    deleted = _habit(db_session, "Deleted")
+    exercise.add_goal(GOAL_COMPLETIONS, 1, START)
+    open_goal = exercise.add_goal(GOAL_STREAK, 10, START)
+    read.add_goal(GOAL_COMPLETIONS, 1, START)
+    deleted.add_goal(GOAL_COMPLETIONS, 1, START)
+    exercise.complete(db_session, START + timedelta(hours=1))
+    read.complete(db_session, START + timedelta(days=1))
+    deleted.complete(db_session, START)
+    deleted.soft_delete()
+    db_session.commit()
+
+    assert analytics.get_goal_stats(db_session) == {'total': 3, 'achieved': 2, 'open': 1}
+    achieved = analytics.get_achieved_goals(db_session)
+    assert [goal['name'] for goal in achieved] == ["Read", "Exercise"]
+    assert [goal['name'] for goal in analytics.get_achieved_goals(db_session, START + timedelta(hours=2))] == ["Read"]
+
+    progress = load_goal_progress(db_session, [exercise.id, deleted.id])
+    assert list(progress) == [exercise.id]
+    assert [(goal.kind, goal.progress) for goal in progress[exercise.id]] == [(GOAL_COMPLETIONS, 1), (GOAL_STREAK, 1)]
+    assert [goal.id for goal in load_goal_progress(db_session, achieved=False)[exercise.id]] == [open_goal.id]
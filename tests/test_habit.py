@@ -71,16 +71,20 @@ def test_complete_weekly_habit(db_session):
     assert habit.weekly_completions[0].week_start == habit._get_week_start(completion_time)
 
 def test_multiple_completions_same_day(db_session):
-    """Confirms multiple completions are allowed within the same day."""
+    """Confirms multiple completions within the same day are merged into one record."""
     habit = Habit(name="Multiple Test", periodicity="daily")
     db_session.add(habit)
     db_session.commit()
     
-    base_time = datetime.now(UTC)
+    base_time = datetime.now(UTC).replace(hour=8)
     habit.complete(db_session, base_time)
     habit.complete(db_session, base_time + timedelta(hours=2))
+    db_session.commit()
     
-    assert len(habit.daily_completions) == 2
+    assert len(habit.daily_completions) == 1
+    assert habit.daily_completions[0].completed_at.replace(tzinfo=UTC) == base_time + timedelta(hours=2)
+    assert habit.completion_count == 1
+    assert habit.current_streak == 1
 
 def test_invalid_periodicity(db_session):
     """Ensures habit creation fails with unsupported periodicity values."""
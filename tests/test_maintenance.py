@@ -0,0 +1,204 @@
+import pytest
+from datetime import datetime, timedelta, UTC
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+from models import Habit, DailyCompletion, WeeklyCompletion, CompletionRun, get_active_habit
+from database import create_test_engine
+from maintenance import (
+    refresh_stale_streaks, compact_daily_completions, archive_completions, recompute_streaks,
+    purge_deleted_habits,
+)
+
+def test_refresh_stale_streaks_resets_lapsed_habits(db_session):
+    """Verifies lapsed daily and weekly streaks are reset while active ones are kept."""
+    base_time = datetime.now(UTC)
+    active_daily = Habit(name="Active daily", periodicity="daily")
+    lapsed_daily = Habit(name="Lapsed daily", periodicity="daily")
+    active_weekly = Habit(name="Active weekly", periodicity="weekly")
+    lapsed_weekly = Habit(name="Lapsed weekly", periodicity="weekly")
+    db_session.add_all([active_daily, lapsed_daily, active_weekly, lapsed_weekly])
+    db_session.commit()
+
+    active_daily.complete(db_session, base_time - timedelta(days=1))
+    lapsed_daily.complete(db_session, base_time - timedelta(days=2))
+    active_weekly.complete(db_session, base_time - timedelta(days=7))
+    lapsed_weekly.complete(db_session, base_time - timedelta(days=8))
+    db_session.commit()
+    assert all(h.current_streak == 1 for h in [active_daily, lapsed_daily, active_weekly, lapsed_weekly])
+
+    assert refresh_stale_streaks(db_session, base_time) == 2
+
+    assert active_daily.current_streak == 1
+    assert lapsed_daily.current_streak == 0
+    assert active_weekly.current_streak == 1
+    assert lapsed_weekly.current_streak == 0
+    for habit in [active_daily, lapsed_daily, active_weekly, lapsed_weekly]:
+        assert habit.current_streak == habit.calculate_streak(base_time)
+
+def test_refresh_stale_streaks_never_completed(db_session):
+    """Ensures a stored streak without any completion is reset."""
+    habit = Habit(name="Never", periodicity="daily", current_streak=3)
+    db_session.add(habit)
+    db_session.commit()
+
+    assert refresh_stale_streaks(db_session) == 1
+    assert habit.current_streak == 0
+
+def test_refresh_stale_streaks_requires_aware_time(db_session):
+    """Ensures naive reference times are rejected."""
+    with pytest.raises(ValueError):
+        refresh_stale_streaks(db_session, datetime.now())
+
+def test_compact_daily_completions_removes_duplicates(db_session):
+    """Verifies compaction keeps the latest completion per day and restores the unique index."""
+    habit = Habit(name="Legacy", periodicity="daily")
+    db_session.add(habit)
+    db_session.commit()
+
+    # Counts the three completions inserted below
+    goal = habit.add_goal("completions", 3, datetime(2024, 3, 5, 7, 0, tzinfo=UTC))
+    goal.update_progress(3, datetime(2024, 3, 6, 9, 0, tzinfo=UTC))
+    db_session.commit()
+
+    db_session.execute(text("DROP INDEX uq_completions_habit_day"))
+    for completed_at in ["2024-03-05 08:00:00.000000", "2024-03-05 20:00:00.000000",
+                         "2024-03-06 09:00:00.000000"]:
+        db_session.execute(
+            text("INSERT INTO completions (habit_id, kind, completed_at, period_start) "
+                 "VALUES (:habit_id, 'daily', :completed_at, date(:completed_at))"),
+            {"habit_id": habit.id, "completed_at": completed_at},
+        )
+    db_session.commit()
+
+    assert compact_daily_completions(db_session) == 1
+    db_session.refresh(goal)
+
+    completions = db_session.query(DailyCompletion).order_by(DailyCompletion.day).all()
+    assert [c.completed_at.hour for c in completions] == [20, 9]
+    assert [str(c.day) for c in completions] == ["2024-03-05", "2024-03-06"]
+    assert db_session.get(Habit, habit.id).completion_count == 2
+    # The removed duplicate no longer counts towards the goal
+    assert (goal.progress, goal.achieved_at) == (2, None)
+    index_names = {index["name"] for index in inspect(db_session.get_bind()).get_indexes("completions")}
+    assert "uq_completions_habit_day" in index_names
+
+def _scramble_streaks(session, habits):
+    """Overwrite the stored streaks and return the values calculated by the ORM."""
+    expected = {h.id: (h.calculate_streak(), h.calculate_max_streak()) for h in habits}
+    session.query(Habit).update({Habit.current_streak: 42, Habit.max_streak: 42})
+    session.commit()
+    return expected
+
+def _build_history(session, base_time):
+    """Create daily, weekly and custom habits with gaps, duplicates and archived runs."""
+    daily = Habit(name="Daily", periodicity="daily")
+    lapsed = Habit(name="Lapsed", periodicity="daily")
+    weekly = Habit(name="Weekly", periodicity="weekly")
+    never = Habit(name="Never", periodicity="daily")
+    every_other_day = Habit(name="Every other day", periodicity="every 2 days")
+    three_a_week = Habit(name="Three a week", periodicity="3 times per week")
+    session.add_all([daily, lapsed, weekly, never, every_other_day, three_a_week])
+    session.commit()
+    for days_ago in [400, 399, 398, 10, 2, 1, 0]:
+        daily.complete(session, base_time - timedelta(days=days_ago))
+    for days_ago in [9, 8, 7, 5]:
+        lapsed.complete(session, base_time - timedelta(days=days_ago))
+    for days_ago in [35, 21, 14, 13, 7, 0]:
+        weekly.complete(session, base_time - timedelta(days=days_ago))
+    for days_ago in [402, 400, 398, 6, 4, 3, 0]:
+        every_other_day.complete(session, base_time - timedelta(days=days_ago))
+    for days_ago in [410, 409, 408, 403, 402, 401, 30, 29, 28, 21, 20, 14, 13, 12, 2, 1, 0]:
+        three_a_week.complete(session, base_time - timedelta(days=days_ago))
+    session.commit()
+    archive_completions(session, 365, base_time)
+    return [daily, lapsed, weekly, never, every_other_day, three_a_week]
+
+def test_recompute_streaks_in_process(db_session):
+    """Verifies recomputed streaks match the ORM calculation and only changed habits are written."""
+    habits = _build_history(db_session, datetime.now(UTC))
+    expected = _scramble_streaks(db_session, habits)
+
+    assert recompute_streaks(db_session, workers=1, partition_size=3) == len(habits)
+    assert {h.id: (h.current_streak, h.max_streak) for h in habits} == expected
+    assert recompute_streaks(db_session) == 0
+
+def test_recompute_streaks_process_pool(tmp_path):
+    """Ensures the worker processes produce the same streaks as the ORM for a database file."""
+    engine = create_test_engine(tmp_path / "recompute.db")
+    with Session(engine) as session:
+        habits = _build_history(session, datetime.now(UTC))
+        expected = _scramble_streaks(session, habits)
+        checked = []
+
+        assert recompute_streaks(session, workers=2, partition_size=1, progress=checked.append) == len(habits)
+        assert sum(checked) == len(habits)
+        assert {h.id: (h.current_streak, h.max_streak) for h in habits} == expected
+    engine.dispose()
+
+def test_recompute_streaks_in_outer_transaction(tmp_path):
+    """Ensures a session inside a caller's transaction is recomputed in process, since workers can't see its data."""
+    engine = create_test_engine(tmp_path / "recompute.db")
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        session = Session(bind=connection, join_transaction_mode="create_savepoint")
+        habits = _build_history(session, datetime.now(UTC))
+        expected = _scramble_streaks(session, habits)
+
+        assert recompute_streaks(session, workers=2, partition_size=1) == len(habits)
+        assert {h.id: (h.current_streak, h.max_streak) for h in habits} == expected
+        session.close()
+        transaction.rollback()
+    engine.dispose()
+
+def test_recompute_streaks_validation(db_session):
+    """Tests invalid worker and partition settings are rejected."""
+    with pytest.raises(ValueError):
+        recompute_streaks(db_session, partition_size=0)
+    with pytest.raises(ValueError):
+        recompute_streaks(db_session, workers=0)
+
+def test_purge_deleted_habits_in_chunks(db_session):
+    """Verifies the purge removes deleted habits with their completions and runs, leaving active ones."""
+    base_time = datetime.now(UTC)
+    kept = Habit(name="Kept", periodicity="daily")
+    daily = Habit(name="Deleted daily", periodicity="daily")
+    weekly = Habit(name="Deleted weekly", periodicity="weekly")
+    db_session.add_all([kept, daily, weekly])
+    db_session.commit()
+    for days_ago in [400, 399, 5, 4, 3, 2, 1]:
+        kept.complete(db_session, base_time - timedelta(days=days_ago))
+        daily.complete(db_session, base_time - timedelta(days=days_ago))
+    for weeks_ago in range(3):
+        weekly.complete(db_session, base_time - timedelta(weeks=weeks_ago))
+    db_session.commit()
+    archive_completions(db_session, 365, base_time)
+    daily.add_goal("streak", 30)
+    kept.add_goal("streak", 30)
+    daily.soft_delete()
+    weekly.soft_delete()
+    db_session.commit()
+    assert get_active_habit(db_session, daily.id) is None
+    assert get_active_habit(db_session, kept.id) is kept
+
+    result = purge_deleted_habits(db_session, batch_size=2)
+
+    assert (result.habits, result.completions, result.runs, result.goals) == (2, 8, 1, 1)
+    assert db_session.query(Habit.name).all() == [("Kept",)]
+    assert db_session.query(DailyCompletion).count() == 5
+    assert db_session.query(WeeklyCompletion).count() == 0
+    assert db_session.query(CompletionRun).count() == 1
+    assert purge_deleted_habits(db_session).habits == 0
+
+def test_purge_keeps_habits_deleted_after_start(db_session):
+    """Ensures habits deleted after the purge's reference time are left for the next purge."""
+    habit = Habit(name="Deleted later", periodicity="daily")
+    db_session.add(habit)
+    db_session.commit()
+    habit.complete(db_session)
+    habit.soft_delete()
+    db_session.commit()
+
+    assert purge_deleted_habits(db_session, at_time=datetime.now(UTC) - timedelta(hours=1)).habits == 0
+    assert db_session.query(DailyCompletion).count() == 1
+    with pytest.raises(ValueError):
+        purge_deleted_habits(db_session, batch_size=0)
@@ -0,0 +1,136 @@
+import pytest
+from datetime import datetime, timedelta, UTC
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import sessionmaker
+from database import create_test_engine
+from maintenance import archive_completions
+from models import Habit, Completion, CompletionRun
+from periodindex import PeriodIndex, build_period_index, enable_period_index, disable_period_index
+
+START = datetime(2024, 1, 1, 9, 0, tzinfo=UTC)
+NOW = START + timedelta(days=60, hours=2)
+
+@pytest.fixture
+def index_db(tmp_path):
+    """A database file with habits of several periodicities and the path for its index."""
+    engine = create_test_engine(tmp_path / "habits.db")
+    factory = sessionmaker(bind=engine)
+    with factory() as session:
+        for name, periodicity, days in [
+            ("Read", "daily", [d for d in range(60) if d % 9]),
+            ("Gym", "weekly", range(0, 60, 7)),
+            ("Swim", "3 times per week", [d for d in range(60) if d % 7 in (0, 2, 4, 5)]),
+            ("Idle", "daily", []),
+        ]:
+            habit = Habit(name=name, periodicity=periodicity, created_at=START - timedelta(days=1))
+            session.add(habit)
+            session.commit()
+            for day in days:
+                habit.record_completion(session, START + timedelta(days=day, minutes=day, microseconds=day))
+            habit.refresh_streaks(NOW)
+            session.commit()
+        archive_completions(session, 30, NOW)
+    yield engine, factory, str(tmp_path / "habits.idx")
+    disable_period_index()
+    engine.dispose()
+
+def _results(factory):
+    """Streaks and last completion of every habit by name."""
+    with factory() as session:
+        return {
+            habit.name: (habit.calculate_streak(NOW), habit.calculate_max_streak(), habit.get_last_completion())
+            for habit in session.scalars(select(Habit).order_by(Habit.id))
+        }
+
+def _utc(results):
+    """Results with naive UTC times made timezone-aware."""
+    return {
+        name: (*streaks, last if last is None or last.tzinfo else last.replace(tzinfo=UTC))
+        for name, (*streaks, last) in results.items()
+    }
+
+def test_index_matches_database(index_db):
+    """Verifies lookups in the index give the same streaks and last completion without querying completions."""
+    engine, factory, path = index_db
+    expected = _utc(_results(factory))
+    result = build_period_index(engine, path)
+    with factory() as session:
+        assert session.scalar(select(func.count(Completion.id))) == result.completions
+        assert session.scalar(select(func.count(CompletionRun.id))) > 0
+    assert result.habits == 4
+    enable_period_index(path, factory)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert _results(factory) == expected
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    # Only the habits themselves are loaded
+    assert len([statement for statement in statements if statement.startswith("SELECT")]) == 1
+
+def test_committed_changes_are_appended(index_db):
+    """Tests completions added, moved and removed through a session reach other open indexes on commit only."""
+    engine, factory, path = index_db
+    build_period_index(engine, path)
+    enable_period_index(path, factory)
+    other = PeriodIndex(path)
+
+    with factory() as session:
+        read = session.scalars(select(Habit).where(Habit.name == "Read")).one()
+        read.add_completion(session, START + timedelta(days=54, hours=1), NOW)
+        # Not committed yet: the session's own changes are read from the database
+        assert read.calculate_max_streak() == 14
+        session.commit()
+        assert read.calculate_max_streak() == 14
+        history = other.lookup(read.id, read.created_at)
+        assert (START + timedelta(days=54, hours=1)).date() in history.completion_dates()
+
+        latest = session.scalars(
+            select(Completion).where(Completion.habit_id == read.id).order_by(Completion.completed_at.desc())
+        ).first()
+        read.remove_completion(session, latest, NOW)
+        session.rollback()
+        assert len(other.lookup(read.id, read.created_at).completion_times) == len(history.completion_times)
+
+        read.move_completion(session, latest, START + timedelta(days=45), NOW)
+        session.commit()
+        moved = other.lookup(read.id, read.created_at)
+        assert moved.last_completed_at() == START + timedelta(days=58, minutes=58, microseconds=58)
+        assert (START + timedelta(days=45)).date() in moved.completion_dates()
+    other.close()
+
+    disable_period_index()
+    with_database = _utc(_results(factory))
+    enable_period_index(path, factory)
+    assert _utc(_results(factory)) == with_database
+
+def test_uncovered_habits_use_the_database(index_db):
+    """Ensures habits created after the build, or reusing an ID, are not served from the index."""
+    engine, factory, path = index_db
+    build_period_index(engine, path)
+    index = enable_period_index(path, factory)
+
+    with factory() as session:
+        new = Habit(name="New", periodicity="daily", created_at=START)
+        session.add(new)
+        session.commit()
+        new.complete(session, START + timedelta(days=1))
+        session.commit()
+        assert index.lookup(new.id, new.created_at) is None
+        assert new.calculate_max_streak() == 1
+
+        read = session.scalars(select(Habit).where(Habit.name == "Read")).one()
+        assert index.lookup(read.id, read.created_at + timedelta(seconds=1)) is None
+
+        # A rebuilt file is picked up on the next lookup
+        build_period_index(engine, path)
+        assert index.lookup(new.id, new.created_at).completion_dates() == [(START + timedelta(days=1)).date()]
+
+def test_rejects_other_files(tmp_path):
+    """Verifies opening a file that is no period index raises ValueError."""
+    path = tmp_path / "habits.db"
+    path.write_bytes(b"SQLite format 3\x00")
+    with pytest.raises(ValueError):
+        PeriodIndex(str(path))
@@ -0,0 +1,53 @@
+import pytest
+from datetime import date, datetime, timedelta, UTC
+from periods import DAILY, WEEKLY, PeriodRule, get_period_rule
+
+def test_get_period_rule_parses_custom_periodicities():
+    """Verifies supported spellings parse into rules with canonical names."""
+    assert get_period_rule("daily") is DAILY
+    assert get_period_rule("Weekly") is WEEKLY
+    assert get_period_rule("every 3 days") == PeriodRule("every 3 days", 3)
+    assert get_period_rule("Every  1 day") is DAILY
+    assert get_period_rule("every 7 days") is WEEKLY
+    assert get_period_rule("3 times per week") == PeriodRule("3 times per week", 7, 3)
+    assert get_period_rule("1 time a week") is WEEKLY
+
+@pytest.mark.parametrize("periodicity", ["monthly", "every 0 days", "8 times per week", "", None])
+def test_get_period_rule_rejects_unsupported(periodicity):
+    """Ensures unsupported periodicities raise ValueError."""
+    with pytest.raises(ValueError):
+        get_period_rule(periodicity)
+
+def test_period_key_aligns_periods():
+    """Tests weekly periods start on Mondays and longer periods tile the calendar without gaps."""
+    wednesday = date(2024, 5, 1)
+    assert WEEKLY.period_key(wednesday) == date(2024, 4, 29)
+    assert WEEKLY.period_key(datetime(2024, 5, 5, 23, 0, tzinfo=UTC)) == date(2024, 4, 29)
+    rule = get_period_rule("every 3 days")
+    start = rule.period_key(wednesday)
+    keys = [rule.period_key(start + timedelta(days=offset)) for offset in range(9)]
+    assert len(set(keys)) == 3
+    assert all(keys.count(key) == 3 for key in keys)
+    assert all(b - a == timedelta(days=3) for a, b in zip(sorted(set(keys)), sorted(set(keys))[1:]))
+
+def test_completed_periods_require_quota():
+    """Verifies a period only counts once it holds the quota of completions."""
+    rule = get_period_rule("2 times per week")
+    monday = date(2024, 4, 29)
+    dates = [monday, monday + timedelta(days=3), monday + timedelta(days=7), monday + timedelta(days=15)]
+    dates += [monday + timedelta(days=16), monday + timedelta(days=18)]
+    assert rule.completed_periods(dates) == [
+        (monday, monday + timedelta(days=3)),
+        (monday + timedelta(days=14), monday + timedelta(days=18)),
+    ]
+
+def test_streaks_with_archived_runs():
+    """Ensures archived runs and recent completions merge into one run."""
+    rule = get_period_rule("every 2 days")
+    start = rule.period_key(date(2024, 5, 1))
+    archived = [(start, start + timedelta(days=4))]
+    recent = [start + timedelta(days=6), start + timedelta(days=9)]
+    assert rule.streaks(recent, archived, start + timedelta(days=10)) == (5, 5)
+    assert rule.streaks(recent, archived, start + timedelta(days=12)) == (0, 5)
+    assert rule.streaks([], archived, start + timedelta(days=5)) == (3, 3)
+    assert rule.streaks([]) == (0, 0)
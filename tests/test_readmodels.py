@@ -0,0 +1,93 @@
+import pytest
+from dataclasses import FrozenInstanceError
+from datetime import datetime, timedelta, UTC
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database import create_test_engine
+from models import Habit
+from readmodels import SummaryCache, load_habit_summaries, iter_habit_summary_pages
+
+def test_load_habit_summaries(db_session):
+    """Verifies summaries carry the stored habit columns and can be filtered by periodicity."""
+    daily = Habit(name="Daily", periodicity="daily")
+    weekly = Habit(name="Weekly", periodicity="weekly")
+    db_session.add_all([daily, weekly])
+    db_session.commit()
+    daily.complete(db_session)
+    db_session.commit()
+
+    summaries = load_habit_summaries(db_session)
+    assert [s.name for s in summaries] == ["Daily", "Weekly"]
+    assert summaries[0].current_streak == 1
+    assert summaries[0].last_completed_at is not None
+    assert [s.name for s in load_habit_summaries(db_session, "weekly")] == ["Weekly"]
+
+    with pytest.raises(FrozenInstanceError):
+        summaries[0].name = "Changed"
+    assert not hasattr(summaries[0], "__dict__")
+
+def test_iter_habit_summary_pages_by_id(db_session):
+    """Verifies keyset pages cover every habit once, in id order."""
+    db_session.add_all([Habit(name=f"Habit {i}", periodicity="daily") for i in range(7)])
+    db_session.commit()
+
+    pages = list(iter_habit_summary_pages(db_session, page_size=3))
+    assert [len(page) for page in pages] == [3, 3, 1]
+    ids = [habit.id for page in pages for habit in page]
+    assert ids == sorted(ids) and len(set(ids)) == 7
+
+def test_iter_habit_summary_pages_sorted_with_ties(db_session):
+    """Tests descending sort on a column with duplicate values and a periodicity filter."""
+    streaks = [3, 1, 3, 2, 3, 0]
+    db_session.add_all([
+        Habit(name=f"Habit {i}", periodicity="daily", current_streak=streak)
+        for i, streak in enumerate(streaks)
+    ] + [Habit(name="Weekly", periodicity="weekly", current_streak=5)])
+    db_session.commit()
+
+    pages = iter_habit_summary_pages(db_session, page_size=2, periodicity="daily",
+                                     sort="current_streak", descending=True)
+    habits = [habit for page in pages for habit in page]
+    assert [h.current_streak for h in habits] == sorted(streaks, reverse=True)
+    assert len({h.id for h in habits}) == len(streaks)
+    assert all(h.periodicity == "daily" for h in habits)
+
+def test_iter_habit_summary_pages_invalid_arguments(db_session):
+    """Ensures unsupported sort columns and page sizes are rejected."""
+    with pytest.raises(ValueError):
+        next(iter_habit_summary_pages(db_session, sort="description"))
+    with pytest.raises(ValueError):
+        next(iter_habit_summary_pages(db_session, page_size=0))
+
+def test_summary_cache_reloads_on_changes(tmp_path):
+    """Verifies cached summaries are reused until the owner invalidates them or another connection commits."""
+    engine = create_test_engine(tmp_path / "habits.db")
+    with engine.connect() as connection, Session(bind=connection) as session, Session(bind=engine) as other:
+        read = Habit(name="Read", periodicity="daily")
+        session.add_all([read, Habit(name="read", periodicity="weekly")])
+        session.commit()
+        read_id = read.id
+        cache = SummaryCache(session)
+        assert [habit.name for habit in cache.find("READ")] == ["Read", "read"]
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        assert cache.names() == ["Read", "read"] and cache.get(read_id).current_streak == 0
+        assert cache.summaries("weekly")[0].name == "read"
+        assert [statement for statement in statements if statement.startswith("SELECT")] == []
+
+        # Commits on the cache's own connection don't change the data version
+        read.complete(session)
+        session.commit()
+        assert cache.get(read_id).current_streak == 0
+        cache.invalidate()
+        assert cache.get(read_id).current_streak == 1
+
+        # Like the shell after each command, end the read transaction so the other connection can commit
+        session.rollback()
+        other.add(Habit(name="Gym", periodicity="weekly"))
+        other.commit()
+        assert cache.names() == ["Read", "read", "Gym"]
+        event.remove(engine, "before_cursor_execute", listener)
+    engine.dispose()
@@ -0,0 +1,116 @@
+import json
+import threading
+from datetime import datetime, time, timedelta, UTC
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from models import Habit
+from reminders import FileSink, ReminderSink, WebhookSink, find_due_habits, next_run, parse_times, send_reminders
+
+# A Wednesday evening
+NOW = datetime(2024, 5, 1, 20, 0, tzinfo=UTC)
+
+def _habit(session, name, periodicity, days_ago=()):
+    habit = Habit(name=name, periodicity=periodicity, created_at=NOW - timedelta(days=30))
+    session.add(habit)
+    session.commit()
+    for days in days_ago:
+        habit.complete(session, NOW - timedelta(days=days))
+    session.commit()
+    return habit
+
+def test_next_due_follows_completions(db_session):
+    """Verifies next_due_at is the end of the earliest period without enough completions."""
+    daily = _habit(db_session, "Daily", "daily")
+    # Without completions the first period after creation is due
+    assert daily.next_due_at.replace(tzinfo=UTC) == datetime(2024, 4, 2, tzinfo=UTC)
+    daily.complete(db_session, NOW)
+    assert daily.next_due_at.replace(tzinfo=UTC) == datetime(2024, 5, 3, tzinfo=UTC)
+
+    weekly = _habit(db_session, "Weekly", "weekly", [7])
+    assert weekly.next_due_at.replace(tzinfo=UTC) == datetime(2024, 5, 6, tzinfo=UTC)
+
+    three_a_week = _habit(db_session, "Three a week", "3 times per week", [2, 1])
+    assert three_a_week.next_due_at.replace(tzinfo=UTC) == datetime(2024, 5, 6, tzinfo=UTC)
+    three_a_week.complete(db_session, NOW)
+    assert three_a_week.next_due_at.replace(tzinfo=UTC) == datetime(2024, 5, 13, tzinfo=UTC)
+
+def test_find_due_habits(db_session):
+    """Ensures only active habits with an open current period ending in the window are found."""
+    _habit(db_session, "Done today", "daily", [2, 1, 0])
+    at_risk = _habit(db_session, "At risk", "daily", [2, 1])
+    lapsed = _habit(db_session, "Lapsed", "daily", [5, 4])
+    _habit(db_session, "Weekly done", "weekly", [1])
+    weekly_open = _habit(db_session, "Weekly open", "weekly", [7])
+    deleted = _habit(db_session, "Deleted", "daily", [1])
+    deleted.soft_delete()
+    db_session.commit()
+
+    reminders = find_due_habits(db_session, NOW)
+    assert [(r.name, r.current_streak) for r in reminders] == [("At risk", 2), ("Lapsed", 0)]
+    assert {r.due_at for r in reminders} == {datetime(2024, 5, 2, tzinfo=UTC)}
+    # The missed deadline was moved to the end of the current period
+    db_session.refresh(lapsed)
+    assert lapsed.next_due_at.replace(tzinfo=UTC) == datetime(2024, 5, 2, tzinfo=UTC)
+
+    names = [r.name for r in find_due_habits(db_session, NOW + timedelta(days=4))]
+    assert names == ["Done today", "At risk", "Lapsed", "Weekly open"]
+    assert find_due_habits(db_session, NOW, within=timedelta(hours=1)) == []
+    assert at_risk.id and weekly_open.id
+
+def test_file_sink_appends_json_lines(db_session, tmp_path):
+    """Tests the file sink writes one JSON object per reminder."""
+    _habit(db_session, "At risk", "daily", [1])
+    sink = FileSink(str(tmp_path / "reminders.jsonl"))
+    assert send_reminders(lambda: db_session, sink, NOW) == 1
+    sink.close()
+
+    lines = (tmp_path / "reminders.jsonl").read_text().splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["At risk"]
+    assert json.loads(lines[0])["due_at"] == "2024-05-02T00:00:00+00:00"
+
+def test_sink_without_send_is_rejected():
+    """Ensures a sink that doesn't implement send fails when it is created."""
+    class SilentSink(ReminderSink):
+        pass
+
+    with pytest.raises(TypeError):
+        SilentSink()
+
+def test_webhook_sink_posts_batches(db_session):
+    """Verifies the webhook sink posts the reminders in batches and counts failed deliveries."""
+    for name in ("A", "B", "C"):
+        _habit(db_session, name, "daily", [1])
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    httpd = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    try:
+        sink = WebhookSink(f"http://127.0.0.1:{httpd.server_address[1]}/", batch_size=2)
+        sink.send(find_due_habits(db_session, NOW))
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    assert [[r["name"] for r in body["reminders"]] for body in received] == [["A", "B"], ["C"]]
+    assert sink.failures == 0
+
+    sink.send(find_due_habits(db_session, NOW))
+    assert sink.failures == 2
+
+def test_schedule_times():
+    """Tests times of day parse and the next run wraps to the following day."""
+    times = parse_times(["20:00", "09:30"])
+    assert times == [time(9, 30), time(20, 0)]
+    assert next_run(NOW - timedelta(hours=12), times) == datetime(2024, 5, 1, 9, 30, tzinfo=UTC)
+    assert next_run(NOW, times) == datetime(2024, 5, 2, 9, 30, tzinfo=UTC)
+    with pytest.raises(ValueError):
+        parse_times(["25:00"])
@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy import delete, text
+from models import Habit
+from search import (
+    create_search_index, find_habits, pick_habit, resolve_habit,
+    MATCH_EXACT, MATCH_PREFIX, MATCH_SUBSTRING, MATCH_FUZZY,
+)
+
+NAMES = ["Morning run", "Morning pages", "Gym", "Go", "Read 100% books", "Exercise"]
+
+@pytest.fixture
+def habits(db_session):
+    """Habits whose names share prefixes and words."""
+    habits = [Habit(name=name, periodicity="daily") for name in NAMES]
+    db_session.add_all(habits)
+    db_session.commit()
+    return {habit.name: habit for habit in habits}
+
+def _found(session, query):
+    """Names and kinds of the matches of a search."""
+    return [(match.name, match.kind) for match in find_habits(session, query)]
+
+def test_find_habits(db_session, habits):
+    """Verifies names are found exactly, by prefix, by a part and with typos, ignoring case and spaces."""
+    assert _found(db_session, "  GYM ") == [("Gym", MATCH_EXACT)]
+    assert _found(db_session, "g") == [("Go", MATCH_PREFIX), ("Gym", MATCH_PREFIX)]
+    assert _found(db_session, "morning  RUN") == [("Morning run", MATCH_EXACT)]
+    assert _found(db_session, "pages") == [("Morning pages", MATCH_SUBSTRING)]
+    assert _found(db_session, "100%") == [("Read 100% books", MATCH_SUBSTRING)]
+    assert _found(db_session, "excercise") == [("Exercise", MATCH_FUZZY)]
+    assert _found(db_session, "swimming") == []
+
+def test_find_habits_by_short_prefix(db_session):
+    """Ensures one- and two-letter lookups find the exact name first among many names sharing the prefix."""
+    db_session.add_all([Habit(name=f"Habit {i}", periodicity="daily") for i in range(500)])
+    db_session.add_all([Habit(name=f"Go {i}", periodicity="daily") for i in range(100)])
+    db_session.add_all([Habit(name=name, periodicity="daily") for name in ("GO", "Gym", "Ga")])
+    db_session.commit()
+    db_session.query(Habit).filter(Habit.name == "Ga").one().soft_delete()
+    db_session.commit()
+
+    assert _found(db_session, "go")[0] == ("GO", MATCH_EXACT)
+    assert [match.kind for match in find_habits(db_session, "go", limit=10)][1:] == [MATCH_PREFIX] * 9
+    assert ("Gym", MATCH_PREFIX) in _found(db_session, "gy")
+    assert _found(db_session, "ga") == []
+    assert _found(db_session, "z") == []
+
+def test_search_index_follows_changes(db_session, habits):
+    """Ensures created, renamed, deleted and purged habits are found, or no longer found, right away."""
+    db_session.add(Habit(name="Swim", periodicity="weekly"))
+    habits["Gym"].name = "Weights"
+    habits["Go"].soft_delete()
+    db_session.commit()
+    assert _found(db_session, "swim") == [("Swim", MATCH_EXACT)]
+    assert _found(db_session, "weights") == [("Weights", MATCH_EXACT)]
+    assert _found(db_session, "gym") == []
+    assert _found(db_session, "go") == []
+
+    db_session.execute(delete(Habit).where(Habit.name == "Exercise"))
+    assert _found(db_session, "exercise") == []
+
+    # An upgraded database fills the new table with the active habits
+    connection = db_session.connection()
+    connection.exec_driver_sql("DROP TABLE habit_search")
+    assert create_search_index(connection) is True
+    assert create_search_index(connection) is False
+    assert connection.execute(text("SELECT count(*) FROM habit_search")).scalar() == 5
+
+def test_resolve_habit(db_session, habits):
+    """Tests habits are resolved by ID, name or a unique prefix, and ambiguous or misspelled names are refused."""
+    assert resolve_habit(db_session, str(habits["Gym"].id)) is habits["Gym"]
+    assert resolve_habit(db_session, "morning p") is habits["Morning pages"]
+    assert resolve_habit(db_session, "go") is habits["Go"]
+    assert resolve_habit(db_session, "books") is habits["Read 100% books"]
+
+    with pytest.raises(ValueError, match="several habits: 'Morning run'"):
+        resolve_habit(db_session, "morning")
+    with pytest.raises(ValueError, match="Did you mean 'Exercise'"):
+        resolve_habit(db_session, "excercise")
+    with pytest.raises(ValueError, match="not found"):
+        resolve_habit(db_session, "999")
+    with pytest.raises(ValueError):
+        pick_habit("  ", [])
@@ -0,0 +1,50 @@
+import random
+import pytest
+from datetime import datetime, UTC
+from models import Habit, DailyCompletion, WeeklyCompletion
+from seeding import PREDEFINED_HABITS, generate_habit_specs, seed_habits
+
+NOW = datetime(2024, 6, 12, 18, 0, tzinfo=UTC)
+
+def test_seed_predefined_habits(db_session):
+    """Verifies the predefined history and that stored stats match a full recalculation."""
+    result = seed_habits(db_session, PREDEFINED_HABITS, history_days=30, now=NOW, batch_size=7)
+
+    assert result.habits == 5
+    assert result.completions == db_session.query(DailyCompletion).count() + db_session.query(WeeklyCompletion).count()
+    habits = {h.name: h for h in db_session.query(Habit).all()}
+    assert len(habits["Read"].daily_completions) == 30
+    assert len(habits["Exercise"].daily_completions) == 22
+    assert len(habits["Clean kitchen"].weekly_completions) == 6
+    for habit in habits.values():
+        assert habit.current_streak == habit.calculate_streak(NOW)
+        assert habit.max_streak == habit.calculate_max_streak()
+        assert habit.completion_count == len(habit.daily_completions or habit.weekly_completions)
+        assert habit.last_completed_at == habit.get_last_completion()
+
+def test_seed_habits_is_deterministic(db_session):
+    """Ensures the same specs and seed produce the same completion history."""
+    def seeded_rows():
+        specs = generate_habit_specs(20, random.Random(7))
+        seed_habits(db_session, specs, history_days=60, seed=7, now=NOW, batch_size=50)
+        rows = sorted(
+            (c.habit.name, c.completed_at) for c in db_session.query(DailyCompletion).all()
+        ) + sorted(
+            (c.habit.name, c.completed_at) for c in db_session.query(WeeklyCompletion).all()
+        )
+        db_session.query(DailyCompletion).delete()
+        db_session.query(WeeklyCompletion).delete()
+        db_session.query(Habit).delete()
+        db_session.commit()
+        return rows
+
+    assert seeded_rows() == seeded_rows()
+
+def test_seed_habits_appends_after_existing_ids(db_session):
+    """Tests seeding into a database that already contains habits."""
+    db_session.add(Habit(name="Existing", periodicity="daily"))
+    db_session.commit()
+
+    seed_habits(db_session, PREDEFINED_HABITS[:2], history_days=5, now=NOW)
+
+    assert [h.name for h in db_session.query(Habit).order_by(Habit.id)] == ["Existing", "Exercise", "Read"]
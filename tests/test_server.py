@@ -0,0 +1,110 @@
+import http.client
+import json
+import threading
+import urllib.request
+from datetime import datetime, timedelta, UTC
+from urllib.error import HTTPError
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+from database import create_test_engine
+from models import Habit
+import server
+from server import HabitServer
+
+@pytest.fixture
+def api(tmp_path):
+    """Runs the HTTP API on a free port against its own database file."""
+    engine = create_test_engine(tmp_path / "api.db")
+    with Session(engine) as session:
+        session.add_all([Habit(name="Read", periodicity="daily"), Habit(name="Clean", periodicity="weekly")])
+        session.commit()
+    httpd = HabitServer(("127.0.0.1", 0), engine, quiet=True)
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+    engine.dispose()
+
+def request(url, method="GET", headers=None):
+    with urllib.request.urlopen(urllib.request.Request(url, method=method, headers=headers or {})) as response:
+        return response.status, response.headers, json.loads(response.read() or "null")
+
+def test_list_habits_with_etag(api):
+    """Verifies habit summaries are served with an ETag and unchanged data returns 304."""
+    status, headers, habits = request(f"{api}/habits")
+    assert status == 200
+    assert [h["name"] for h in habits] == ["Read", "Clean"]
+
+    with pytest.raises(HTTPError) as not_modified:
+        request(f"{api}/habits", headers={"If-None-Match": headers["ETag"]})
+    assert not_modified.value.code == 304
+
+    request(f"{api}/habits/1/complete", method="POST")
+    status, changed_headers, _ = request(f"{api}/habits", headers={"If-None-Match": headers["ETag"]})
+    assert status == 200
+    assert changed_headers["ETag"] != headers["ETag"]
+
+def test_complete_and_stats(api):
+    """Tests completing a habit and reading its stats and the analytics endpoints."""
+    _, _, summary = request(f"{api}/habits/1/complete", method="POST")
+    assert summary["current_streak"] == 1
+
+    _, _, stats = request(f"{api}/habits/1/stats")
+    assert stats == {"id": 1, "longest_streak": 1, "days_since_last_completion": 0}
+    _, _, longest = request(f"{api}/analytics/longest-streak")
+    assert longest == {"longest_streak": 1}
+    _, _, ranking = request(f"{api}/analytics/top?metric=current_streak&limit=1")
+    assert [entry["name"] for entry in ranking] == ["Read"]
+
+def test_lapsed_streaks_are_reset(tmp_path):
+    """Verifies habits whose streak lapsed since their last completion are served with a zero streak."""
+    engine = create_test_engine(tmp_path / "api.db")
+    with Session(engine) as session:
+        session.add(Habit(name="Lapsed", periodicity="daily", current_streak=5, max_streak=5,
+                          last_completed_at=datetime.now(UTC) - timedelta(days=10)))
+        session.commit()
+    httpd = HabitServer(("127.0.0.1", 0), engine, quiet=True)
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    try:
+        _, _, habits = request(f"http://127.0.0.1:{httpd.server_address[1]}/habits")
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        engine.dispose()
+    assert [(h["current_streak"], h["max_streak"]) for h in habits] == [(0, 5)]
+
+def test_errors(api):
+    """Ensures unknown habits, routes and invalid parameters return error responses."""
+    for path, code in [("/habits/99", 404), ("/unknown", 404), ("/analytics/top?metric=name", 400),
+                       ("/analytics/top?limit=0", 400), ("/analytics/top?limit=-1", 400)]:
+        with pytest.raises(HTTPError) as error:
+            request(f"{api}{path}")
+        assert error.value.code == code
+
+def test_post_body_is_drained(api):
+    """Verifies a POST body isn't read as the next request of a keep-alive connection."""
+    connection = http.client.HTTPConnection(api.removeprefix("http://"))
+    connection.request("POST", "/habits/1/complete", body=b'{"note": "GET /unknown HTTP/1.1"}')
+    response = connection.getresponse()
+    response.read()
+    assert response.status == 200
+    connection.request("GET", "/habits/1")
+    response = connection.getresponse()
+    assert response.status == 200
+    assert json.loads(response.read())["current_streak"] == 1
+    connection.close()
+
+@pytest.mark.parametrize("error, code", [(OperationalError("SELECT", {}, Exception("database is locked")), 503),
+                                         (IntegrityError("INSERT", {}, Exception("constraint failed")), 500)])
+def test_database_errors_return_json(api, monkeypatch, error, code):
+    """Ensures database errors are answered with a JSON error instead of a dropped connection."""
+    def fail(*args, **kwargs):
+        raise error
+    monkeypatch.setattr(server, "load_habit_summaries", fail)
+    with pytest.raises(HTTPError) as response:
+        request(f"{api}/habits")
+    assert response.value.code == code
+    assert "error" in json.loads(response.value.read())
@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from database import create_test_engine
+from main import HabitShell
+from models import Habit, HabitEvent, HABIT_DELETED
+
+@pytest.fixture
+def shell(tmp_path):
+    """A shell on a connection of its own to a database file with a few habits."""
+    engine = create_test_engine(tmp_path / "habits.db")
+    with Session(bind=engine) as session:
+        session.add_all([
+            Habit(name="Morning run", periodicity="daily"),
+            Habit(name="Morning pages", periodicity="daily"),
+            Habit(name="Gym", periodicity="weekly"),
+        ])
+        session.commit()
+    connection = engine.connect()
+    session = Session(bind=connection)
+    yield HabitShell(session), engine
+    session.close()
+    connection.close()
+    engine.dispose()
+
+def _run(shell, line):
+    """Run a command line the way cmdloop does."""
+    return shell.postcmd(shell.onecmd(line), line)
+
+def test_commands_find_habits_by_name_or_id(shell, capsys):
+    """Verifies commands take IDs or names and report unknown, misspelled or ambiguous habits."""
+    shell, engine = shell
+    _run(shell, "complete morning RUN")
+    _run(shell, "streak Morning run")
+    _run(shell, "streak morn")
+    _run(shell, "since gymm")
+    output = capsys.readouterr().out
+    assert "Longest run streak for 'Morning run': 1" in output
+    assert "'morn' matches several habits" in output and "Did you mean 'Gym' (ID 3)?" in output
+
+    _run(shell, "delete 3")
+    _run(shell, "since Gym")
+    _run(shell, "complete")
+    output = capsys.readouterr().out
+    assert "Habit 'Gym' deleted!" in output and "Habit 'Gym' not found" in output
+    assert "Name or ID of a habit is required" in output
+    with Session(bind=engine) as session:
+        assert session.scalars(select(HabitEvent.event_type).where(HabitEvent.habit_id == 3)).all() == [HABIT_DELETED]
+
+    assert _run(shell, "exit") is True
+
+def test_repeated_commands_are_served_from_the_cache(shell, capsys):
+    """Ensures listing and analytics don't query habits again until a habit changes."""
+    shell, engine = shell
+    _run(shell, "list")
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    for line in ["list", "list daily", "streak", "since Gym"]:
+        _run(shell, line)
+    assert [statement for statement in statements if statement.startswith("SELECT")] == []
+
+    with Session(bind=engine) as session:
+        session.get(Habit, 3).name = "Swim"
+        session.commit()
+    _run(shell, "since Swim")
+    event.remove(engine, "before_cursor_execute", listener)
+    assert "'Swim' was never completed" in capsys.readouterr().out
+
+def test_completes_habit_names(shell):
+    """Tests tab completion of names with spaces, where readline only replaces the last word."""
+    shell, _ = shell
+    assert shell.completenames("com") == ["complete"]
+    assert shell.complete_complete("mor", "complete mor", 9, 12) == ["Morning run", "Morning pages"]
+    assert shell.complete_complete("p", "complete Morning p", 17, 18) == ["pages"]
+    assert shell.complete_streak("", "streak ", 7, 7) == ["Morning run", "Morning pages", "Gym"]
@@ -0,0 +1,123 @@
+import random
+import pytest
+from datetime import datetime, timedelta, UTC
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+import analytics
+from database import create_test_engine
+from maintenance import archive_completions
+from models import Habit, Completion
+from snapshot import (
+    Snapshot, export_snapshot, get_habit_metrics, get_habits_by_periodicity, get_longest_run_streak,
+    get_longest_run_streak_for_habit, get_days_since_last_completion,
+)
+
+START = datetime(2024, 1, 1, 9, 0, tzinfo=UTC)
+NOW = START + timedelta(days=120, hours=3)
+PERIODICITIES = ["daily", "weekly", "every 3 days", "3 times per week"]
+
+@pytest.fixture
+def snapshot_db(tmp_path):
+    """A database file of its own, since the snapshot is read on a separate connection."""
+    engine = create_test_engine(tmp_path / "habits.db")
+    session = Session(bind=engine)
+    yield engine, session
+    session.close()
+    engine.dispose()
+
+def _seed(session, seed=0):
+    """Habits of every periodicity with random gaps, some of them deleted or never completed."""
+    rng = random.Random(seed)
+    habits = []
+    for number in range(12):
+        habit = Habit(name=f"Habit {number}", periodicity=PERIODICITIES[number % 4], created_at=START)
+        session.add(habit)
+        session.commit()
+        density = rng.choice([0, 0.4, 0.8, 0.95])
+        for day in range(118):
+            if rng.random() < density:
+                habit.record_completion(session, START + timedelta(days=day, hours=rng.randrange(12)))
+        habit.refresh_streaks(NOW)
+        habits.append(habit)
+    habits[5].soft_delete()
+    session.commit()
+    return habits
+
+@pytest.mark.parametrize("archive", [False, True])
+def test_snapshot_matches_database_analytics(snapshot_db, tmp_path, archive):
+    """Verifies the vectorized metrics of a snapshot equal the analytics on the database."""
+    engine, session = snapshot_db
+    habits = _seed(session)
+    if archive:
+        archive_completions(session, 60, NOW)
+        session.expire_all()
+
+    path = str(tmp_path / "snapshot.npz")
+    result = export_snapshot(engine, path, NOW)
+    snapshot = Snapshot.load(path)
+    assert (result.habits, snapshot.created_at) == (11, NOW)
+    assert (result.runs > 0) == archive
+
+    assert get_longest_run_streak(snapshot) == analytics.get_longest_run_streak(session)
+    for habit in habits:
+        assert get_longest_run_streak_for_habit(snapshot, habit.id) == \
+            analytics.get_longest_run_streak_for_habit(session, habit.id)
+    assert get_days_since_last_completion(snapshot, habits[0].id, NOW) == \
+        (NOW - habits[0].last_completed_at.replace(tzinfo=UTC)).days
+    for periodicity in PERIODICITIES:
+        indexes = get_habits_by_periodicity(snapshot, periodicity)
+        assert [int(habit_id) for habit_id in snapshot.habit_ids[indexes]] == [
+            habit.id for habit in analytics.get_habits_by_periodicity(session, periodicity)
+        ]
+
+def test_habit_metrics(snapshot_db, tmp_path):
+    """Tests the per-habit listing and habits that are missing or never completed."""
+    engine, session = snapshot_db
+    read = Habit(name="Read", periodicity="daily", created_at=START)
+    idle = Habit(name="Idle", periodicity="weekly", created_at=START)
+    session.add_all([read, idle])
+    session.commit()
+    for day in [0, 1, 2, 5]:
+        read.complete(session, START + timedelta(days=day))
+    session.commit()
+
+    path = str(tmp_path / "snapshot.npz")
+    export_snapshot(engine, path, NOW)
+    snapshot = Snapshot.load(path)
+    at_time = START + timedelta(days=7, hours=1)
+    assert get_habit_metrics(snapshot, at_time=at_time) == [
+        {'id': read.id, 'name': "Read", 'periodicity': "daily", 'max_streak': 3, 'days_since_last_completion': 2},
+        {'id': idle.id, 'name': "Idle", 'periodicity': "weekly", 'max_streak': 0, 'days_since_last_completion': None},
+    ]
+    assert get_longest_run_streak_for_habit(snapshot, 999) == 0
+    assert get_days_since_last_completion(snapshot, 999) is None
+    assert len(get_habits_by_periodicity(snapshot, "every 5 days")) == 0
+
+def test_streaks_follow_stored_periods(snapshot_db, tmp_path):
+    """Ensures streaks are calculated from the stored period and kind of each completion, not its time."""
+    engine, session = snapshot_db
+    habit = Habit(name="Read", periodicity="daily", created_at=START)
+    session.add(habit)
+    session.commit()
+    rows = [
+        # Stored for the next UTC day, though its time is a local time of the day before
+        {'period_start': START.date() + timedelta(days=day), 'kind': 'daily',
+         'completed_at': START + timedelta(days=day - (day == 1))}
+        for day in range(3)
+    ]
+    # Weekly completions aren't counted for daily habits
+    rows.append({'period_start': START.date() + timedelta(days=3), 'kind': 'weekly',
+                 'completed_at': START + timedelta(days=3)})
+    session.execute(insert(Completion), [{'habit_id': habit.id, **row} for row in rows])
+    session.commit()
+
+    path = str(tmp_path / "snapshot.npz")
+    export_snapshot(engine, path, NOW)
+    assert get_longest_run_streak_for_habit(Snapshot.load(path), habit.id) == 3
+
+def test_load_rejects_other_files(tmp_path):
+    """Ensures files that are no snapshot raise ValueError."""
+    path = tmp_path / "habits.db"
+    path.write_bytes(b"SQLite format 3\x00")
+    with pytest.raises(ValueError):
+        Snapshot.load(str(path))
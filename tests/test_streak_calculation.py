@@ -116,3 +116,35 @@ def test_weekly_streak_with_gaps(db_session):
     assert habit.calculate_max_streak() == 3  # Longest streak was 3 weeks
 
 
+
+def test_every_n_days_streak(db_session):
+    habit = Habit(name="Every 3 Days", periodicity="Every 3 days")
+    db_session.add(habit)
+    db_session.flush()
+    assert habit.periodicity == "every 3 days"
+
+    start = datetime(2024, 4, 27, 12, 0, tzinfo=UTC)  # First day of a 3-day period
+    # One completion in each of four consecutive 3-day periods, then one after a skipped period
+    for days in (0, 4, 6, 11, 18):
+        habit.complete(db_session, start + timedelta(days=days))
+    db_session.commit()
+
+    assert habit.calculate_max_streak() == 4
+    assert habit.calculate_streak(start + timedelta(days=19)) == 1
+    assert habit._is_within_period(start + timedelta(days=23))
+    assert not habit._is_within_period(start + timedelta(days=27))
+
+def test_times_per_week_streak(db_session):
+    habit = Habit(name="Three a Week", periodicity="3 times per week")
+    db_session.add(habit)
+    db_session.flush()
+
+    monday = datetime(2024, 4, 29, 12, 0, tzinfo=UTC)
+    # Weeks 0 and 1 reach the quota, week 2 only has two completions, week 3 reaches it again
+    for days in (0, 2, 4, 7, 8, 9, 14, 16, 21, 22, 23):
+        habit.complete(db_session, monday + timedelta(days=days))
+    db_session.commit()
+
+    assert habit.calculate_max_streak() == 2
+    assert habit.calculate_streak(monday + timedelta(days=24)) == 1
+    assert habit.completion_count == 11
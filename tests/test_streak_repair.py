@@ -0,0 +1,126 @@
+import random
+import pytest
+from datetime import date, datetime, timedelta, timezone, UTC
+from sqlalchemy import select
+from models import Habit, Completion, CompletionRun
+from maintenance import archive_completions
+
+START = datetime(2024, 1, 1, 9, 0, tzinfo=UTC)
+NOW = START + timedelta(days=90)
+
+def _full_recalculation(session, habit):
+    """Streaks and deadline of the habit calculated from every stored completion and run."""
+    dates = sorted(d.date() for d in session.scalars(
+        select(Completion.completed_at).where(Completion.habit_id == habit.id)
+    ))
+    runs = [(run.start_period, run.end_period) for run in session.scalars(
+        select(CompletionRun).where(CompletionRun.habit_id == habit.id).order_by(CompletionRun.start_period)
+    )]
+    summary = habit.period_rule.summarize(dates, runs, NOW.date())
+    return summary.current_streak, summary.max_streak, summary.next_due
+
+def _stored(habit):
+    """Stored streaks and deadline of the habit."""
+    return habit.current_streak, habit.max_streak, habit.next_due_at.date()
+
+def _random_time(rng, days=90):
+    """Random completion time within the first `days` days."""
+    return START + timedelta(days=rng.randrange(days), hours=rng.randrange(14))
+
+@pytest.mark.parametrize("periodicity", ["daily", "weekly", "every 3 days", "3 times per week"])
+@pytest.mark.parametrize("seed", range(4))
+def test_repair_matches_full_recalculation(db_session, periodicity, seed):
+    """Property test: after random backfills, removals and corrections the locally repaired
+    streaks equal a full recalculation."""
+    rng = random.Random(f"{periodicity}-{seed}")
+    habit = Habit(name="Random", periodicity=periodicity, created_at=START)
+    db_session.add(habit)
+    db_session.commit()
+    # Dense enough to form long runs, sparse enough to leave gaps
+    for day in range(90):
+        if rng.random() < 0.75:
+            habit.record_completion(db_session, START + timedelta(days=day, hours=rng.randrange(14)))
+    habit.refresh_streaks(NOW)
+    db_session.commit()
+    if seed % 2:
+        archive_completions(db_session, 60, NOW)
+        db_session.refresh(habit)
+        habit.refresh_streaks(NOW)
+    assert _stored(habit) == _full_recalculation(db_session, habit)
+
+    for step in range(30):
+        completions = db_session.scalars(select(Completion).where(Completion.habit_id == habit.id)).all()
+        action = rng.choice(["add", "remove", "move"]) if completions else "add"
+        if action == "add":
+            habit.add_completion(db_session, _random_time(rng), NOW)
+        elif action == "remove":
+            habit.remove_completion(db_session, rng.choice(completions), NOW)
+        else:
+            habit.move_completion(db_session, rng.choice(completions), _random_time(rng), NOW)
+        db_session.flush()
+        assert _stored(habit) == _full_recalculation(db_session, habit), f"{action} at step {step}"
+
+def test_backfill_bridges_gap(db_session):
+    """Verifies a backfilled completion joins the runs around it and sets the record."""
+    habit = Habit(name="Read", periodicity="daily", created_at=START)
+    db_session.add(habit)
+    db_session.commit()
+    for day in [0, 1, 2, 4, 5]:
+        habit.complete(db_session, START + timedelta(days=day))
+    assert (habit.current_streak, habit.max_streak) == (2, 3)
+
+    habit.add_completion(db_session, START + timedelta(days=3), START + timedelta(days=5, hours=8))
+    assert (habit.current_streak, habit.max_streak) == (6, 6)
+    assert habit.completion_count == 6
+
+@pytest.mark.parametrize("periodicity, days, expected", [
+    ("daily", [0, 1], (3, 3)),
+    ("weekly", [-14, -7], (3, 3)),
+])
+def test_backfill_with_offset_uses_utc_periods(db_session, periodicity, days, expected):
+    """Ensures a completion given with a non-UTC offset is stored and repaired by its UTC period."""
+    monday = datetime(2024, 5, 6, tzinfo=UTC)
+    habit = Habit(name="Read", periodicity=periodicity, created_at=monday - timedelta(days=30))
+    db_session.add(habit)
+    db_session.commit()
+    for day in days:
+        habit.complete(db_session, monday - timedelta(days=3) + timedelta(days=day, hours=9))
+    # Monday 01:00 at UTC+5 is Sunday 20:00 UTC
+    local_time = datetime(2024, 5, 6, 1, 0, tzinfo=timezone(timedelta(hours=5)))
+    at_time = monday + timedelta(hours=1)
+
+    habit.add_completion(db_session, local_time, at_time)
+    db_session.flush()
+    completion = db_session.scalars(select(Completion).where(
+        Completion.habit_id == habit.id).order_by(Completion.completed_at.desc())).first()
+    assert completion.completed_at.replace(tzinfo=UTC) == local_time
+    assert completion.period_start == habit.period_rule.period_key(date(2024, 5, 5))
+    repaired = (habit.current_streak, habit.max_streak)
+    habit.refresh_streaks(at_time)
+    assert repaired == (habit.current_streak, habit.max_streak) == expected
+
+def test_remove_splitting_record_run_recalculates(db_session):
+    """Ensures removing a completion from the record run finds the next longest run."""
+    habit = Habit(name="Read", periodicity="daily", created_at=START)
+    db_session.add(habit)
+    db_session.commit()
+    for day in [0, 1, 2, 3, 4, 5, 7, 8, 9, 10]:
+        habit.complete(db_session, START + timedelta(days=day))
+    at_time = START + timedelta(days=10, hours=8)
+    assert habit.max_streak == 6
+
+    third = db_session.scalars(select(Completion).where(
+        Completion.habit_id == habit.id, Completion.period_start == (START + timedelta(days=2)).date()
+    )).one()
+    habit.remove_completion(db_session, third, at_time)
+    assert (habit.current_streak, habit.max_streak) == (4, 4)
+
+def test_add_completion_rejects_future_and_naive_times(db_session):
+    """Tests backfilling validates the completion time."""
+    habit = Habit(name="Read", periodicity="daily")
+    db_session.add(habit)
+    db_session.commit()
+    with pytest.raises(ValueError):
+        habit.add_completion(db_session, datetime.now(UTC) + timedelta(days=1))
+    with pytest.raises(ValueError):
+        habit.add_completion(db_session, datetime(2024, 1, 1))
@@ -0,0 +1,78 @@
+import pytest
+from datetime import datetime, timedelta, UTC
+from sqlalchemy import select
+import analytics
+from maintenance import purge_deleted_habits
+from models import Habit, HabitEvent, Tag, habit_tags, HABIT_UPDATED
+from readmodels import iter_habit_summary_pages
+
+NOW = datetime(2024, 5, 1, 20, 0, tzinfo=UTC)
+
+def _habit(session, name, periodicity="daily", days=0, tags=()):
+    """Create a habit completed on each of the last `days` days with the given tags."""
+    habit = Habit(name=name, periodicity=periodicity, created_at=NOW - timedelta(days=9, hours=20))
+    session.add(habit)
+    session.commit()
+    for day in range(days):
+        habit.complete(session, NOW - timedelta(days=day))
+    habit.add_tags(session, tags)
+    session.commit()
+    return habit
+
+def test_add_and_remove_tags(db_session):
+    """Verifies tags are normalized, shared between habits and changes are logged."""
+    run = _habit(db_session, "Run", tags=["Health", "morning  routine", "health"])
+    read = _habit(db_session, "Read", tags=["HEALTH"])
+    assert [tag.name for tag in run.tags] == ["health", "morning routine"]
+    assert db_session.query(Tag).count() == 2
+
+    assert run.remove_tags(db_session, ["Morning Routine", "work"]) == ["morning routine"]
+    assert read.add_tags(db_session, ["health"]) == []
+    db_session.commit()
+    assert [tag.name for tag in run.tags] == ["health"]
+    assert db_session.query(HabitEvent).filter_by(event_type=HABIT_UPDATED).count() == 3
+    with pytest.raises(ValueError):
+        run.add_tags(db_session, ["  "])
+
+def test_filter_by_tag(db_session):
+    """Ensures listing and ranking can be restricted to the habits with a tag."""
+    _habit(db_session, "Run", days=3, tags=["health"])
+    _habit(db_session, "Stretch", days=5, tags=["health", "morning"])
+    _habit(db_session, "Email", days=7, tags=["work"])
+
+    assert [habit.name for habit in analytics.get_habits_by_tag(db_session, "Health")] == ["Run", "Stretch"]
+    pages = list(iter_habit_summary_pages(db_session, page_size=1, sort="name", descending=True, tag="health"))
+    assert [[habit.name for habit in page] for page in pages] == [["Stretch"], ["Run"]]
+    ranking = analytics.get_top_habits(db_session, "current_streak", tag="health")
+    assert [(entry['name'], entry['current_streak']) for entry in ranking] == [("Stretch", 5), ("Run", 3)]
+    assert analytics.get_habits_by_tag(db_session, "unknown") == []
+
+def test_tag_stats(db_session):
+    """Tests per-tag aggregates over active habits."""
+    _habit(db_session, "Run", days=3, tags=["health"])
+    _habit(db_session, "Stretch", days=5, tags=["health", "morning"])
+    _habit(db_session, "Gym", "weekly", days=1, tags=["health"])
+    deleted = _habit(db_session, "Deleted", days=9, tags=["health"])
+    deleted.soft_delete()
+    db_session.commit()
+
+    stats = {entry['tag']: entry for entry in analytics.get_tag_stats(db_session, NOW)}
+    assert list(stats) == ["health", "morning"]
+    health = stats["health"]
+    assert (health['habits'], health['completions']) == (3, 9)
+    assert (health['max_current_streak'], health['max_streak']) == (5, 5)
+    assert health['avg_current_streak'] == 3.0
+    # 10 elapsed days for the daily habits, 2 started weeks for the weekly one
+    assert health['completion_rate'] == round((3 / 10 + 5 / 10 + 1 / 2) / 3, 3)
+    assert stats["morning"]['habits'] == 1
+
+def test_purge_removes_tag_links(db_session):
+    """Verifies purging a deleted habit removes its tag links but keeps the tags."""
+    kept = _habit(db_session, "Run", tags=["health"])
+    deleted = _habit(db_session, "Deleted", tags=["health"])
+    deleted.soft_delete()
+    db_session.commit()
+
+    purge_deleted_habits(db_session)
+    assert db_session.execute(select(habit_tags.c.habit_id)).scalars().all() == [kept.id]
+    assert db_session.query(Tag).count() == 1
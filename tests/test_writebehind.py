@@ -0,0 +1,133 @@
+import os
+import time
+from datetime import datetime, timedelta, UTC
+import pytest
+from sqlalchemy.orm import sessionmaker
+from database import create_test_engine
+from models import Habit, DailyCompletion, WeeklyCompletion, QueueCheckpoint
+from writebehind import CompletionQueue
+
+@pytest.fixture
+def queue_db(tmp_path):
+    """Provides a session factory for a database file with a daily and a weekly habit."""
+    engine = create_test_engine(tmp_path / "queue.db")
+    factory = sessionmaker(bind=engine)
+    with factory() as session:
+        session.add_all([Habit(name="Read", periodicity="daily"), Habit(name="Clean", periodicity="weekly")])
+        session.commit()
+    yield factory
+    engine.dispose()
+
+def test_group_commit_updates_completions_and_streaks(queue_db, tmp_path):
+    """Verifies queued completions are written in batches with streaks calculated once per habit."""
+    now = datetime.now(UTC)
+    with CompletionQueue(tmp_path / "queue.log", queue_db, flush_interval=60, max_batch_size=2) as queue:
+        for days_ago in (2, 1, 0):
+            queue.enqueue(1, now - timedelta(days=days_ago))
+        queue.enqueue(1, now - timedelta(seconds=1))
+        queue.enqueue(2, now)
+        queue.flush()
+        assert queue.pending == 0
+        assert os.path.getsize(tmp_path / "queue.log") == 0
+
+    with queue_db() as session:
+        read, clean = session.get(Habit, 1), session.get(Habit, 2)
+        assert session.query(DailyCompletion).count() == 3
+        assert session.query(WeeklyCompletion).count() == 1
+        assert (read.current_streak, read.max_streak, read.completion_count) == (3, 3, 3)
+        assert clean.current_streak == 1
+        assert session.get(QueueCheckpoint, "completions").applied_seq == 5
+
+def test_replay_after_crash(queue_db, tmp_path):
+    """Ensures entries logged but not committed are replayed exactly once, ignoring a torn last line."""
+    log_path = tmp_path / "queue.log"
+    now = datetime.now(UTC)
+    queue = CompletionQueue(log_path, queue_db, flush_interval=60)
+    queue.start()
+    queue.enqueue(1, now - timedelta(days=1))
+    queue.flush()
+    queue.enqueue(1, now)
+    queue.enqueue(2, now)
+    # Simulate a crash: the flusher never runs again and the last append is torn
+    queue._closed = True
+    queue._log.write('{"seq": 4, "habit_id": 1')
+    queue._log.close()
+
+    with CompletionQueue(log_path, queue_db) as recovered:
+        assert recovered.pending == 0
+        assert recovered.enqueue(2, now) == 4
+
+    with queue_db() as session:
+        assert session.query(DailyCompletion).count() == 2
+        assert session.query(WeeklyCompletion).count() == 1
+        assert session.get(Habit, 1).current_streak == 2
+        assert session.get(QueueCheckpoint, "completions").applied_seq == 4
+
+def test_flusher_thread_and_validation(queue_db, tmp_path):
+    """Tests the background flush, skipped completions of deleted habits and input validation."""
+    with pytest.raises(ValueError):
+        CompletionQueue(tmp_path / "queue.log", queue_db, max_batch_size=0)
+
+    queue = CompletionQueue(tmp_path / "queue.log", queue_db, flush_interval=0.05)
+    with pytest.raises(ValueError):
+        queue.enqueue(1)
+    with queue:
+        with pytest.raises(ValueError):
+            queue.enqueue(1, datetime(2024, 1, 1))
+        queue.enqueue(1)
+        queue.enqueue(99)
+        deadline = time.monotonic() + 5
+        while queue.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert queue.pending == 0
+    assert queue.skipped == 1
+
+def test_invalid_entry_is_dead_lettered(queue_db, tmp_path):
+    """Ensures an entry that keeps failing is moved to the dead-letter file without holding up the others."""
+    log_path = tmp_path / "queue.log"
+    now = datetime.now(UTC)
+    log_path.write_text("".join(
+        f'{{"seq": {seq}, "habit_id": {habit_id}, "completed_at": "{completed_at.isoformat()}"}}\n'
+        for seq, habit_id, completed_at in [
+            (1, 1, now - timedelta(days=1)),
+            # Written without a time zone, so it can't be recorded
+            (2, 1, now.replace(tzinfo=None)),
+            (3, 2, now),
+        ]
+    ))
+    queue = CompletionQueue(log_path, queue_db, flush_interval=60, max_attempts=2)
+    assert queue.start() == 1
+    assert queue.pending == 2
+    # The replay error is raised by the next flush, which moves the entry to the dead-letter file
+    with pytest.raises(ValueError):
+        queue.flush()
+    assert queue.pending == 0
+    queue.close()
+    assert queue.dead_lettered == 1
+    assert '"seq": 2' in (tmp_path / "queue.log.dead").read_text()
+
+    with queue_db() as session:
+        assert session.query(DailyCompletion).count() == 1
+        assert session.query(WeeklyCompletion).count() == 1
+        assert session.get(QueueCheckpoint, "completions").applied_seq == 3
+
+def test_flusher_survives_errors(queue_db, tmp_path):
+    """Tests the flusher thread keeps running after an error, which the next flush raises."""
+    queue = CompletionQueue(tmp_path / "queue.log", queue_db, flush_interval=0.01)
+    with queue:
+        calls = []
+        apply = queue._apply
+        def failing_apply(entries, applied_seq):
+            calls.append(applied_seq)
+            if len(calls) == 1:
+                raise OSError("disk full")
+            apply(entries, applied_seq)
+        queue._apply = failing_apply
+        queue.enqueue(1)
+        deadline = time.monotonic() + 5
+        while queue.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert queue.pending == 0 and queue._thread.is_alive()
+        with pytest.raises(OSError):
+            queue.flush()
+        assert queue.flush() == 0
@@ -0,0 +1,404 @@
+import json
+import os
+import threading
+from datetime import datetime, UTC
+from typing import NamedTuple, Optional
+from sqlalchemy.exc import OperationalError
+from models import Habit, QueueCheckpoint
+
+QUEUE_LOG_FILE = "completions.queue"
+DEAD_LETTER_SUFFIX = ".dead"
+
+
+class QueuedCompletion(NamedTuple):
+    """
+    A completion waiting in the write-behind queue.
+
+    Attributes:
+        seq (int): Position of the entry in the queue, increasing by one per entry
+        habit_id (int): ID of the completed habit
+        completed_at (datetime): UTC-aware time of the completion
+    """
+    seq: int
+    habit_id: int
+    completed_at: datetime
+
+
+class CompletionQueue:
+    """
+    Write-behind queue that records completions in an append-only log and
+    group-commits them to the database from a background thread.
+
+    Every enqueued completion is appended to the log file and fsynced before
+    enqueue returns, so it survives a crash. The flusher thread writes the
+    pending completions in batches of up to `max_batch_size`, one transaction
+    per batch, and recalculates the streaks once per habit in the batch. The
+    sequence number of the last applied entry is stored in the
+    queue_checkpoints table in the same transaction, so when the queue is
+    started again it replays exactly the entries that were not committed.
+
+    If a batch fails, its entries are written one by one to find the failing
+    one, so valid entries behind it aren't held up. An entry that failed
+    `max_attempts` times is appended to the dead-letter file and the
+    checkpoint moves past it. Operational errors, e.g. a locked database,
+    are retried without limit since they aren't caused by the entry.
+
+    Args:
+        log_path (str): Path of the append-only log file
+        session_factory (Callable): Returns a new SQLAlchemy session
+        name (str): Name of the checkpoint row, one per queue
+        flush_interval (float): Seconds between flushes of a partial batch
+        max_batch_size (int): Completions written per transaction; a full batch is flushed immediately
+        max_attempts (int): Failed writes of an entry before it is moved to the dead-letter file
+        dead_letter_path (str, optional): JSON lines file of the entries that could not be written.
+                                          Defaults to log_path with a .dead suffix
+
+    Raises:
+        ValueError: If flush_interval, max_batch_size or max_attempts is not positive
+    """
+
+    def __init__(self, log_path, session_factory, name="completions", flush_interval=1.0, max_batch_size=500,
+                 max_attempts=3, dead_letter_path=None):
+        if flush_interval <= 0:
+            raise ValueError("flush_interval must be positive")
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.log_path = log_path
+        self.session_factory = session_factory
+        self.name = name
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path or f"{log_path}{DEAD_LETTER_SUFFIX}"
+        self.last_error: Optional[Exception] = None
+        self.skipped = 0
+        self.dead_lettered = 0
+        # Error of the flusher thread, raised by the next flush or close
+        self._flusher_error: Optional[Exception] = None
+        self._attempts = {}
+        self._pending = []
+        self._next_seq = 1
+        self._log = None
+        self._thread = None
+        self._closed = False
+        self._condition = threading.Condition()
+        # Serializes batches so the checkpoint only ever moves forward
+        self._flush_lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def pending(self):
+        """int: Number of completions not yet written to the database."""
+        with self._condition:
+            return len(self._pending)
+
+    def start(self):
+        """
+        Recover the entries left in the log, replay them and start the flusher thread.
+
+        Entries that fail to replay stay queued for the flusher thread.
+
+        Returns:
+            int: Number of recovered entries that were replayed
+        """
+        recovered = self._recover()
+        self._log = open(self.log_path, "a", encoding="utf-8")
+        try:
+            replayed = self.flush()
+        except Exception as error:
+            # Entries that failed stay queued for the flusher; the next flush or close raises the error
+            self.last_error = self._flusher_error = error
+            replayed = recovered - self.pending
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-flusher", daemon=True)
+        self._thread.start()
+        return replayed
+
+    def enqueue(self, habit_id, completion_time=None):
+        """
+        Durably queue a completion of a habit.
+
+        Args:
+            habit_id (int): ID of the completed habit
+            completion_time (datetime, optional): Time of completion. Defaults to current UTC time
+
+        Returns:
+            int: Sequence number of the queued entry
+
+        Raises:
+            ValueError: If completion_time is not timezone-aware or the queue is closed
+        """
+        if completion_time is None:
+            completion_time = datetime.now(UTC)
+        elif completion_time.tzinfo is None:
+            raise ValueError("completion_time must be timezone-aware")
+
+        with self._condition:
+            if self._closed or self._log is None:
+                raise ValueError("Queue is not running")
+            entry = QueuedCompletion(self._next_seq, int(habit_id), completion_time.astimezone(UTC))
+            self._log.write(_encode(entry))
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._next_seq += 1
+            self._pending.append(entry)
+            if len(self._pending) >= self.max_batch_size:
+                self._condition.notify()
+        return entry.seq
+
+    def flush(self):
+        """
+        Write all pending completions to the database.
+
+        Returns:
+            int: Number of queue entries applied or moved to the dead-letter file
+
+        Raises:
+            Exception: The error of a batch that stays queued, or else the first error
+                       of the flusher thread since the last flush
+        """
+        written = 0
+        while True:
+            applied = self._flush_batch()
+            if not applied:
+                break
+            written += applied
+        error, self._flusher_error = self._flusher_error, None
+        if error is not None:
+            raise error
+        return written
+
+    def close(self):
+        """
+        Stop the flusher thread, write the remaining completions and close the log.
+
+        Raises:
+            Exception: Like flush; the log is closed anyway
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.flush()
+        finally:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def _run(self):
+        """Flush whenever a batch is full or the flush interval has passed."""
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._closed or len(self._pending) >= self.max_batch_size,
+                    timeout=self.flush_interval,
+                )
+                closed = self._closed
+            if closed:
+                return
+            try:
+                while self._flush_batch():
+                    pass
+            except Exception as error:
+                # Entries stay queued and are retried on the next flush; the thread keeps running
+                self.last_error = error
+                if self._flusher_error is None:
+                    self._flusher_error = error
+
+    def _flush_batch(self):
+        """
+        Write the oldest pending completions in one transaction, or one by
+        one if that fails.
+
+        Returns:
+            int: Number of queue entries applied or moved to the dead-letter file
+
+        Raises:
+            Exception: The error of an entry that stays queued to be retried
+        """
+        with self._flush_lock:
+            with self._condition:
+                batch = self._pending[:self.max_batch_size]
+            if not batch:
+                return 0
+            try:
+                self._apply(batch, batch[-1].seq)
+            except Exception as error:
+                self.last_error = error
+                if isinstance(error, OperationalError):
+                    raise
+                if len(batch) > 1:
+                    return self._apply_separately(batch)
+                if not self._dead_letter_if_exhausted(batch[0], error):
+                    raise
+            self._remove(len(batch))
+            return len(batch)
+
+    def _apply_separately(self, batch):
+        """
+        Write the entries of a failed batch one transaction each, up to the first one that fails.
+
+        Returns:
+            int: Number of queue entries applied or moved to the dead-letter file
+
+        Raises:
+            Exception: The error of an entry that stays queued to be retried
+        """
+        for entry in batch:
+            try:
+                self._apply([entry], entry.seq)
+            except Exception as error:
+                self.last_error = error
+                if not self._dead_letter_if_exhausted(entry, error):
+                    raise
+            self._remove(1)
+        return len(batch)
+
+    def _dead_letter_if_exhausted(self, entry, error):
+        """
+        Count a failed write of an entry and move it to the dead-letter file once it failed max_attempts times.
+
+        Returns:
+            bool: True if the entry was moved to the dead-letter file and the checkpoint is past it
+        """
+        if isinstance(error, OperationalError):
+            return False
+        attempts = self._attempts[entry.seq] = self._attempts.get(entry.seq, 0) + 1
+        if attempts < self.max_attempts:
+            return False
+        # Written before the checkpoint moves past the entry, so a crash in between can't lose it
+        with open(self.dead_letter_path, "a", encoding="utf-8") as dead_letters:
+            dead_letters.write(_encode(entry, error=repr(error)))
+            dead_letters.flush()
+            os.fsync(dead_letters.fileno())
+        self._apply([], entry.seq)
+        del self._attempts[entry.seq]
+        self.dead_lettered += 1
+        return True
+
+    def _apply(self, entries, applied_seq):
+        """
+        Write completions and move the checkpoint to applied_seq in one transaction.
+
+        Args:
+            entries (List[QueuedCompletion]): Completions to write
+            applied_seq (int): Sequence number of the last entry handled
+        """
+        session = self.session_factory()
+        try:
+            habit_ids = {entry.habit_id for entry in entries}
+            habits = {
+                habit.id: habit
+                for habit in session.query(Habit).filter(Habit.id.in_(habit_ids), Habit.deleted_at.is_(None))
+            } if habit_ids else {}
+            latest = {}
+            skipped = 0
+            for entry in sorted(entries, key=lambda entry: entry.completed_at):
+                habit = habits.get(entry.habit_id)
+                if habit is None:
+                    # The habit was deleted after the completion was queued
+                    skipped += 1
+                    continue
+                habit.record_completion(session, entry.completed_at)
+                latest[habit.id] = entry.completed_at
+            for habit_id, completed_at in latest.items():
+                habits[habit_id].refresh_streaks(completed_at)
+
+            checkpoint = session.get(QueueCheckpoint, self.name)
+            if checkpoint is None:
+                checkpoint = QueueCheckpoint(name=self.name)
+                session.add(checkpoint)
+            checkpoint.applied_seq = applied_seq
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        self.skipped += skipped
+
+    def _remove(self, count):
+        """Drop the oldest `count` pending entries once they are applied or moved to the dead-letter file."""
+        with self._condition:
+            del self._pending[:count]
+            if not self._pending and self._log is not None:
+                # Everything in the log is applied
+                self._log.truncate(0)
+
+    def _recover(self):
+        """
+        Load the log entries that are newer than the checkpoint and rewrite
+        the log to contain only those.
+
+        A torn last line, left by a crash during an append, is discarded.
+
+        Returns:
+            int: Number of recovered entries
+        """
+        session = self.session_factory()
+        try:
+            checkpoint = session.get(QueueCheckpoint, self.name)
+            applied_seq = checkpoint.applied_seq if checkpoint else 0
+        finally:
+            session.close()
+
+        entries = []
+        last_seq = applied_seq
+        if os.path.exists(self.log_path):
+            with open(self.log_path, encoding="utf-8") as log:
+                for line in log:
+                    try:
+                        entry = _decode(line)
+                    except ValueError:
+                        continue
+                    last_seq = max(last_seq, entry.seq)
+                    if entry.seq > applied_seq:
+                        entries.append(entry)
+
+        temp_path = f"{self.log_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as log:
+            log.writelines(_encode(entry) for entry in entries)
+            log.flush()
+            os.fsync(log.fileno())
+        os.replace(temp_path, self.log_path)
+
+        self._pending = entries
+        self._next_seq = last_seq + 1
+        return len(entries)
+
+
+def _encode(entry, **extra):
+    """Serialize a queue entry as one line of the log, with extra fields for the dead-letter file."""
+    return json.dumps({
+        "seq": entry.seq,
+        "habit_id": entry.habit_id,
+        "completed_at": entry.completed_at.isoformat(),
+        **extra,
+    }) + "\n"
+
+
+def _decode(line):
+    """
+    Parse one line of the log.
+
+    Raises:
+        ValueError: If the line is incomplete or malformed
+    """
+    if not line.endswith("\n"):
+        raise ValueError("Incomplete log entry")
+    try:
+        data = json.loads(line)
+        return QueuedCompletion(
+            int(data["seq"]), int(data["habit_id"]), datetime.fromisoformat(data["completed_at"])
+        )
+    except (KeyError, TypeError) as error:
+        raise ValueError(f"Malformed log entry: {line!r}") from error